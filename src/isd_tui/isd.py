@@ -26,9 +26,13 @@ import os
 import shutil
 import subprocess
 import tempfile
-from collections import deque
+import time
+from collections import Counter, OrderedDict, deque
+from collections.abc import Container as AbstractContainer
 from copy import deepcopy
 from enum import Enum, StrEnum, auto
+from abc import ABC, abstractmethod
+from array import array
 from functools import partial
 from itertools import chain, repeat
 from importlib.resources import as_file, files
@@ -36,19 +40,29 @@ from pathlib import Path
 from textwrap import dedent, indent
 from typing import (
     Any,
+    Awaitable,
+    Callable,
+    Coroutine,
     Self,
     Deque,
     Dict,
+    Hashable,
     Iterable,
+    Iterator,
     List,
+    Mapping,
+    NamedTuple,
     Optional,
+    Sequence,
     Tuple,
+    TYPE_CHECKING,
     Type,
+    Union,
     cast,
     Annotated,
 )
 
-from pfzy.match import fuzzy_match
+from pfzy.score import fzy_scorer
 from pydantic import BaseModel, Field, model_validator, PositiveInt
 from pydantic_settings import (
     BaseSettings,
@@ -102,8 +116,42 @@ from xdg_base_dirs import (
     xdg_config_dirs,
 )
 from textual.widgets.selection_list import Selection
-from textual.widgets.option_list import Option
+from textual.widgets.option_list import Option, OptionDoesNotExist
+from textual.strip import Strip
+from textual.message import Message as TextualMessage
 from .derive_terminal_theme import derive_textual_theme, TERMINAL_DERIVED_THEME_NAME
+from .systemd_dbus import (
+    SYSTEMD_BUS_NAME,
+    SYSTEMD_MANAGER_INTERFACE,
+    SYSTEMD_OBJECT_PATH,
+    DBusConnection,
+    DBusError,
+    subscribe_unit_changes,
+    system_bus_address,
+    unit_changes_from_signal,
+    unsubscribe_unit_changes,
+    user_bus_address,
+)
+from .transport import (
+    CommandProcess,
+    get_transport,
+    set_transport,
+    transport_from_command,
+)
+from .search_pool import (
+    SearchPool,
+    character_mask,
+    match_indices,
+    matched_units,
+    prefilter_unit_names,
+    rank_scored_chunks,
+    score_unit_names,
+    search_unit_names,
+)
+from .unit_file_watcher import UnitFileWatcher, unit_search_paths
+
+if TYPE_CHECKING:
+    from .systemd_dbus import Message
 
 
 # make type checker happy.
@@ -159,13 +207,46 @@ AUTHENTICATION_MODE = "sudo"
 
 Theme = StrEnum(
     "Theme", [key for key in BUILTIN_THEMES.keys()] + [TERMINAL_DERIVED_THEME_NAME]
-) # type: ignore
+)  # type: ignore
+
 
 class StartupMode(StrEnum):
     USER = "user"
     SYSTEM = "system"
     AUTO = "auto"
 
+
+class RefreshIntervalPolicy(StrEnum):
+    FIXED = "fixed"
+    ADAPTIVE = "adaptive"
+
+
+class RefreshMode(StrEnum):
+    POLL = "poll"
+    PUSH = "push"
+
+
+class UnitType(StrEnum):
+    SERVICE = "service"
+    SOCKET = "socket"
+    TARGET = "target"
+    DEVICE = "device"
+    MOUNT = "mount"
+    AUTOMOUNT = "automount"
+    SWAP = "swap"
+    TIMER = "timer"
+    PATH = "path"
+    SLICE = "slice"
+    SCOPE = "scope"
+
+
+class InventoryBackend(StrEnum):
+    AUTO = "auto"
+    DBUS = "dbus"
+    TEXT = "text"
+    JSON = "json"
+
+
 SETTINGS_YAML_HEADER = dedent("""\
         # yaml-language-server: $schema=schema.json
         # ^ This links to the JSON Schema that provides auto-completion support
@@ -420,6 +501,45 @@ class SystemctlActionScreen(ModalScreen[Optional[str]]):
         self.dismiss(event.option_id)
 
 
+class MachineSelectionScreen(ModalScreen[Optional[str]]):
+    """
+    Present the host and the configured machines.
+    The options are built by the caller, the selected option `id`
+    is the name of the machine.
+    """
+
+    BINDINGS = [Binding("enter", "select", "Select", show=True)]
+    AUTO_FOCUS = "CustomOptionList"
+
+    def __init__(
+        self,
+        close_modal_key: str,
+        navigation_keybindings: NavigationKeybindings,
+        options: List[Option],
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.navigation_keybindings = navigation_keybindings
+        self.options = options
+        self._bindings.bind(
+            ensure_reserved("escape") + "," + close_modal_key, "close", "Close"
+        )
+
+    def compose(self) -> ComposeResult:
+        yield CustomOptionList(self.navigation_keybindings, *self.options)
+        yield Footer()
+
+    def action_select(self) -> None:
+        self.query_one(CustomOptionList).action_select()
+
+    def action_close(self) -> None:
+        self.dismiss(None)
+
+    @on(CustomOptionList.OptionSelected)
+    def machine_selected(self, event: CustomOptionList.OptionSelected):
+        self.dismiss(event.option_id)
+
+
 class DonationScreen(ModalScreen[Optional[None]]):
     """
     Present a screen with the donation information.
@@ -600,6 +720,13 @@ class MainKeybindings(KeybindingModel):
         description="Open in editor",
     )
     toggle_mode: str = Field(default="ctrl+t", description="Toggle mode")
+    toggle_unit_type_filter: str = Field(
+        default="ctrl+y", description="Toggle unit type filter"
+    )
+    select_machine: str = Field(default="ctrl+r", description="Select machine")
+    toggle_template_group: str = Field(
+        default="ctrl+l", description="Expand/collapse template instances"
+    )
     increase_widget_height: str = Field(
         default="plus", description="Increase height of currently focused widget"
     )
@@ -777,7 +904,179 @@ class Settings(BaseSettings):
             Auto refresh all unit states.
             This is important to find new units that have been added
             since the start of `isd`.
-            Please note that low values will cause many and large systemctl calls."""),
+            Please note that low values will cause many and large systemctl calls.
+            While the unit files are watched (`watch_unit_files`) or the changes
+            are pushed, `push_resync_interval_sec` is used instead."""),
+    )
+
+    refresh_interval_policy: RefreshIntervalPolicy = Field(
+        default=RefreshIntervalPolicy.FIXED,
+        description=dedent("""\
+            How the unit state refresh intervals are chosen.
+            By default (`fixed`), `preview_and_selection_refresh_interval_sec` and
+            `full_refresh_interval_sec` are always used.
+            `adaptive` starts with these intervals, halves them whenever a refresh
+            found changed units and backs off otherwise.
+            The intervals stay within the bounds given by `adaptive_refresh_min_factor`
+            and `adaptive_refresh_max_factor` and are at least 20 times as long as
+            the last refresh took."""),
+    )
+
+    adaptive_refresh_min_factor: float = Field(
+        default=0.5,
+        gt=0,
+        le=1,
+        description=dedent("""\
+            Lower bound of the `adaptive` refresh intervals relative to the configured
+            interval."""),
+    )
+
+    adaptive_refresh_max_factor: float = Field(
+        default=6,
+        ge=1,
+        description=dedent("""\
+            Upper bound of the `adaptive` refresh intervals relative to the configured
+            interval."""),
+    )
+
+    refresh_mode: RefreshMode = Field(
+        default=RefreshMode.POLL,
+        description=dedent("""\
+            How unit state changes are detected.
+            `poll` periodically reloads the relevant and all units.
+            `push` subscribes to the unit change notifications of the service manager
+            via D-Bus and only reloads the units that have actually changed.
+            Then the units and the preview are no longer polled every
+            `preview_and_selection_refresh_interval_sec`, the preview is only
+            refreshed if a notification concerns one of the shown units, and
+            `full_refresh_interval_sec` is replaced by `push_resync_interval_sec`.
+            `push` requires the optional `jeepney` dependency (`isd-tui[dbus]`)
+            and falls back to `poll` if it is missing or the bus cannot be reached."""),
+    )
+
+    push_resync_interval_sec: float = Field(
+        default=300,
+        gt=0,
+        description=dedent("""\
+            Reload all unit states after this time has passed in `push` mode or
+            while the unit files are watched (`watch_unit_files`).
+            It replaces the `full_refresh_interval_sec` then and is a safety net
+            for changes that were not pushed or reported, for example,
+            signals that were lost while the connection was re-established."""),
+    )
+
+    watch_unit_files: bool = Field(
+        default=True,
+        description=dedent("""\
+            Watch the unit search paths for added, removed or changed unit files
+            and only reload the states of those units.
+            New unit files are then discovered without a full refresh, so all
+            units are only reloaded every `push_resync_interval_sec` instead of
+            every `full_refresh_interval_sec`.
+            If the watcher cannot keep up with the changes, isd falls back to
+            the `full_refresh_interval_sec`.
+            Requires `inotify` and is disabled automatically if it is not available."""),
+    )
+
+    inactive_mode_refresh_interval_sec: float = Field(
+        default=60,
+        ge=0,
+        description=dedent("""\
+            Keep the units of the other mode (`system` or `user`) in memory
+            and reload them after this time has passed.
+            Toggling the mode then immediately shows the units and only
+            revalidates them in the background.
+            `0` disables it and the units are loaded on every toggle."""),
+    )
+
+    vanished_unit_retention_sec: float = Field(
+        default=30,
+        ge=0,
+        description=dedent("""\
+            Keep the units that have vanished from the service manager,
+            for example, transient `run-*.scope` units, for this long
+            as `not-found` before they are removed from the unit list.
+            Selected and highlighted units are kept until they are no longer
+            selected or highlighted."""),
+    )
+
+    machines: list[str] = Field(
+        default=[],
+        description=dedent("""\
+            Local containers (`systemctl --machine=`) whose units should be
+            available next to the ones of the host.
+            Their inventories are loaded concurrently, kept in memory and refreshed
+            together with the inactive mode (`inactive_mode_refresh_interval_sec`).
+            Use `select_machine` to search across them and to switch the machine."""),
+    )
+
+    transport_command: list[str] = Field(
+        default=[],
+        description=dedent("""\
+            Run the `systemctl` and `journalctl` commands of the inventory, preview
+            and actions through a single persistent session that is started with
+            this command, instead of spawning them locally.
+            The command must start the `isd_tui.transport` helper, for example,
+            `["ssh", "-T", "host", "python3", "-m", "isd_tui.transport"]`.
+            The D-Bus backend, `push` mode and `watch_unit_files` are not used then.
+            Interactive commands, like `edit` or password prompts, need a local
+            terminal and are not available then.
+            By default, the commands are spawned locally."""),
+    )
+
+    machine_workers: PositiveInt = Field(
+        default=8,
+        description=dedent("""\
+            The maximum number of machines whose units are loaded at the same time."""),
+    )
+
+    pause_refresh_when_inactive: bool = Field(
+        default=True,
+        description=dedent("""\
+            Pause all periodic refreshes while `isd` is suspended (pager, editor, `ctrl+z`),
+            the terminal is unfocused or no input was received for `idle_timeout_sec`.
+            A single refresh catches up once the application becomes active again.
+            Requires a terminal that reports focus changes to detect unfocused terminals."""),
+    )
+
+    idle_timeout_sec: float = Field(
+        default=3600,
+        ge=0,
+        description=dedent("""\
+            Consider `isd` idle if no key or mouse input was received for this long.
+            `0` disables the idle detection."""),
+    )
+
+    inventory_backend: InventoryBackend = Field(
+        default=InventoryBackend.AUTO,
+        description=dedent("""\
+            How the unit states are loaded.
+            `dbus` queries the service manager directly over a single, long-lived
+            D-Bus connection instead of spawning `systemctl` processes.
+            It requires the optional `jeepney` dependency (`isd-tui[dbus]`).
+            `json` parses the `--output=json` output of newer `systemd` versions,
+            `text` parses the plain table output of `systemctl`.
+            By default (`auto`), `json` is used if the installed `systemd` version
+            supports it and `text` otherwise.
+            The result of the `json` check is cached per `systemd` version.
+            If `dbus` fails, `isd` falls back to calling `systemctl`."""),
+    )
+
+    included_unit_types: list[UnitType] = Field(
+        default=[],
+        description=dedent("""\
+            Only load units of these types, for example, `["service", "timer"]`.
+            An empty list loads all types."""),
+    )
+
+    excluded_unit_types: list[UnitType] = Field(
+        default=[],
+        description=dedent("""\
+            Do not load units of these types, for example, `["scope", "mount", "device"]`.
+            This reduces the refresh cost on hosts with very many units of these types.
+            An excluded type is loaded on demand, as soon as the search term contains
+            its suffix, like `.mount`.
+            The type filter can be toggled at runtime (`toggle_unit_type_filter`)."""),
     )
 
     cache_input: bool = Field(
@@ -859,6 +1158,75 @@ class Settings(BaseSettings):
         default=2, description="Relative height compared to search result height."
     )
 
+    show_unit_details: bool = Field(
+        default=True,
+        description=dedent("""\
+            Show the sub-state (for example, `running` or `exited`) and the description
+            of the loaded units next to their names in the search results."""),
+    )
+
+    search_descriptions: bool = Field(
+        default=True,
+        description=dedent("""\
+            Also match the search term against the descriptions of the loaded units.
+            Units that match by their description are listed after the units
+            that match by their name."""),
+    )
+
+    search_workers: int = Field(
+        default=0,
+        ge=0,
+        description=dedent("""\
+            Number of processes that score the units of large inventories
+            in parallel while searching. `0` uses one process per CPU,
+            but at most 4.
+            The processes are only started once more than 10,000 units
+            have to be scored. Smaller inventories, or all of them with `1`,
+            are searched in a background thread, so typing never blocks
+            the interface."""),
+    )
+
+    max_search_results: int = Field(
+        default=0,
+        ge=0,
+        description=dedent("""\
+            Show at most this many of the best matching units.
+            Only the best matches are ranked and rendered, so typing stays fast
+            on hosts where a search term matches very many units.
+            Refine the search term to find the other units.
+            By default (`0`), all matches are shown."""),
+    )
+
+    search_cache_size: int = Field(
+        default=64,
+        ge=0,
+        description=dedent("""\
+            Number of search results that are kept for the current units,
+            so that deleting characters, retyping or toggling the mode
+            does not search again.
+            `0` disables the cache."""),
+    )
+
+    search_cache_max_results: int = Field(
+        default=100_000,
+        ge=0,
+        description=dedent("""\
+            Maximum number of matched units over all cached search results.
+            Bounds the memory of the search cache on hosts with very many units."""),
+    )
+
+    group_template_instances: int = Field(
+        default=0,
+        ge=0,
+        description=dedent("""\
+            Group the instances of a template, like `getty@tty1.service`, under a
+            single `getty@.service` entry once the template has at least this many
+            instances. The entry shows how many instances are in which state.
+            The instances are only searched if the entry is expanded
+            (`toggle_template_group`) or the search term contains an `@`.
+            By default (`0`), the instances are not grouped."""),
+    )
+
     # FUTURE: Allow option to select if multi-select is allowed or not.
     generic_keybindings: GenericKeybinding = Field(
         default=GenericKeybinding(),
@@ -1111,6 +1479,16 @@ def get_isd_cached_state_json_file_path() -> Path:
     return cache_dir / "state.json"
 
 
+def get_systemd_capabilities_json_file_path() -> Path:
+    cache_dir = isd_cache_dir()
+    return cache_dir / "systemd_capabilities.json"
+
+
+def get_inventory_snapshot_json_file_path(mode: str) -> Path:
+    cache_dir = isd_cache_dir()
+    return cache_dir / f"inventory_{mode}.json"
+
+
 def get_isd_persistent_json_file_path() -> Path:
     data_dir = isd_data_dir()
     return data_dir / "persistent_state.json"
@@ -1160,6 +1538,9 @@ class CustomSelectionList(SelectionList, inherit_bindings=False):
         **kwargs,
     ):
         super().__init__(**kwargs)
+        # options whose prompt is replaced by the `highlighter` when it is first rendered
+        self._unhighlighted: set[str] = set()
+        self._highlighter: Optional[Callable[[str], Text]] = None
         for keys, action, description in [
             (navigation_keybindings.down, "cursor_down", "Down"),
             (navigation_keybindings.up, "cursor_up", "Up"),
@@ -1182,6 +1563,36 @@ class CustomSelectionList(SelectionList, inherit_bindings=False):
             show=True,
         )
 
+    def highlight_when_visible(
+        self,
+        option_ids: set[str],
+        highlighter: Optional[Callable[[str], Text]] = None,
+    ) -> None:
+        """
+        Replace the prompts of the given options with the prompt that the
+        `highlighter` returns for their ID, once they are rendered.
+        Setting a new `highlighter` drops the pending options of the previous one.
+        So only the visible search results are highlighted, no matter how many match.
+        """
+        if highlighter is not None:
+            self._highlighter = highlighter
+            self._unhighlighted = set(option_ids)
+        else:
+            self._unhighlighted.update(option_ids)
+
+    def render_line(self, y: int) -> Strip:
+        # all prompts are a single line, see `Selection`
+        if len(self._unhighlighted) > 0 and self._highlighter is not None:
+            _, scroll_y = self.scroll_offset
+            try:
+                option = self.get_option_at_index(scroll_y + y)
+            except OptionDoesNotExist:
+                option = None
+            if option is not None and option.id in self._unhighlighted:
+                self._unhighlighted.discard(option.id)
+                option._set_prompt(self._highlighter(option.id))
+        return super().render_line(y)
+
     async def on_click(self, event: events.Click) -> None:
         """React to the mouse being clicked on an item.
 
@@ -1238,11 +1649,15 @@ class UnitReprState(Enum):
     # state for unit files that are only listed in
     # the output of `list-unit-files`
     file = auto()
+    # fallback for states that are unknown to `isd`,
+    # for example, if a newer `systemd` version adds new states.
+    unknown = auto()
 
     def render_state(
         self,
         unit: str,
         highlight_indices: Optional[List[int]] = None,
+        details: Optional[UnitDetails] = None,
         color_success: str = "green",
         color_warn: str = "yellow",
         color_error: str = "error",
@@ -1252,6 +1667,9 @@ class UnitReprState(Enum):
         """
         Given a `unit` and an optional list of indices, highlight them depending
         on the state.
+        If `details` are given, the sub-state and description follow the name.
+        Indices beyond the name refer to the description
+        (see `search_unit_names`).
         Return a rich `Text` object with the correct styling.
 
         Use mapping from upstream:
@@ -1293,13 +1711,30 @@ class UnitReprState(Enum):
             raise NotImplementedError("Unknown render state")
 
         text = Text(unit)
+        description = Text(
+            details.description
+            if details is not None and details.description != unit
+            else ""
+        )
         if highlight_indices is not None and len(highlight_indices) > 0:
+            description_offset = len(unit) + 1
             for idx in highlight_indices:
-                text.stylize(
-                    Style(bold=True),
-                    start=idx,
-                    end=idx + 1,
+                if idx < len(unit):
+                    text.stylize(Style(bold=True), start=idx, end=idx + 1)
+                else:
+                    idx -= description_offset
+                    description.stylize(Style(bold=True), start=idx, end=idx + 1)
+
+        if details is not None:
+            text.append_text(
+                Text.assemble(
+                    *(("  ", details.sub_state) if details.sub_state != "" else ()),
+                    *(("  ", description) if len(description) > 0 else ()),
+                    # `color_inactive` may be a muted color like `auto 60%`,
+                    # which cannot be used for a span (see below).
+                    style=Style(dim=True),
                 )
+            )
 
         # One limitation is that `style` passes colors like:
         # `auto 75%` for the _muted_ text.
@@ -1309,195 +1744,1348 @@ class UnitReprState(Enum):
         return Text.assemble(prefix, " ", text, style=style)
 
 
-def parse_list_unit_files_lines(lines: str) -> dict[str, UnitReprState]:
+# Known unit types, the position is used as the code in the type column
+# of the `UnitInventory`. Code `0` is used for unknown types.
+UNIT_TYPES: Tuple[str, ...] = ("", *(t.value for t in UnitType))
+_UNIT_TYPE_CODES: Dict[str, int] = {t: code for code, t in enumerate(UNIT_TYPES)}
+# The state column stores the value of the `UnitReprState`.
+_UNIT_REPR_STATE_BY_CODE: Tuple[Optional[UnitReprState], ...] = (
+    None,
+    *sorted(UnitReprState, key=lambda state: state.value),
+)
+assert all(
+    state is None or state.value == code
+    for code, state in enumerate(_UNIT_REPR_STATE_BY_CODE)
+)
+
+
+def unit_type(unit: str) -> str:
     """
-    This output seems to be quite a bit less stable over different
-    `systemd` versions.
-    From what I can tell, the unit-files can be one of
-    (v229) static, enabled, disabled, masked, or
-    (v233) enabled, generated, linked, alias, masked, enabled-runtime.
-    -> I will simply map those to a special `UnitReprState` and use
-    that as a fall back if the actual `list-units` call does not
-    provide any actual info.
+    Return the type of the `unit`, i.e., its suffix.
     """
-    d = {}
-    for i, line in enumerate(lines.splitlines()):
-        # if i == 0:
-        #     columns = line.split()
-        #     # May receive an empty input if no user units exist!
-        #     if columns == "":
-        #         return {}
-        #     # strictly speaking it should be "UNIT FILE"
-        #     assert columns[0] == "UNIT"
-        #     assert columns[1] == "FILE"
-        #     continue
-        if line == "":
-            # End of structured output.
-            # The remaining lines contain the legend description.
-            break
-        #
-        fields = line.split(maxsplit=1)
-        unit_file_name = fields[0]
-        d[unit_file_name] = UnitReprState.file
-    return d
+    return unit.rpartition(".")[2]
 
 
-def parse_list_units_lines(lines: str) -> dict[str, UnitReprState]:
+def template_of(unit: str) -> Optional[str]:
     """
-    Parses data that was generated with `systemctl list-units --full --all --plain`.
-    Skips the first row and stop after seeing the first empty line.
+    Return the template of the instance `unit`, for example,
+    `getty@.service` for `getty@tty1.service`, or `None` if it is no instance.
+    """
+    prefix, at, rest = unit.partition("@")
+    instance, dot, suffix = rest.rpartition(".")
+    if at == "" or dot == "" or instance == "":
+        return None
+    return f"{prefix}@.{suffix}"
 
-    Throughput notes:
-    Generating the mappings for a file that is over
-    100'000 lines long with > 21MB of data, the runtime
-    is about 170 ms. I won't optimize this further.
-    If necessary, optimize reading the data from the pipe
-    to process the data in chunks. Using `re` was slower.
+
+class UnitDetails(NamedTuple):
+    """
+    The `SUB` and `DESCRIPTION` columns of `systemctl list-units`.
     """
-    d = {}
-    for i, line in enumerate(lines.splitlines()):
-        if line == "":
-            # End of structured output.
-            break
 
-        fields = line.split()
-        unit = fields[0]
-        load_value = fields[1]
-        active_value = fields[2]
+    sub_state: str
+    description: str
 
-        if active_value in (
-            "active",
-            "reloading",
-            "refreshing",
-            "deactivating",
-            "activating",
-            "maintenance",
-            "failed",
-        ):
-            d[unit] = UnitReprState[active_value]
-        elif active_value == "inactive":
-            if load_value == "loaded":
-                # If the value is `loaded` fall back to the
-                # default `invalid` state.
-                # For example, a crashed unit falls into `invalid`
-                # with `loaded` and has the sub state failed.
-                d[unit] = UnitReprState["inactive"]
-            else:
-                # Try to derive custom, more concrete value from `load_value`
-                # If it is something different than 'loaded' I can
-                # provide more information.
-                # This should be one of `masked`, `bad-setting`, `not-found`, `error`
-                d[unit] = UnitReprState[load_value.replace("-", "_")]
-        else:
-            raise NotImplementedError("Reached an unknown unit state.")
-    return d
+
+NO_UNIT_DETAILS = UnitDetails("", "")
 
 
-async def load_unit_to_state_dict(mode: str, *pattern: str) -> Dict[str, UnitReprState]:
+class UnitStates(Dict[str, UnitReprState]):
     """
-    Calls `list-unit-files` and `list-units` command and parses the output.
-    Returns mapping from the unit name to its `UnitReprState` to allow
-    customized coloring.
+    Mapping from the unit name to its `UnitReprState` as returned by the loaders.
 
-    The output of `list-unit-files` contains ALL units but not with the most specific information.
-    The output of `list-units` only contains those in memory but contains relevant
-    information for coloring.
+    `details` holds the `UnitDetails` of the units that were listed by `list-units`.
+    Units that are only known from `list-unit-files` have no details.
+    """
 
-    The mode defines which types of units should be loaded.
+    def __init__(
+        self,
+        unit_to_state_dict: Mapping[str, UnitReprState] = {},
+        details: Optional[Dict[str, UnitDetails]] = None,
+    ) -> None:
+        super().__init__(unit_to_state_dict)
+        self.details: Dict[str, UnitDetails] = {} if details is None else details
 
-    By default, it will load ALL units of the configured `mode`
-    but if `patterns` is given, those will be forwarded to the
-    `list-unit-files` and `list-units` calls!
+
+def unit_details_of(
+    unit_to_state_dict: Mapping[str, UnitReprState],
+) -> Dict[str, UnitDetails]:
+    if isinstance(unit_to_state_dict, (UnitStates, UnitInventory)):
+        return unit_to_state_dict.details
+    return {}
+
+
+class InventoryDelta:
     """
-    list_units = [
-        get_systemctl_bin(),
-        "list-units",
-    ]
-    list_unit_files = [
-        get_systemctl_bin(),
-        "list-unit-files",
-    ]
-    if mode == "user":
-        mode_arg = ["--user"]
-    else:
-        mode_arg = []
+    The changes that a `UnitInventory.update` or `replace` call has applied.
 
-    args = mode_arg + [
-        "--all",
-        "--full",
-        "--plain",
-        "--no-legend",
-        "--",
-        *pattern,
-    ]
-    proc = await asyncio.create_subprocess_exec(
-        *list_units,
-        *args,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-        stdin=subprocess.DEVNULL,
-    )
-    stdout, stderr = await proc.communicate()
-    # proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    parsed_units = parse_list_units_lines(stdout.decode())
+    - `added` and `removed` map the units to their new or last `UnitReprState`.
+    - `changed` maps the units whose state or details have changed
+      to their old and new `UnitReprState`.
+    - `search_changed` is set if the order of the units or a description
+      has changed, which may change the search results of unchanged units.
 
-    proc = await asyncio.create_subprocess_exec(
-        *list_unit_files,
-        *args,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-        stdin=subprocess.DEVNULL,
-    )
-    stdout, stderr = await proc.communicate()
+    The delta is falsy if nothing has changed.
+    """
 
-    # If there are no matches for the selected pattern,
-    # `systemctl list-unit-files` returns a non-zero exit code!
-    # Better to check `stderr`.
-    if stderr.decode() != "":
-        raise Exception(proc.stderr)
+    __slots__ = ("added", "removed", "changed", "search_changed")
 
-    parsed_unit_files = parse_list_unit_files_lines(stdout.decode())
-    return {**parsed_unit_files, **parsed_units}
+    def __init__(self) -> None:
+        self.added: Dict[str, UnitReprState] = {}
+        self.removed: Dict[str, UnitReprState] = {}
+        self.changed: Dict[str, Tuple[UnitReprState, UnitReprState]] = {}
+        self.search_changed = False
 
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed or self.search_changed)
 
-def show_command(*args: str) -> None:
-    # clean up terminal
-    subprocess.call("clear")
-    # show current command
-    print(f"\n$ {' '.join(args)}")
+    def __repr__(self) -> str:
+        return (
+            f"InventoryDelta(added={self.added!r}, removed={self.removed!r}, "
+            f"changed={self.changed!r}, search_changed={self.search_changed!r})"
+        )
 
+    @property
+    def requires_search(self) -> bool:
+        """
+        Whether the search results have to be recomputed.
+        Otherwise, only the `changed` units have to be rendered again.
+        """
+        return bool(self.added or self.removed or self.search_changed)
 
-async def systemctl_async(
-    *cmd: str,
-    mode: str,
-    units: Iterable[str],
-    sudo: bool = False,
-    foreground: bool = False,
-    head: Optional[int] = None,
-    ask_password: bool = False,
-) -> Tuple[int, str, str]:
-    sys_cmd = systemctl_args_builder(
-        *cmd, mode=mode, units=units, sudo=sudo, ask_password=ask_password
-    )
-    if foreground:
-        show_command(*sys_cmd)
-    proc = await asyncio.create_subprocess_exec(
-        *sys_cmd,
-        stdout=None if foreground else asyncio.subprocess.PIPE,
-        stderr=None if foreground else asyncio.subprocess.PIPE,
-        env=env_with_color(),
-        stdin=None if foreground else subprocess.DEVNULL,
-    )
-    # maxlen appending works as a fifo.
-    stdout_deque: Deque[bytes] = Deque(maxlen=head)
-    if proc.stdout is not None:
-        i = 0
-        async for line in proc.stdout:
-            stdout_deque.append(line.rstrip())
-            i += 1
-            if i == head:
-                break
-    stderr_deque: Deque[bytes] = Deque(maxlen=head)
+    def units(self) -> set[str]:
+        """
+        Return all added, removed and changed units.
+        """
+        return self.added.keys() | self.removed.keys() | self.changed.keys()
+
+
+class TemplateGroups(NamedTuple):
+    """
+    The units of a `UnitInventory` with the instances of the large templates
+    collapsed into a single entry, the name of the template.
+
+    - `names` and `descriptions` replace the instances of the templates in
+      `instances` with the template, at the position of its first instance.
+      The template has no description.
+    - `masks` holds the `character_mask` of the `names`.
+    - `instances` maps the templates to their instances in display order.
+    - `state_counts` caches the result of `UnitInventory.instance_state_counts`.
+    """
+
+    names: List[str]
+    descriptions: List[str]
+    masks: array[int]
+    instances: Dict[str, List[str]]
+    state_counts: Dict[str, Counter[UnitReprState]]
+
+
+def _index_size(units: int) -> int:
+    """
+    Return the number of slots of the `UnitInventory` name index for `units`,
+    a power of two that keeps the index at most two thirds full.
+    """
+    size = 8
+    while size * 2 < units * 3:
+        size *= 2
+    return size
+
+
+class UnitInventory(Mapping[str, UnitReprState]):
+    """
+    The units of a `mode` and their `UnitReprState`.
+
+    The units are stored column-wise and by ID to keep the memory footprint
+    below the one of a plain `dict` on hosts with very many units:
+    - `names` holds the unit names in display order.
+      The position of a unit is its ID.
+    - The states are stored as the value of the `UnitReprState` and the unit types
+      as codes, both in a `bytearray`.
+    - The ID of a name is looked up in an open-addressing hash table, an `array` of
+      `ID + 1` with `0` marking a free slot.
+      A `dict` from the name to the ID would need an `int` object per unit.
+    - Units that are already known keep their name object, so the strings of
+      a new load are released instead of being stored next to the old ones.
+
+    - The `UnitDetails` are only stored for the units that have them.
+      `descriptions` is derived from them and cached per `version`.
+
+    - `name_masks` holds the `character_mask` of every name in the order of `names`
+      and `description_masks` the ones of the non-empty descriptions.
+      They let the search drop the units that cannot match before scoring them.
+      Both are only computed on first use and then maintained along with the
+      units, reusing the masks of the unchanged units.
+
+    - `tombstones` holds the units that were missing from a refresh and
+      when they were first missed, until they are found again or `evict`ed.
+
+    The `names` list is shared with the search and must not be modified
+    by the caller.
+    IDs are stable until `replace` or `evict` is called.
+
+    All changes go through `update` or `replace` and increment `version`
+    if, and only if, a state or the details have actually changed.
+    Consumers can compare the `version` instead of the full mapping.
+    """
+
+    def __init__(
+        self, unit_to_state_dict: Optional[Mapping[str, UnitReprState]] = None
+    ):
+        self.names: List[str] = []
+        self._states = bytearray()
+        self._types = bytearray()
+        self._index: array[int] = array("I", bytes(4 * _index_size(0)))
+        self._name_masks: Optional[array[int]] = None
+        self.details: Dict[str, UnitDetails] = {}
+        self._description_masks: Optional[Dict[str, int]] = None
+        self.tombstones: Dict[str, float] = {}
+        self._descriptions: Tuple[int, List[str]] = (-1, [])
+        self._template_groups: Optional[Tuple[Tuple[int, int, int], TemplateGroups]] = (
+            None
+        )
+        self.version = 0
+        if unit_to_state_dict is not None:
+            self._set_units(
+                list(unit_to_state_dict),
+                bytearray(state.value for state in unit_to_state_dict.values()),
+                None,
+            )
+            self.details = dict(unit_details_of(unit_to_state_dict))
+
+    def _id_of(self, unit: object) -> int:
+        """
+        Return the ID of the `unit` or `-1` if it is unknown.
+        """
+        index = self._index
+        slot_mask = len(index) - 1
+        slot = hash(unit) & slot_mask
+        names = self.names
+        while (unit_id := index[slot]) != 0:
+            if names[unit_id - 1] == unit:
+                return unit_id - 1
+            slot = (slot + 1) & slot_mask
+        return -1
+
+    def _index_units(self, first_id: int) -> None:
+        """
+        Add the units from `first_id` on to the index.
+        If the index would become too full, all units are added to a larger one.
+        """
+        names = self.names
+        index = self._index
+        size = _index_size(len(names))
+        if len(index) < size:
+            index = array("I", bytes(4 * size))
+            first_id = 0
+        slot_mask = len(index) - 1
+        for unit_id in range(first_id, len(names)):
+            slot = hash(names[unit_id]) & slot_mask
+            while index[slot] != 0:
+                slot = (slot + 1) & slot_mask
+            index[slot] = unit_id + 1
+        self._index = index
+
+    def _set_units(
+        self, names: List[str], states: bytearray, name_masks: Optional[array[int]]
+    ) -> None:
+        """
+        Replace all units with the given columns and index them.
+        New containers must be passed, since `names` may still be used by a running search.
+        """
+        self.names = names
+        self._states = states
+        self._types = bytearray(
+            _UNIT_TYPE_CODES.get(unit_type(unit), 0) for unit in names
+        )
+        self._name_masks = name_masks
+        self._index = array("I", bytes(4 * _index_size(len(names))))
+        self._index_units(0)
+
+    def _append(self, items: Iterable[Tuple[str, UnitReprState]]) -> None:
+        """
+        Append the new units.
+        Their masks are only computed if the `name_masks` are already in use.
+        """
+        first_id = len(self.names)
+        name_masks = self._name_masks
+        for unit, state in items:
+            self.names.append(unit)
+            self._states.append(state.value)
+            self._types.append(_UNIT_TYPE_CODES.get(unit_type(unit), 0))
+            if name_masks is not None:
+                name_masks.append(character_mask(unit))
+        self._index_units(first_id)
+
+    @property
+    def name_masks(self) -> array[int]:
+        """
+        The `character_mask` of every unit in the order of `names`.
+        Like `names`, the array must not be modified by the caller.
+        """
+        if self._name_masks is None:
+            self._name_masks = array("Q", map(character_mask, self.names))
+        return self._name_masks
+
+    @property
+    def description_masks(self) -> Dict[str, int]:
+        """
+        The `character_mask` of the non-empty descriptions by unit.
+        Must not be modified by the caller.
+        """
+        if self._description_masks is None:
+            self._description_masks = {
+                unit: character_mask(unit_details.description)
+                for unit, unit_details in self.details.items()
+                if unit_details.description != ""
+            }
+        return self._description_masks
+
+    def _update_description_mask(self, unit: str, description: str) -> None:
+        masks = self._description_masks
+        if masks is None:
+            return
+        if description == "":
+            masks.pop(unit, None)
+        else:
+            masks[unit] = character_mask(description)
+
+    def _replace_description_masks(
+        self, old_details: Mapping[str, UnitDetails]
+    ) -> None:
+        """
+        Rebuild the computed `description_masks` after the `details` were replaced
+        and reuse the masks of the unchanged descriptions.
+        """
+        old_masks = self._description_masks
+        if old_masks is None:
+            return
+        masks = {}
+        for unit, unit_details in self.details.items():
+            description = unit_details.description
+            if description == "":
+                continue
+            mask = old_masks.get(unit)
+            if mask is None or old_details[unit].description != description:
+                mask = character_mask(description)
+            masks[unit] = mask
+        self._description_masks = masks
+
+    def __getitem__(self, unit: str) -> UnitReprState:
+        unit_id = self._id_of(unit)
+        if unit_id < 0:
+            raise KeyError(unit)
+        return self.state_of(unit_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, unit: object) -> bool:
+        return self._id_of(unit) >= 0
+
+    def state_of(self, unit_id: int) -> UnitReprState:
+        """
+        Return the state of the unit with the given ID.
+        """
+        return cast(UnitReprState, _UNIT_REPR_STATE_BY_CODE[self._states[unit_id]])
+
+    def type_of(self, unit_id: int) -> str:
+        """
+        Return the type of the unit with the given ID or
+        an empty string if the type is unknown.
+        """
+        return UNIT_TYPES[self._types[unit_id]]
+
+    def details_of(self, unit: str) -> UnitDetails:
+        return self.details.get(unit, NO_UNIT_DETAILS)
+
+    @property
+    def descriptions(self) -> List[str]:
+        """
+        The descriptions in the order of `names`.
+        Units without details have an empty description.
+        Like `names`, the list must not be modified by the caller.
+        """
+        version, descriptions = self._descriptions
+        if version != self.version or len(descriptions) != len(self.names):
+            details = self.details
+            descriptions = [
+                details.get(unit, NO_UNIT_DETAILS).description for unit in self.names
+            ]
+            self._descriptions = (self.version, descriptions)
+        return descriptions
+
+    def template_groups(self, min_instances: int) -> TemplateGroups:
+        """
+        Return the `TemplateGroups` of all templates with at least
+        `min_instances` instances.
+        The groups are cached per `version`, so a search only has to scan
+        the templates instead of all their instances.
+        """
+        key = (self.version, len(self.names), min_instances)
+        if self._template_groups is not None and self._template_groups[0] == key:
+            return self._template_groups[1]
+        templates = [template_of(unit) for unit in self.names]
+        instances: Dict[str, List[str]] = {}
+        for unit, template in zip(self.names, templates):
+            if template is not None:
+                instances.setdefault(template, []).append(unit)
+        instances = {
+            template: units
+            for template, units in instances.items()
+            if len(units) >= min_instances
+        }
+        names = []
+        descriptions = []
+        masks = array("Q")
+        details = self.details
+        for unit, template, mask in zip(self.names, templates, self.name_masks):
+            if unit in instances:
+                # the template unit itself is shown as the group
+                continue
+            if template in instances:
+                if instances[template][0] != unit:
+                    continue
+                names.append(template)
+                descriptions.append("")
+                masks.append(character_mask(template))
+            else:
+                names.append(unit)
+                descriptions.append(details.get(unit, NO_UNIT_DETAILS).description)
+                masks.append(mask)
+        groups = TemplateGroups(names, descriptions, masks, instances, {})
+        self._template_groups = (key, groups)
+        return groups
+
+    def instance_state_counts(
+        self, groups: TemplateGroups, template: str
+    ) -> Counter[UnitReprState]:
+        """
+        Return how many instances of the grouped `template` are in which state.
+        """
+        counts = groups.state_counts.get(template)
+        if counts is None:
+            counts = Counter(self[unit] for unit in groups.instances[template])
+            groups.state_counts[template] = counts
+        return counts
+
+    def update(self, unit_to_state_dict: Mapping[str, UnitReprState]) -> InventoryDelta:
+        """
+        Apply the given partial states and their details in place.
+        New units are appended.
+        Returns the `InventoryDelta`, which is falsy if nothing has changed.
+        """
+        names = self.names
+        states = self._states
+        details = self.details
+        new_details = unit_details_of(unit_to_state_dict)
+        delta = InventoryDelta()
+        new_units = []
+        for unit, state in unit_to_state_dict.items():
+            unit_id = self._id_of(unit)
+            if unit_id < 0:
+                new_units.append((unit, state))
+                delta.added[unit] = state
+                if unit in new_details:
+                    details[unit] = new_details[unit]
+                    self._update_description_mask(unit, new_details[unit].description)
+                continue
+            unit_details = new_details.get(unit)
+            unit = names[unit_id]
+            old_details = details.get(unit)
+            if unit_details is None:
+                # no longer loaded
+                details.pop(unit, None)
+            else:
+                details[unit] = unit_details
+            code = states[unit_id]
+            if code != state.value or old_details != unit_details:
+                states[unit_id] = state.value
+                delta.changed[unit] = (
+                    cast(UnitReprState, _UNIT_REPR_STATE_BY_CODE[code]),
+                    state,
+                )
+                description = (unit_details or NO_UNIT_DETAILS).description
+                if (old_details or NO_UNIT_DETAILS).description != description:
+                    delta.search_changed = True
+                    self._update_description_mask(unit, description)
+        if len(new_units) > 0:
+            self._append(new_units)
+        if delta:
+            self.version += 1
+        return delta
+
+    def replace(
+        self, unit_to_state_dict: Mapping[str, UnitReprState]
+    ) -> InventoryDelta:
+        """
+        Replace all units, for example, after the `mode` has changed.
+        Returns the `InventoryDelta`, which is falsy if nothing has changed.
+        """
+        new_details = unit_details_of(unit_to_state_dict)
+        old_names = self.names
+        old_states = self._states
+        old_masks = self._name_masks
+        old_details = self.details
+        delta = InventoryDelta()
+        names: List[str] = []
+        states = bytearray()
+        name_masks = None if old_masks is None else array("Q")
+        details: Dict[str, UnitDetails] = {}
+        for unit, state in unit_to_state_dict.items():
+            unit_details = new_details.get(unit)
+            old_id = self._id_of(unit)
+            if old_id < 0:
+                delta.added[unit] = state
+                if name_masks is not None:
+                    name_masks.append(character_mask(unit))
+            else:
+                unit = old_names[old_id]
+                if old_masks is not None and name_masks is not None:
+                    name_masks.append(old_masks[old_id])
+                code = old_states[old_id]
+                if code != state.value or old_details.get(unit) != unit_details:
+                    delta.changed[unit] = (
+                        cast(UnitReprState, _UNIT_REPR_STATE_BY_CODE[code]),
+                        state,
+                    )
+                    if (
+                        old_details.get(unit, NO_UNIT_DETAILS).description
+                        != (unit_details or NO_UNIT_DETAILS).description
+                    ):
+                        delta.search_changed = True
+            names.append(unit)
+            states.append(state.value)
+            if unit_details is not None:
+                details[unit] = unit_details
+        if len(names) - len(delta.added) != len(old_names):
+            for unit_id, unit in enumerate(old_names):
+                if unit not in unit_to_state_dict:
+                    delta.removed[unit] = self.state_of(unit_id)
+        # the order of the units is relevant for the search results
+        if not delta.requires_search and any(
+            unit is not name for unit, name in zip(names, old_names)
+        ):
+            delta.search_changed = True
+        self.tombstones = {
+            unit: vanished_at
+            for unit, vanished_at in self.tombstones.items()
+            if unit in unit_to_state_dict
+        }
+        if not delta:
+            return delta
+        self._set_units(names, states, name_masks)
+        self.details = details
+        self._replace_description_masks(old_details)
+        self.version += 1
+        return delta
+
+    def update_tombstones(
+        self, vanished: Iterable[str], found: AbstractContainer[str], now: float
+    ) -> None:
+        """
+        Tombstone the `vanished` units at `now`, unless they already are,
+        and revive the tombstoned units that were `found` again.
+        """
+        tombstones = self.tombstones
+        for unit in [unit for unit in tombstones if unit in found]:
+            del tombstones[unit]
+        for unit in vanished:
+            tombstones.setdefault(unit, now)
+
+    def evict(
+        self, deadline: float, keep: AbstractContainer[str] = ()
+    ) -> InventoryDelta:
+        """
+        Remove the units that were tombstoned before `deadline`,
+        except for the units in `keep`.
+        """
+        delta = InventoryDelta()
+        for unit, vanished_at in list(self.tombstones.items()):
+            if vanished_at <= deadline and unit not in keep:
+                del self.tombstones[unit]
+                delta.removed[unit] = self[unit]
+        if not delta:
+            return delta
+        removed = delta.removed
+        for unit in removed:
+            self.details.pop(unit, None)
+            self._update_description_mask(unit, "")
+        kept_ids = [
+            unit_id for unit_id, unit in enumerate(self.names) if unit not in removed
+        ]
+        name_masks = self._name_masks
+        self._set_units(
+            [self.names[unit_id] for unit_id in kept_ids],
+            bytearray(self._states[unit_id] for unit_id in kept_ids),
+            None
+            if name_masks is None
+            else array("Q", (name_masks[unit_id] for unit_id in kept_ids)),
+        )
+        self.version += 1
+        return delta
+
+
+def parse_list_unit_files_lines(lines: str) -> UnitStates:
+    """
+    This output seems to be quite a bit less stable over different
+    `systemd` versions.
+    From what I can tell, the unit-files can be one of
+    (v229) static, enabled, disabled, masked, or
+    (v233) enabled, generated, linked, alias, masked, enabled-runtime.
+    -> I will simply map those to a special `UnitReprState` and use
+    that as a fall back if the actual `list-units` call does not
+    provide any actual info.
+    """
+    d = UnitStates()
+    for i, line in enumerate(lines.splitlines()):
+        # if i == 0:
+        #     columns = line.split()
+        #     # May receive an empty input if no user units exist!
+        #     if columns == "":
+        #         return {}
+        #     # strictly speaking it should be "UNIT FILE"
+        #     assert columns[0] == "UNIT"
+        #     assert columns[1] == "FILE"
+        #     continue
+        if line == "":
+            # End of structured output.
+            # The remaining lines contain the legend description.
+            break
+        #
+        fields = line.split(maxsplit=1)
+        unit_file_name = fields[0]
+        d[unit_file_name] = UnitReprState.file
+    return d
+
+
+def unit_repr_state_from_columns(load_value: str, active_value: str) -> UnitReprState:
+    """
+    Derive the `UnitReprState` from the `LOAD` and `ACTIVE` columns
+    of `systemctl list-units`.
+    Unknown values are mapped to `UnitReprState.unknown`.
+    """
+    if active_value in (
+        "active",
+        "reloading",
+        "refreshing",
+        "deactivating",
+        "activating",
+        "maintenance",
+        "failed",
+    ):
+        return UnitReprState[active_value]
+    elif active_value == "inactive":
+        if load_value == "loaded":
+            # If the value is `loaded` fall back to the
+            # default `invalid` state.
+            # For example, a crashed unit falls into `invalid`
+            # with `loaded` and has the sub state failed.
+            return UnitReprState["inactive"]
+        else:
+            # Try to derive custom, more concrete value from `load_value`
+            # If it is something different than 'loaded' I can
+            # provide more information.
+            # This should be one of `masked`, `bad-setting`, `not-found`, `error`
+            state = UnitReprState.__members__.get(load_value.replace("-", "_"))
+            return state if state is not None else UnitReprState.unknown
+    else:
+        # Do not crash on states that are unknown to `isd`.
+        return UnitReprState.unknown
+
+
+def parse_list_units_lines(lines: str) -> UnitStates:
+    """
+    Parses data that was generated with `systemctl list-units --full --all --plain`.
+    Skips the first row and stop after seeing the first empty line.
+
+    Throughput notes:
+    Generating the mappings for a file that is over
+    100'000 lines long with > 21MB of data, the runtime
+    is about 170 ms. Using `re` was slower.
+    When reading from the `systemctl` pipe, prefer the
+    `ListUnitsStreamParser`, which parses the output in chunks
+    while `systemctl` is still writing it.
+
+    The `SUB` and `DESCRIPTION` columns are kept as `UnitDetails`.
+    """
+    d = UnitStates()
+    for i, line in enumerate(lines.splitlines()):
+        if line == "":
+            # End of structured output.
+            break
+
+        fields = line.split(maxsplit=4)
+        unit = fields[0]
+        load_value = fields[1]
+        active_value = fields[2]
+        d[unit] = unit_repr_state_from_columns(load_value, active_value)
+        d.details[unit] = UnitDetails(
+            fields[3] if len(fields) > 3 else "",
+            fields[4].rstrip() if len(fields) > 4 else "",
+        )
+    return d
+
+
+class UnitListParser(ABC):
+    """
+    Parses the raw `bytes` output of a `systemctl` listing command,
+    which is given chunk-wise via `feed`, into a mapping from the unit name
+    to its `UnitReprState`.
+    Call `finish` after the last chunk to get the parsed mapping.
+    """
+
+    def __init__(self) -> None:
+        self.unit_to_state_dict = UnitStates()
+
+    @abstractmethod
+    def feed(self, chunk: bytes) -> None: ...
+
+    @abstractmethod
+    def finish(self) -> UnitStates: ...
+
+
+class UnitListStreamParser(UnitListParser):
+    """
+    Incrementally parses the raw `bytes` output of a `systemctl` listing command
+    into a mapping from the unit name to its `UnitReprState`.
+
+    The data is given chunk-wise via `feed` and may be split at arbitrary positions.
+    Only the trailing incomplete line of a chunk is kept around, so neither the
+    full decoded output nor a list of all lines is ever created.
+    As with the `parse_*_lines` functions, parsing stops at the first empty line.
+    Call `finish` after the last chunk to get the parsed mapping.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._remainder = b""
+        self._done = False
+
+    @abstractmethod
+    def parse_line(self, line: bytes) -> None: ...
+
+    def feed(self, chunk: bytes) -> None:
+        if self._done:
+            # Structured output has ended, the rest is only the legend.
+            return
+        lines = (self._remainder + chunk).split(b"\n")
+        self._remainder = lines.pop()
+        for line in lines:
+            if line == b"":
+                # End of structured output.
+                self._done = True
+                self._remainder = b""
+                return
+            self.parse_line(line)
+
+    def finish(self) -> UnitStates:
+        if not self._done and self._remainder != b"":
+            self.parse_line(self._remainder)
+        self._remainder = b""
+        self._done = True
+        return self.unit_to_state_dict
+
+
+class ListUnitsStreamParser(UnitListStreamParser):
+    """
+    Streaming version of `parse_list_units_lines`.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        # There are only a handful of distinct `LOAD`/`ACTIVE` combinations.
+        # Cache the derived states to avoid decoding the columns for every line.
+        self._state_cache: Dict[Tuple[bytes, bytes], UnitReprState] = {}
+        # The same goes for the few distinct sub-states, which are then also shared.
+        self._sub_state_cache: Dict[bytes, str] = {}
+
+    def parse_line(self, line: bytes) -> None:
+        unit, load_value, active_value, *rest = line.split(maxsplit=4)
+        key = (load_value, active_value)
+        state = self._state_cache.get(key)
+        if state is None:
+            state = unit_repr_state_from_columns(
+                load_value.decode(), active_value.decode()
+            )
+            self._state_cache[key] = state
+        sub_value = rest[0] if len(rest) > 0 else b""
+        sub_state = self._sub_state_cache.get(sub_value)
+        if sub_state is None:
+            sub_state = self._sub_state_cache[sub_value] = sub_value.decode()
+        description = rest[1].rstrip().decode() if len(rest) > 1 else ""
+        unit_name = unit.decode()
+        self.unit_to_state_dict[unit_name] = state
+        self.unit_to_state_dict.details[unit_name] = UnitDetails(sub_state, description)
+
+
+class ListUnitFilesStreamParser(UnitListStreamParser):
+    """
+    Streaming version of `parse_list_unit_files_lines`.
+    """
+
+    def parse_line(self, line: bytes) -> None:
+        unit_file_name = line.split(maxsplit=1)[0]
+        self.unit_to_state_dict[unit_file_name.decode()] = UnitReprState.file
+
+
+class JsonUnitListParser(UnitListParser):
+    """
+    Parses the `--output=json` output of a `systemctl` listing command.
+    The JSON document can only be decoded as a whole, so the chunks
+    are collected until `finish` is called.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> None:
+        self._chunks.append(chunk)
+
+    @abstractmethod
+    def parse_entry(self, entry: Dict[str, Any]) -> None: ...
+
+    def finish(self) -> UnitStates:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        # No output is generated if `list-unit-files` has no matches.
+        if data.strip() != b"":
+            for entry in json.loads(data):
+                self.parse_entry(entry)
+        return self.unit_to_state_dict
+
+
+class ListUnitsJsonParser(JsonUnitListParser):
+    def parse_entry(self, entry: Dict[str, Any]) -> None:
+        unit = entry["unit"]
+        self.unit_to_state_dict[unit] = unit_repr_state_from_columns(
+            entry["load"], entry["active"]
+        )
+        self.unit_to_state_dict.details[unit] = UnitDetails(
+            entry.get("sub") or "", entry.get("description") or ""
+        )
+
+
+class ListUnitFilesJsonParser(JsonUnitListParser):
+    def parse_entry(self, entry: Dict[str, Any]) -> None:
+        self.unit_to_state_dict[entry["unit_file"]] = UnitReprState.file
+
+
+def parse_list_units_json(data: str) -> UnitStates:
+    """
+    Parses data that was generated with `systemctl list-units --all --output=json`.
+    """
+    parser = ListUnitsJsonParser()
+    parser.feed(data.encode())
+    return parser.finish()
+
+
+def parse_list_unit_files_json(data: str) -> UnitStates:
+    """
+    Parses data that was generated with `systemctl list-unit-files --all --output=json`.
+    """
+    parser = ListUnitFilesJsonParser()
+    parser.feed(data.encode())
+    return parser.finish()
+
+
+# Matches the default buffer limit of `asyncio.StreamReader`.
+LIST_OUTPUT_CHUNK_SIZE = 2**16
+
+
+async def feed_stream_parser(
+    parser: UnitListParser, stream: asyncio.StreamReader
+) -> UnitStates:
+    """
+    Feed all chunks from the `stream` into the `parser` until EOF is reached.
+    The stream is always fully drained, even if the parser has already seen
+    the end of the structured output, to never block the writing process.
+    """
+    while chunk := await stream.read(LIST_OUTPUT_CHUNK_SIZE):
+        parser.feed(chunk)
+    return parser.finish()
+
+
+async def gather_or_cancel(*aws: Awaitable[Any]) -> List[Any]:
+    """
+    Like `asyncio.gather`, but if one of the awaitables fails or the
+    caller is cancelled, the others are cancelled and awaited before
+    the exception is raised, so no command keeps running in the background.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def run_systemctl_list_command(
+    subcommand: str, args: List[str], parser: UnitListParser
+) -> Tuple[int, UnitStates, bytes]:
+    """
+    Run a single `systemctl` listing `subcommand` (`list-units`/`list-unit-files`)
+    with the given `args` and return the exit code, the mapping generated
+    by `parser` and `stderr`.
+    `stdout` is parsed while `systemctl` is still writing its output.
+    """
+    proc = await get_transport().run([get_systemctl_bin(), subcommand, *args])
+    try:
+        # Read `stderr` concurrently, otherwise a full `stderr` pipe could block `systemctl`.
+        parsed, stderr = await gather_or_cancel(
+            feed_stream_parser(parser, proc.stdout),
+            proc.stderr.read(),
+        )
+    except BaseException:
+        # The parser failed or the load was cancelled.
+        # Do not leave `systemctl` running or unreaped.
+        if proc.returncode is None:
+            try:
+                proc.kill()
+            except ProcessLookupError:
+                pass
+        await proc.wait()
+        raise
+    return_code = await proc.wait()
+    return return_code, parsed, stderr
+
+
+async def load_list_units(args: List[str], parser: UnitListParser) -> UnitStates:
+    return_code, parsed, stderr = await run_systemctl_list_command(
+        "list-units", args, parser
+    )
+    # Like before, the (partial) output of a failing `list-units` is still used,
+    # as `list-unit-files` already reports if `systemctl` cannot be used at all.
+    if return_code != 0 and stderr.strip() != b"":
+        log.warning(f"`systemctl list-units` failed: {stderr.decode().strip()}")
+    return parsed
+
+
+async def load_list_unit_files(args: List[str], parser: UnitListParser) -> UnitStates:
+    _return_code, parsed, stderr = await run_systemctl_list_command(
+        "list-unit-files", args, parser
+    )
+    # If there are no matches for the selected pattern,
+    # `systemctl list-unit-files` returns a non-zero exit code!
+    # Better to check `stderr`.
+    if stderr.strip() != b"":
+        raise Exception(
+            f"`systemctl list-unit-files` failed: {stderr.decode().strip()}"
+        )
+    return parsed
+
+
+# Capabilities of the installed `systemd` version.
+# Only probed once per process and cached per `systemd` version on disk.
+_SYSTEMD_CAPABILITIES: Optional[Dict[str, Any]] = None
+
+
+async def systemd_version() -> Optional[str]:
+    """
+    Returns the first line of `systemctl --version`, for example:
+    `systemd 255 (255.4-1ubuntu8)` or `None` if it cannot be determined.
+    """
+    proc = await get_transport().run([get_systemctl_bin(), "--version"])
+    stdout, _stderr = await proc.communicate()
+    lines = stdout.decode().splitlines()
+    if proc.returncode != 0 or len(lines) == 0 or not lines[0].startswith("systemd"):
+        return None
+    return lines[0].strip()
+
+
+async def probe_systemd_json_output() -> Optional[bool]:
+    """
+    Check whether `systemctl list-units` supports `--output=json`.
+    Older versions silently ignore the option for tables and print the
+    plain output instead. So the output must be parsed to be sure.
+
+    Returns `None` if the result is inconclusive, for example, if
+    the bus could not be reached.
+    """
+    proc = await get_transport().run(
+        [
+            get_systemctl_bin(),
+            "list-units",
+            "--all",
+            "--output=json",
+            "--",
+            "isd-capability-probe.service",
+        ]
+    )
+    stdout, _stderr = await proc.communicate()
+    if proc.returncode != 0:
+        return None
+    try:
+        return isinstance(json.loads(stdout), list)
+    except ValueError:
+        return False
+
+
+async def get_systemd_capabilities() -> Dict[str, Any]:
+    """
+    Return the (cached) capabilities of the installed `systemd` version.
+    The probe results are stored in `isd_cache_dir()` and keyed by the
+    output of `systemctl --version`, so the probe only runs again
+    after `systemd` has been updated.
+    Returns an empty dictionary if the capabilities could not be determined.
+    """
+    global _SYSTEMD_CAPABILITIES
+    if _SYSTEMD_CAPABILITIES is not None:
+        return _SYSTEMD_CAPABILITIES
+
+    version = await systemd_version()
+    if version is None:
+        return {}
+
+    fp = get_systemd_capabilities_json_file_path()
+    try:
+        cached = json.loads(fp.read_text()) if fp.exists() else {}
+    except Exception as e:
+        log.error(f"Exception while reading cached capabilities from: {fp}", e)
+        cached = {}
+
+    capabilities = cached.get(version)
+    if capabilities is None:
+        json_output = await probe_systemd_json_output()
+        if json_output is None:
+            # Do not persist inconclusive results.
+            return {}
+        capabilities = {"json_output": json_output}
+        cached[version] = capabilities
+        if not is_root():
+            try:
+                fp.write_text(json.dumps(cached))
+            except Exception as e:
+                log.error(f"Exception while writing capabilities to: {fp}", e)
+
+    _SYSTEMD_CAPABILITIES = capabilities
+    return capabilities
+
+
+async def resolve_inventory_backend(backend: InventoryBackend) -> InventoryBackend:
+    """
+    Resolve the `auto` backend to the best `systemctl` output format
+    supported by the installed `systemd` version.
+    """
+    if backend != InventoryBackend.AUTO:
+        return backend
+    capabilities = await get_systemd_capabilities()
+    if capabilities.get("json_output", False):
+        return InventoryBackend.JSON
+    return InventoryBackend.TEXT
+
+
+# Long-lived D-Bus connections to the service manager of each mode.
+_DBUS_CONNECTIONS: Dict[str, DBusConnection] = {}
+# Connection attempts that are in progress, shared by concurrent callers.
+_DBUS_CONNECTING: Dict[str, asyncio.Task[DBusConnection]] = {}
+# Modes for which the bus could not be reached.
+# These will not be retried and use the `systemctl` fallback.
+_DBUS_UNAVAILABLE_MODES: set[str] = set()
+
+
+async def get_dbus_connection(mode: str) -> DBusConnection:
+    """
+    Return the shared D-Bus connection for the given `mode`
+    and (re-)connect if necessary.
+    """
+    loop = asyncio.get_running_loop()
+    connection = _DBUS_CONNECTIONS.get(mode)
+    if connection is not None and not connection.is_closed and connection.loop is loop:
+        return connection
+
+    connecting = _DBUS_CONNECTING.get(mode)
+    if connecting is None or connecting.get_loop() is not loop:
+        address = user_bus_address() if mode == "user" else system_bus_address()
+        if address is None:
+            raise ConnectionError("Could not determine the user bus address.")
+        connecting = asyncio.ensure_future(DBusConnection.connect(address))
+        _DBUS_CONNECTING[mode] = connecting
+    try:
+        connection = await asyncio.shield(connecting)
+    finally:
+        if connecting.done() and _DBUS_CONNECTING.get(mode) is connecting:
+            del _DBUS_CONNECTING[mode]
+    _DBUS_CONNECTIONS[mode] = connection
+    return connection
+
+
+async def call_systemd_manager(
+    mode: str, method: str, signature: str = "", body: Iterable[Any] = ()
+) -> List[Any]:
+    connection = await get_dbus_connection(mode)
+    return await connection.call(
+        SYSTEMD_BUS_NAME,
+        SYSTEMD_OBJECT_PATH,
+        SYSTEMD_MANAGER_INTERFACE,
+        method,
+        signature,
+        list(body),
+    )
+
+
+def resolve_unit_types(
+    included: Sequence[str], excluded: Sequence[str]
+) -> Optional[List[str]]:
+    """
+    Return the unit types that should be loaded or `None` if all types
+    should be loaded.
+    """
+    if len(included) == 0 and len(excluded) == 0:
+        return None
+    candidates = included if len(included) > 0 else [t.value for t in UnitType]
+    return [str(t) for t in candidates if t not in excluded]
+
+
+def systemctl_list_sort_key(unit: str) -> Tuple[str, str]:
+    """
+    `systemctl` sorts its listings by the unit type and then by name.
+    """
+    return unit.rsplit(".", maxsplit=1)[-1].lower(), unit.lower()
+
+
+async def load_unit_to_state_dict_dbus(
+    mode: str, *pattern: str, unit_types: Optional[Sequence[str]] = None
+) -> UnitStates:
+    """
+    D-Bus counterpart of `load_unit_to_state_dict`.
+    Calls `ListUnits`/`ListUnitFiles` or `ListUnitsByPatterns`/`ListUnitFilesByPatterns`
+    if `pattern` is given, exactly like `systemctl` does internally.
+    The `unit_types` are matched as `*.<type>` patterns if no `pattern` is given
+    and filtered afterwards otherwise.
+    The results are sorted like the `systemctl` output.
+    """
+    if unit_types is not None and len(pattern) == 0:
+        pattern = tuple(f"*.{t}" for t in unit_types)
+    if len(pattern) > 0:
+        # An empty list of states matches all states like `--all`.
+        units_call = call_systemd_manager(
+            mode, "ListUnitsByPatterns", "asas", [[], list(pattern)]
+        )
+        unit_files_call = call_systemd_manager(
+            mode, "ListUnitFilesByPatterns", "asas", [[], list(pattern)]
+        )
+    else:
+        units_call = call_systemd_manager(mode, "ListUnits")
+        unit_files_call = call_systemd_manager(mode, "ListUnitFiles")
+    (units,), (unit_files,) = await gather_or_cancel(units_call, unit_files_call)
+
+    unit_file_names = sorted(
+        (path.rsplit("/", maxsplit=1)[-1] for path, _state in unit_files),
+        key=systemctl_list_sort_key,
+    )
+    parsed_unit_files = {name: UnitReprState.file for name in unit_file_names}
+    parsed_units = UnitStates()
+    for name, description, load_value, active_value, sub_value, *_ in sorted(
+        units, key=lambda unit: systemctl_list_sort_key(unit[0])
+    ):
+        parsed_units[name] = unit_repr_state_from_columns(load_value, active_value)
+        parsed_units.details[name] = UnitDetails(sub_value, description)
+    unit_to_state_dict = UnitStates(
+        {**parsed_unit_files, **parsed_units}, parsed_units.details
+    )
+    if unit_types is not None:
+        types = set(unit_types)
+        return UnitStates(
+            {
+                unit: state
+                for unit, state in unit_to_state_dict.items()
+                if unit_type(unit) in types
+            },
+            {
+                unit: details
+                for unit, details in parsed_units.details.items()
+                if unit_type(unit) in types
+            },
+        )
+    return unit_to_state_dict
+
+
+async def load_unit_to_state_dict(
+    mode: str,
+    *pattern: str,
+    backend: InventoryBackend = InventoryBackend.AUTO,
+    unit_types: Optional[Sequence[str]] = None,
+    machine: Optional[str] = None,
+) -> UnitStates:
+    """
+    Calls `list-unit-files` and `list-units` command and parses the output.
+    Returns mapping from the unit name to its `UnitReprState` to allow
+    customized coloring.
+
+    The output of `list-unit-files` contains ALL units but not with the most specific information.
+    The output of `list-units` only contains those in memory but contains relevant
+    information for coloring.
+
+    Both commands are independent of each other and are executed concurrently.
+    Each output is parsed as soon as its command has finished, so the total
+    runtime is bound by the slower of the two calls.
+
+    The mode defines which types of units should be loaded.
+    The `backend` defines whether the units are loaded via D-Bus
+    or which output format is requested from `systemctl`.
+    The `systemctl` calls are always used as a fallback if D-Bus fails.
+
+    By default, it will load ALL units of the configured `mode`
+    but if `patterns` is given, those will be forwarded to the
+    `list-unit-files` and `list-units` calls!
+    If `unit_types` is given, only units of these types are loaded (`--type`).
+    If `machine` is given, the units of the local container are loaded
+    via `systemctl --machine=`.
+    """
+    if unit_types is not None and len(unit_types) == 0:
+        return UnitStates()
+    if (
+        backend == InventoryBackend.DBUS
+        and mode not in _DBUS_UNAVAILABLE_MODES
+        # only the buses of the host are supported
+        and machine is None
+        and get_transport().is_local
+    ):
+        try:
+            return await load_unit_to_state_dict_dbus(
+                mode, *pattern, unit_types=unit_types
+            )
+        except DBusError as e:
+            # For example, older versions do not support `ListUnitFilesByPatterns`.
+            log.warning(f"D-Bus call failed, falling back to systemctl: {e}")
+        except (OSError, EOFError) as e:
+            log.warning(f"Could not reach {mode} bus, falling back to systemctl: {e}")
+            _DBUS_UNAVAILABLE_MODES.add(mode)
+        backend = InventoryBackend.AUTO
+
+    if mode == "user":
+        mode_arg = ["--user"]
+    else:
+        mode_arg = []
+
+    backend = await resolve_inventory_backend(backend)
+    if backend == InventoryBackend.JSON:
+        output_args = ["--output=json"]
+        units_parser: UnitListParser = ListUnitsJsonParser()
+        unit_files_parser: UnitListParser = ListUnitFilesJsonParser()
+    else:
+        output_args = ["--full", "--plain", "--no-legend"]
+        units_parser = ListUnitsStreamParser()
+        unit_files_parser = ListUnitFilesStreamParser()
+
+    machine_arg = [] if machine is None else [f"--machine={machine}"]
+    type_args = [] if unit_types is None else ["--type=" + ",".join(unit_types)]
+    args = (
+        mode_arg
+        + machine_arg
+        + [
+            "--all",
+            *type_args,
+            *output_args,
+            "--",
+            *pattern,
+        ]
+    )
+    parsed_units, parsed_unit_files = await gather_or_cancel(
+        load_list_units(args, units_parser),
+        load_list_unit_files(args, unit_files_parser),
+    )
+    # The more specific `list-units` information takes precedence.
+    return UnitStates({**parsed_unit_files, **parsed_units}, parsed_units.details)
+
+
+async def load_machine_unit_to_state_dicts(
+    mode: str,
+    machines: Iterable[str],
+    *,
+    max_workers: int,
+    backend: InventoryBackend = InventoryBackend.AUTO,
+    unit_types: Optional[Sequence[str]] = None,
+) -> Tuple[Dict[str, UnitStates], Dict[str, Exception]]:
+    """
+    Load the units of `mode` of all `machines` concurrently, but with at most
+    `max_workers` machines at the same time.
+    Returns the loaded units and the errors by machine.
+    A machine that cannot be reached does not prevent the others from loading.
+    """
+    semaphore = asyncio.Semaphore(max_workers)
+    machines = list(dict.fromkeys(machines))
+
+    async def load(machine: str) -> UnitStates:
+        async with semaphore:
+            return await load_unit_to_state_dict(
+                mode, backend=backend, unit_types=unit_types, machine=machine
+            )
+
+    results = await asyncio.gather(
+        *(load(machine) for machine in machines), return_exceptions=True
+    )
+    unit_to_state_dicts: Dict[str, UnitStates] = {}
+    errors: Dict[str, Exception] = {}
+    for machine, result in zip(machines, results):
+        if isinstance(result, Exception):
+            errors[machine] = result
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            unit_to_state_dicts[machine] = result
+    return unit_to_state_dicts, errors
+
+
+async def command_output(
+    args: Sequence[str], env: Optional[Mapping[str, str]] = None
+) -> bytes:
+    """
+    Run `args` through the transport and return `stdout` followed by `stderr`.
+    """
+    proc = await get_transport().run(args, env=env)
+    stdout, stderr = await proc.communicate()
+    return stdout + stderr
+
+
+def show_command(*args: str) -> None:
+    # clean up terminal
+    subprocess.call("clear")
+    # show current command
+    print(f"\n$ {' '.join(args)}")
+
+
+async def systemctl_async(
+    *cmd: str,
+    mode: str,
+    units: Iterable[str],
+    sudo: bool = False,
+    foreground: bool = False,
+    head: Optional[int] = None,
+    ask_password: bool = False,
+    machine: Optional[str] = None,
+) -> Tuple[int, str, str]:
+    sys_cmd = systemctl_args_builder(
+        *cmd,
+        mode=mode,
+        units=units,
+        sudo=sudo,
+        ask_password=ask_password,
+        machine=machine,
+    )
+    proc: Union[asyncio.subprocess.Process, CommandProcess]
+    if foreground:
+        show_command(*sys_cmd)
+        # interactive commands always need the local terminal
+        proc = await asyncio.create_subprocess_exec(*sys_cmd, env=env_with_color())
+    else:
+        proc = await get_transport().run(sys_cmd, env=SYSTEMD_COLOR_ENV)
+    # maxlen appending works as a fifo.
+    stdout_deque: Deque[bytes] = Deque(maxlen=head)
+    if proc.stdout is not None:
+        i = 0
+        async for line in proc.stdout:
+            stdout_deque.append(line.rstrip())
+            i += 1
+            if i == head:
+                break
+    stderr_deque: Deque[bytes] = Deque(maxlen=head)
     if proc.stderr is not None:
         i = 0
         async for line in proc.stderr:
@@ -1519,6 +3107,7 @@ def systemctl_args_builder(
     units: Iterable[str],
     sudo: bool = False,
     ask_password: bool = True,
+    machine: Optional[str] = None,
 ) -> List[str]:
     sys_cmd: List[str] = list()
     if sudo and not is_root():
@@ -1534,6 +3123,8 @@ def systemctl_args_builder(
     sys_cmd.append(get_systemctl_bin())
     if not ask_password:
         sys_cmd.append("--no-ask-password")
+    if machine is not None:
+        sys_cmd.append(f"--machine={machine}")
     if mode == "user":
         # `root` user _may_ have user services (https://github.com/kainctl/isd/issues/30)
         # if sudo or is_root():
@@ -1557,7 +3148,11 @@ def systemctl_args_builder(
 
 
 def journalctl_args_builder(
-    *args: str, mode: str, units: Iterable[str], sudo: bool = False
+    *args: str,
+    mode: str,
+    units: Iterable[str],
+    sudo: bool = False,
+    machine: Optional[str] = None,
 ) -> List[str]:
     sys_cmd = []
     if sudo and not is_root():
@@ -1574,6 +3169,8 @@ def journalctl_args_builder(
         sys_cmd.extend(["journalctl", "--user"])
     else:
         sys_cmd.extend(["journalctl"])
+    if machine is not None:
+        sys_cmd.append(f"--machine={machine}")
 
     return list(
         chain(
@@ -1584,10 +3181,13 @@ def journalctl_args_builder(
     )
 
 
+# systemd_colors = "1" if colors else "0"
+SYSTEMD_COLOR_ENV = {"SYSTEMD_COLORS": "1"}
+
+
 def env_with_color() -> Dict[str, str]:
     env = os.environ.copy()
-    # systemd_colors = "1" if colors else "0"
-    env.update(SYSTEMD_COLORS="1")
+    env.update(SYSTEMD_COLOR_ENV)
     return env
 
 
@@ -1599,18 +3199,12 @@ async def journalctl_async(
     units: Iterable[str],
     sudo: bool = False,
     tail: Optional[int] = None,
+    machine: Optional[str] = None,
 ) -> Tuple[int, str, str]:
-    journalctl_cmd = journalctl_args_builder(*args, mode=mode, units=units, sudo=sudo)
-    env = env_with_color()
-    # env = os.environ.copy()
-    # env.update(SYSTEMD_COLORS="1")
-    proc = await asyncio.create_subprocess_exec(
-        *journalctl_cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-        stdin=subprocess.DEVNULL,
-        env=env,
+    journalctl_cmd = journalctl_args_builder(
+        *args, mode=mode, units=units, sudo=sudo, machine=machine
     )
+    proc = await get_transport().run(journalctl_cmd, env=SYSTEMD_COLOR_ENV)
     stdout_deque: Deque[bytes] = Deque(maxlen=tail)
     if proc.stdout is not None:
         async for line in proc.stdout:
@@ -1682,6 +3276,8 @@ class PreviewArea(Container):
 
     units: reactive[List[str]] = reactive(list())
     mode: reactive[str] = reactive("system")
+    # `None` is the host
+    machine: reactive[Optional[str]] = reactive(None, init=False)
 
     def __init__(
         self,
@@ -1712,6 +3308,9 @@ class PreviewArea(Container):
     def watch_mode(self, mode: str) -> None:
         self.update_preview_window()
 
+    def watch_machine(self, machine: Optional[str]) -> None:
+        self.update_preview_window()
+
     def watch_units(self, units: List[str]) -> None:
         self.update_preview_window()
 
@@ -1768,6 +3367,7 @@ class PreviewArea(Container):
                     "status",
                     mode=self.mode,
                     units=self.units,
+                    machine=self.machine,
                     head=self.max_lines,
                 )
             case "dependencies":
@@ -1776,22 +3376,35 @@ class PreviewArea(Container):
                     "list-dependencies",
                     mode=self.mode,
                     units=self.units,
+                    machine=self.machine,
                     head=self.max_lines,
                 )
             case "help":
                 preview = tabbed_content.query_one("#help_log", RichLog)
                 return_code, stdout, stderr = await systemctl_async(
-                    "help", mode=self.mode, units=self.units, head=self.max_lines
+                    "help",
+                    mode=self.mode,
+                    units=self.units,
+                    head=self.max_lines,
+                    machine=self.machine,
                 )
             case "show":
                 preview = tabbed_content.query_one("#show_log", RichLog)
                 return_code, stdout, stderr = await systemctl_async(
-                    "show", mode=self.mode, units=self.units, head=self.max_lines
+                    "show",
+                    mode=self.mode,
+                    units=self.units,
+                    head=self.max_lines,
+                    machine=self.machine,
                 )
             case "cat":
                 preview = tabbed_content.query_one("#cat_log", RichLog)
                 return_code, stdout, stderr = await systemctl_async(
-                    "cat", mode=self.mode, units=self.units, head=self.max_lines
+                    "cat",
+                    mode=self.mode,
+                    units=self.units,
+                    head=self.max_lines,
+                    machine=self.machine,
                 )
             case "journal":
                 preview = tabbed_content.query_one("#journal_log", RichLog)
@@ -1799,6 +3412,7 @@ class PreviewArea(Container):
                     *self.journalctl_args,
                     mode=self.mode,
                     units=self.units,
+                    machine=self.machine,
                     tail=self.max_lines,
                 )
             case other:
@@ -1866,7 +3480,7 @@ class PreviewArea(Container):
                 )
 
 
-def derive_startup_mode(startup_mode: StartupMode) -> str:
+async def derive_startup_mode(startup_mode: StartupMode) -> str:
     mode: str
     if startup_mode == StartupMode("auto"):
         fallback: StartupMode = StartupMode("user")
@@ -1878,7 +3492,8 @@ def derive_startup_mode(startup_mode: StartupMode) -> str:
     else:
         mode = startup_mode
     if mode == "user" and is_root():
-        if systemctl_is_system_running(mode="user").returncode == 0:
+        return_code, _stderr = await systemctl_is_system_running(mode="user")
+        if return_code == 0:
             return "user"
         else:
             # If it is not possible to connect to the `root` users `--user` bus,
@@ -1894,12 +3509,539 @@ def cached_search_term() -> str:
     return ""
 
 
-def systemctl_is_system_running(*, mode: str) -> subprocess.CompletedProcess[str]:
-    return subprocess.run(
-        systemctl_args_builder("is-system-running", mode=mode, units=[]),
-        capture_output=True,
-        text=True,
+def is_subsequence(needle: str, haystack: str) -> bool:
+    it = iter(haystack)
+    return all(char in it for char in needle)
+
+
+# (unit names, descriptions, masks)
+SearchCandidates = Tuple[
+    Sequence[str], Optional[Sequence[str]], Optional[Sequence[int]]
+]
+
+
+class IncrementalSearch:
+    """
+    Runs `search_unit_names` and narrows the matches of the previous search
+    if the new search term only extends it, for example, `nginx` -> `nginxw`.
+    The matching is a case-insensitive subsequence test, so every unit that
+    matches the extended term has also matched the previous one.
+
+    The previous matches are kept in the order of the haystack together with
+    their `masks`, so they are prefiltered (see `prefilter_unit_names`) for the
+    new term like a full scan and result in the same ranking.
+    A full scan is done if characters were removed or changed or if the
+    haystack or the `version` of the inventory has changed.
+    With a positive `limit`, only the best matches are returned,
+    but all matches are narrowed by the next search.
+    """
+
+    def __init__(self) -> None:
+        self._haystack: Optional[Tuple[Sequence[str], Optional[Sequence[str]], int]] = (
+            None
+        )
+        self._needle = ""
+        self._candidates: SearchCandidates = ([], None, None)
+        self.full_scans = 0
+        self.narrowed_scans = 0
+
+    def _search_candidates(
+        self,
+        needle: str,
+        unit_names: Sequence[str],
+        descriptions: Optional[Sequence[str]],
+        masks: Optional[Sequence[int]],
+        version: int,
+    ) -> SearchCandidates:
+        haystack = self._haystack
+        if (
+            haystack is not None
+            and haystack[0] is unit_names
+            and haystack[1] is descriptions
+            and haystack[2] == version
+            and (masks is None) == (self._candidates[2] is None)
+            and is_subsequence(self._needle, needle)
+        ):
+            self.narrowed_scans += 1
+            return self._candidates
+        self.full_scans += 1
+        return unit_names, descriptions, masks
+
+    def _record(
+        self,
+        needle: str,
+        haystack: Tuple[Sequence[str], Optional[Sequence[str]], int],
+        candidates: SearchCandidates,
+        matched: set[str],
+    ) -> None:
+        unit_names, descriptions, masks = candidates
+        names: List[str] = []
+        names_descriptions: Optional[List[str]] = None
+        names_masks: Optional[List[int]] = None
+        if descriptions is not None:
+            names_descriptions = []
+        if masks is not None:
+            names_masks = []
+        for i, unit in enumerate(unit_names):
+            if unit not in matched:
+                continue
+            names.append(unit)
+            if names_descriptions is not None:
+                names_descriptions.append(cast(Sequence[str], descriptions)[i])
+            if names_masks is not None:
+                names_masks.append(cast(Sequence[int], masks)[i])
+        self._candidates = (names, names_descriptions, names_masks)
+        self._haystack = haystack
+        self._needle = needle
+
+    def search(
+        self,
+        search_term: str,
+        unit_names: Sequence[str],
+        descriptions: Optional[Sequence[str]] = None,
+        masks: Optional[Sequence[int]] = None,
+        description_masks: Mapping[str, int] = {},
+        limit: int = 0,
+        *,
+        version: int = 0,
+    ) -> List[str]:
+        needle = search_term.replace(" ", "")
+        candidates = self._search_candidates(
+            needle.lower(), unit_names, descriptions, masks, version
+        )
+        names, names_descriptions, names_masks = candidates
+        if names_masks is not None:
+            names, names_descriptions = prefilter_unit_names(
+                needle, names, names_masks, names_descriptions, description_masks
+            )
+        chunks = [score_unit_names(needle, names, names_descriptions)]
+        self._record(
+            needle.lower(),
+            (unit_names, descriptions, version),
+            candidates,
+            matched_units(chunks),
+        )
+        return rank_scored_chunks(chunks, limit)
+
+    async def search_async(
+        self,
+        search_term: str,
+        unit_names: Sequence[str],
+        descriptions: Optional[Sequence[str]] = None,
+        masks: Optional[Sequence[int]] = None,
+        description_masks: Mapping[str, int] = {},
+        limit: int = 0,
+        *,
+        version: int = 0,
+        pool: SearchPool,
+    ) -> List[str]:
+        """
+        Like `search`, but the candidates are prefiltered and scored on the `pool`.
+        The state is only updated once the search has completed,
+        so a cancelled search does not leave partial candidates behind.
+        """
+        needle = search_term.replace(" ", "").lower()
+        candidates = self._search_candidates(
+            needle, unit_names, descriptions, masks, version
+        )
+        chunks = await pool.score(search_term, *candidates, description_masks)
+        self._record(
+            needle,
+            (unit_names, descriptions, version),
+            candidates,
+            matched_units(chunks),
+        )
+        return rank_scored_chunks(chunks, limit)
+
+
+class SearchCache:
+    """
+    A bounded LRU cache of search results, shared by all search callers.
+
+    The results are keyed by the `scope`, for example, the `mode` and machine,
+    the `version` of the searched inventory and the normalized `query`.
+    Storing the results of a newer `version` drops the results of the older
+    versions of the same `scope`, as they cannot be hit anymore.
+
+    At most `max_entries` results with at most `max_results` matched units in
+    total are kept, which bounds the memory of the cache.
+    The cached lists must not be modified by the caller.
+    """
+
+    def __init__(self, max_entries: int = 64, max_results: int = 100_000) -> None:
+        self.max_entries = max_entries
+        self.max_results = max_results
+        self._entries: OrderedDict[Tuple[Hashable, int, Hashable], List[str]] = (
+            OrderedDict()
+        )
+        self._versions: Dict[Hashable, int] = {}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self, scope: Hashable, version: int, query: Hashable
+    ) -> Optional[List[str]]:
+        key = (scope, version, query)
+        results = self._entries.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return results
+
+    def put(
+        self,
+        scope: Hashable,
+        version: int,
+        query: Hashable,
+        results: List[str],
+    ) -> None:
+        if self.max_entries == 0 or len(results) > self.max_results:
+            return
+        latest_version = self._versions.get(scope, version)
+        if version < latest_version:
+            # a slow search of an outdated inventory
+            return
+        if version > latest_version:
+            for key in [key for key in self._entries if key[0] == scope]:
+                self._remove(key)
+        self._versions[scope] = version
+        key = (scope, version, query)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = results
+        self._size += len(results)
+        while len(self._entries) > self.max_entries or self._size > self.max_results:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Tuple[Hashable, int, Hashable]) -> None:
+        self._size -= len(self._entries.pop(key))
+
+
+async def search_template_groups(
+    search_term: str,
+    inventory: UnitInventory,
+    min_instances: int,
+    expanded: AbstractContainer[str],
+    search_descriptions: bool = False,
+    search: Optional[Callable[..., Awaitable[List[str]]]] = None,
+    limit: int = 0,
+) -> List[str]:
+    """
+    Like `search_unit_names` but only scans the `TemplateGroups` of the `inventory`.
+    The instances of a template are only matched if it is `expanded` or if the
+    `search_term` contains an `@` and the text before it matches the template.
+    The matching instances follow their template, which is added even if it
+    does not match itself.
+    The collapsed units are searched with `search`, for example,
+    `IncrementalSearch.search_async`, if given.
+    A positive `limit` bounds the number of returned entries.
+    """
+    groups = inventory.template_groups(min_instances)
+    descriptions = groups.descriptions if search_descriptions else None
+    description_masks = inventory.description_masks if search_descriptions else {}
+    if search is not None:
+        results = await search(
+            search_term,
+            groups.names,
+            descriptions,
+            groups.masks,
+            description_masks,
+            limit,
+        )
+    else:
+        results = search_unit_names(
+            search_term,
+            groups.names,
+            descriptions,
+            groups.masks,
+            description_masks,
+            limit,
+        )
+    prefix, at, _ = search_term.partition("@")
+    prefix = prefix.replace(" ", "")
+    instance_results = {}
+    for template, instances in groups.instances.items():
+        if template in expanded or (
+            at != "" and fzy_scorer(prefix, template.partition("@")[0])[1] is not None
+        ):
+            instance_results[template] = search_unit_names(
+                search_term,
+                instances,
+                [inventory.details_of(unit).description for unit in instances]
+                if search_descriptions
+                else None,
+                limit=limit,
+            )
+    if len(instance_results) == 0:
+        return results
+    expanded_results = []
+    for unit in results:
+        expanded_results.append(unit)
+        expanded_results.extend(instance_results.pop(unit, ()))
+    for template, matches in instance_results.items():
+        if len(matches) > 0:
+            expanded_results.append(template)
+            expanded_results.extend(matches)
+    return expanded_results[:limit] if limit > 0 else expanded_results
+
+
+def render_template_group(
+    template: str,
+    highlight_indices: Optional[List[int]],
+    state_counts: Counter[UnitReprState],
+    **render_state_colors: str,
+) -> Text:
+    """
+    Render the entry of a grouped template with the number of instances
+    per state, for example, `39 instances  37 active, 2 failed`.
+    The entry is rendered like a `failed` unit if any instance has failed
+    and like the most common state otherwise.
+    """
+    ranked = sorted(state_counts.items(), key=lambda item: (-item[1], item[0].value))
+    state = (
+        UnitReprState.failed if UnitReprState.failed in state_counts else ranked[0][0]
     )
+    summary = ", ".join(
+        f"{count} {instance_state.name.replace('_', '-')}"
+        for instance_state, count in ranked
+    )
+    return state.render_state(
+        template,
+        highlight_indices,
+        UnitDetails(f"{sum(state_counts.values())} instances", summary),
+        **render_state_colors,
+    )
+
+
+def load_inventory_snapshot(mode: str) -> Optional[UnitStates]:
+    """
+    Load the last stored `unit_to_state_dict` of the given `mode`.
+    Returns `None` if no (valid) snapshot exists.
+    """
+    fp = get_inventory_snapshot_json_file_path(mode)
+    if not fp.exists():
+        return None
+    try:
+        snapshot = json.loads(fp.read_text())
+        return UnitStates(
+            {
+                unit: UnitReprState[state]
+                for unit, state in zip(
+                    snapshot["units"], snapshot["states"], strict=True
+                )
+            },
+            {
+                unit: UnitDetails(*details)
+                for unit, details in snapshot.get("details", {}).items()
+            },
+        )
+    except Exception as e:
+        log.error(f"Exception while reading inventory snapshot from: {fp}", e)
+        return None
+
+
+def store_inventory_snapshot(
+    mode: str, unit_to_state_dict: Mapping[str, UnitReprState]
+) -> None:
+    """
+    Store the `unit_to_state_dict` of the given `mode`, so that the next start
+    can render the units before they have been loaded.
+    Units and states are stored as two parallel lists to keep the order.
+    The states are stored by their name, as their values are not stable
+    across versions.
+    The snapshot is written to a temporary file first and then renamed, so
+    that an interrupted write cannot leave a truncated snapshot behind.
+    """
+    if is_root() or len(unit_to_state_dict) == 0:
+        return
+    fp = get_inventory_snapshot_json_file_path(mode)
+    # directory may not exist if there was a previous issue while creating them
+    if not fp.parent.exists():
+        return
+    snapshot = {
+        "units": list(unit_to_state_dict.keys()),
+        "states": [state.name for state in unit_to_state_dict.values()],
+        "details": unit_details_of(unit_to_state_dict),
+    }
+    tmp_fp: Optional[Path] = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            "w", dir=fp.parent, prefix=f".{fp.name}.", delete=False
+        ) as tmp_file:
+            tmp_fp = Path(tmp_file.name)
+            json.dump(snapshot, tmp_file, separators=(",", ":"))
+        os.replace(tmp_fp, fp)
+    except Exception as e:
+        log.error(f"Exception while writing inventory snapshot to: {fp}", e)
+        if tmp_fp is not None:
+            tmp_fp.unlink(missing_ok=True)
+
+
+async def systemctl_is_system_running(*, mode: str) -> Tuple[int, str]:
+    """
+    Return the exit code and `stderr` of `systemctl is-system-running`.
+    """
+    proc = await get_transport().run(
+        systemctl_args_builder("is-system-running", mode=mode, units=[])
+    )
+    _stdout, stderr = await proc.communicate()
+    return await proc.wait(), stderr.decode()
+
+
+class RefreshInterval:
+    """
+    Decides when a periodic refresh is due.
+
+    The timer that drives the refresh ticks every `minimum` seconds
+    and only refreshes if `is_due` returns `True`.
+    `record` adapts the interval:
+    It is halved if the refresh changed something and grows by half otherwise,
+    but is never shorter than `COST_FACTOR` times the duration of the refresh.
+    With `minimum == maximum` the interval is fixed.
+    """
+
+    COST_FACTOR = 20
+
+    def __init__(self, interval: float, minimum: float, maximum: float) -> None:
+        self.interval = interval
+        self.minimum = minimum
+        self.maximum = maximum
+        self._last_due = time.monotonic()
+
+    @classmethod
+    def from_policy(
+        cls,
+        interval: float,
+        policy: RefreshIntervalPolicy,
+        min_factor: float,
+        max_factor: float,
+    ) -> RefreshInterval:
+        if policy == RefreshIntervalPolicy.FIXED:
+            return cls(interval, interval, interval)
+        return cls(interval, interval * min_factor, interval * max_factor)
+
+    def is_due(self) -> bool:
+        now = time.monotonic()
+        # the timer ticks every `minimum` seconds, allow for its jitter
+        if now - self._last_due < self.interval - self.minimum / 2:
+            return False
+        self._last_due = now
+        return True
+
+    def record(self, duration: float, changed: bool) -> None:
+        interval = self.interval / 2 if changed else self.interval * 1.5
+        interval = max(interval, self.minimum, duration * self.COST_FACTOR)
+        self.interval = min(interval, self.maximum)
+
+
+class RefreshScheduler:
+    """
+    Coalesces the partial and full refreshes of the `unit_to_state_dict`.
+
+    - Pending partial requests are merged into a single batched call.
+    - Partial requests are absorbed if a full refresh is pending or in flight.
+    - At most one refresh runs at a time and at most one full refresh
+      is queued behind it.
+
+    `refresh` is called with the units to reload, or without any units
+    for a full refresh.
+    `start` is given the coroutine that works through the pending requests,
+    usually `run_worker`.
+    """
+
+    def __init__(
+        self,
+        refresh: Callable[..., Awaitable[None]],
+        start: Callable[[Coroutine[Any, Any, None]], Any],
+    ) -> None:
+        self._refresh = refresh
+        self._start = start
+        self._pending_units: set[str] = set()
+        self._pending_full = False
+        self._running = False
+        self._running_full = False
+        self.counters: Dict[str, int] = {
+            "partial_requests": 0,
+            "full_requests": 0,
+            "partial_calls": 0,
+            "full_calls": 0,
+            "merged_partial": 0,
+            "absorbed_partial": 0,
+            "merged_full": 0,
+        }
+
+    @property
+    def saved_calls(self) -> int:
+        counters = self.counters
+        return (
+            counters["partial_requests"]
+            + counters["full_requests"]
+            - counters["partial_calls"]
+            - counters["full_calls"]
+        )
+
+    def request_partial(self, *units: str) -> None:
+        self.counters["partial_requests"] += 1
+        if len(units) == 0:
+            # nothing is relevant right now
+            self.counters["merged_partial"] += 1
+        elif self._pending_full or self._running_full:
+            self.counters["absorbed_partial"] += 1
+        else:
+            if len(self._pending_units) > 0:
+                self.counters["merged_partial"] += 1
+            self._pending_units.update(units)
+            self._ensure_running()
+
+    def request_full(self) -> None:
+        self.counters["full_requests"] += 1
+        if self._pending_full:
+            self.counters["merged_full"] += 1
+            return
+        self._pending_full = True
+        if len(self._pending_units) > 0:
+            self.counters["absorbed_partial"] += 1
+            self._pending_units = set()
+        self._ensure_running()
+
+    def _ensure_running(self) -> None:
+        if not self._running:
+            self._running = True
+            self._start(self._run())
+
+    async def _run(self) -> None:
+        try:
+            while self._pending_full or len(self._pending_units) > 0:
+                if self._pending_full:
+                    self._pending_full = False
+                    self._running_full = True
+                    self.counters["full_calls"] += 1
+                    try:
+                        await self._refresh()
+                    finally:
+                        self._running_full = False
+                else:
+                    units = self._pending_units
+                    self._pending_units = set()
+                    self.counters["partial_calls"] += 1
+                    await self._refresh(*units)
+        finally:
+            self._running = False
+
+    def summary(self) -> str:
+        counters = self.counters
+        return dedent(f"""\
+            Refresh calls saved: {self.saved_calls}
+            Partial: {counters["partial_calls"]} calls for {counters["partial_requests"]} requests ({counters["merged_partial"]} merged, {counters["absorbed_partial"]} absorbed by full refreshes)
+            Full: {counters["full_calls"]} calls for {counters["full_requests"]} requests ({counters["merged_full"]} merged)""")
 
 
 # class SettingsError(ModalScreen):
@@ -1922,29 +4064,101 @@ def systemctl_is_system_running(*, mode: str) -> subprocess.CompletedProcess[str
 #         )
 
 
+# `systemd` uses the same name to refer to the host with `--machine=`.
+HOST_MACHINE = ".host"
+
+
 class MainScreen(Screen):
+    class InventoryChanged(TextualMessage):
+        """
+        Posted after the inventory of `mode` on `machine` has changed.
+        """
+
+        def __init__(
+            self, mode: str, machine: Optional[str], delta: InventoryDelta
+        ) -> None:
+            self.mode = mode
+            self.machine = machine
+            self.delta = delta
+            super().__init__()
+
     # Zellij writes some weird output to the input otherwise.
     # If this is `None` it may lead to weird flashes in the footer.
     # Zellij users have to live with it until the bug is
     # fixed: https://github.com/zellij-org/zellij/issues/3959
     AUTO_FOCUS = "CustomInput" if os.getenv("ZELLIJ") is None else None
 
-    unit_to_state_dict: reactive[Dict[str, UnitReprState]] = reactive(dict())
+    # Always modified in place, watchers are triggered via `mutate_reactive`.
+    unit_to_state_dict: reactive[UnitInventory] = reactive(UnitInventory)
     # Relevant = Union(ordered selected units & highlighted unit)
     relevant_units: Deque[str] = deque()
     search_term: str = ""
-    search_results: list[Dict[str, Any]] = list()
+    # ranked matching units of the `search_term`
+    search_results: List[str] = list()
     status_text: reactive[str] = reactive("")
     # `mode` is immediately overwritten. It simply acts a sensible default
     # to make type-checkers happy.
-    mode: reactive[str] = reactive("system")
+    # It is not initialized, so that only the startup `mode` is loaded.
+    mode: reactive[str] = reactive("system", init=False)
+    # The local container whose units are shown or `None` for the host.
+    machine: reactive[Optional[str]] = reactive(None, init=False)
     ordered_selection: Deque[str] = deque()
     highlighted_unit: Optional[str] = None
     _tracked_keybinds: Dict[str, str] = dict()
 
+    # Connection that delivers the unit change signals in `push` mode.
+    # If it is `None`, the units are polled.
+    unit_change_connection: Optional[DBusConnection] = None
+    # Watches the unit search paths of the current `mode` for new unit files.
+    unit_file_watcher: Optional[UnitFileWatcher] = None
+
     def __init__(self, settings, *args, **kwargs) -> None:
         self.settings = settings
+        self.pending_unit_changes: set[str] = set()
+        self._applying_unit_changes = False
+        # the periodic refreshes are paused while this is not empty
+        self.inactive_reasons: set[str] = set()
+        # Inventories of both modes, the one of the current `mode`
+        # is the `unit_to_state_dict`.
+        self.inventories: Dict[str, UnitInventory] = {
+            "system": UnitInventory(),
+            "user": UnitInventory(),
+        }
+        # modes whose inventory could not be kept warm
+        self._cold_modes: set[str] = set()
+        # Inventories of the configured `machines` by `mode` and machine.
+        self.machine_inventories: Dict[Tuple[str, str], UnitInventory] = {}
+        # machines that could not be loaded, only reported once
+        self._unreachable_machines: set[str] = set()
+        # `included_unit_types`/`excluded_unit_types` only apply if enabled
+        self.unit_type_filter_enabled = True
+        # filtered unit types that were requested by the search term
+        self.on_demand_unit_types: Dict[str, set[str]] = {
+            "system": set(),
+            "user": set(),
+        }
+        # grouped templates whose instances are searched and shown
+        self.expanded_templates: set[str] = set()
+        self.incremental_search = IncrementalSearch()
+        self.search_pool = SearchPool(settings.search_workers)
+        self.search_cache = SearchCache(
+            settings.search_cache_size, settings.search_cache_max_results
+        )
+        # the shown search results and their search term, to highlight them
+        # once they become visible and to re-render single units
+        self.shown_search_results: Tuple[str, set[str]] = ("", set())
+        # units of the applied `InventoryDelta`s of the current inventory
+        self.delta_counters: Dict[str, int] = {
+            "added": 0,
+            "removed": 0,
+            "changed": 0,
+            "rendered_in_place": 0,
+        }
         super().__init__(*args, **kwargs)
+        self.refresh_scheduler = RefreshScheduler(
+            self.refresh_unit_to_state_dict,
+            partial(self.run_worker, group="refresh_scheduler"),
+        )
         self.update_keybindings()
 
     def update_keybindings(self) -> None:
@@ -2090,6 +4304,8 @@ class MainScreen(Screen):
         Store the current application state.
         """
         json_state = json.dumps({"mode": self.mode, "search_term": self.search_term})
+        # The snapshot is loaded for the host, even if a machine is selected.
+        store_inventory_snapshot(self.mode, self.inventories[self.mode])
 
         if not is_root():
             fp_cache_state = get_isd_cached_state_json_file_path()
@@ -2133,6 +4349,20 @@ class MainScreen(Screen):
     # The asking should ONLY happen here! In the other functions, the error text should be reported
     # in the preview. Again, if the command requires additional authentication, is something
     # that needs to be defined by the user.
+    def has_local_terminal(self, action: str) -> bool:
+        """
+        Return whether the commands run locally and can use the terminal.
+        Otherwise, notify that the interactive `action` is not available.
+        """
+        if get_transport().is_local:
+            return True
+        self.notify(
+            f"{action} needs a local terminal and is not available "
+            + "with a `transport_command`.",
+            severity="warning",
+        )
+        return False
+
     async def action_systemctl_command(self, unsplit_command: str) -> None:
         """
         Split the given `systemctl` subcommand (`unsplit_command`) by whitespaces and
@@ -2146,6 +4376,8 @@ class MainScreen(Screen):
         # if it is edit then I need to change the async commands to foreground
         # commands with a foreground TTY!
         if "edit" in unsplit_command:
+            if not self.has_local_terminal(f"`systemctl {unsplit_command}`"):
+                return
             # since this MUST run in the foreground and I CANNOT capture stderr
             # I am calling it directly with sudo if the current mode is `system`:
             # In polkit mode, it will probably fail due to filesystem permissions errors,
@@ -2158,6 +4390,7 @@ class MainScreen(Screen):
                     *command,
                     mode=self.mode,
                     units=self.relevant_units,
+                    machine=self.machine,
                     sudo=self.mode == "system",
                 )
                 show_command(*args)
@@ -2169,12 +4402,14 @@ class MainScreen(Screen):
                 *command,
                 mode=self.mode,
                 units=self.relevant_units,
+                machine=self.machine,
                 sudo=False,
             )
             # if it fails, check if there was an authentication issue
             # and prefix it with sudo or explicitly wait for polkit authentication.
             if return_code != 0:
                 if "auth" in stderr:
+                    authentication = f"Authenticating `systemctl {unsplit_command}`"
                     if AUTHENTICATION_MODE == "sudo":
                         # first try again with sudo and see
                         # if previous cached password works
@@ -2183,24 +4418,27 @@ class MainScreen(Screen):
                             *command,
                             mode=self.mode,
                             units=self.relevant_units,
+                            machine=self.machine,
                             sudo=True,
                             foreground=False,
                         )
-                        if return_code == 1:
+                        if return_code == 1 and self.has_local_terminal(authentication):
                             with self.app.suspend():
                                 return_code, stdout, stderr = await systemctl_async(
                                     *command,
                                     mode=self.mode,
                                     units=self.relevant_units,
+                                    machine=self.machine,
                                     sudo=True,
                                     foreground=True,
                                 )
-                    else:
+                    elif self.has_local_terminal(authentication):
                         with self.app.suspend():
                             return_code, stdout, stderr = await systemctl_async(
                                 *command,
                                 mode=self.mode,
                                 units=self.relevant_units,
+                                machine=self.machine,
                                 sudo=False,
                                 foreground=True,
                                 ask_password=True,
@@ -2222,30 +4460,99 @@ class MainScreen(Screen):
         # clear current selection
         sel = cast(SelectionList, self.query_one(SelectionList))
         sel.deselect_all()
-        self.query_one(Fluid).border_title = " " + mode + " "
+        self.update_border_title()
         await self.new_unit_to_state_dict()
+        await self.update_unit_change_subscription()
+        await self.update_unit_file_watcher()
+        self.warm_up_inactive_inventory()
+        self.refresh_machine_inventories()
         # self.query_one(Vertical).border_title = self.mode
         # await self.update_unit_to_state_dict()
 
-    def action_copy_unit_path(self) -> None:
+    async def watch_machine(self, machine: Optional[str]) -> None:
+        self.query_one(PreviewArea).machine = machine
+        sel = cast(SelectionList, self.query_one(SelectionList))
+        sel.deselect_all()
+        self.update_border_title()
+        await self.new_unit_to_state_dict()
+        await self.update_unit_change_subscription()
+        await self.update_unit_file_watcher()
+
+    def update_border_title(self) -> None:
+        title = self.mode if self.machine is None else f"{self.mode} @ {self.machine}"
+        self.query_one(Fluid).border_title = " " + title + " "
+
+    def machine_options(self) -> List[Option]:
+        """
+        Return one option for the host and for each configured machine
+        with the number of units that match the current `search_term`.
+        The cached inventories are searched, so no machine is contacted.
+        """
+        options = []
+        for machine in [None, *self.settings.machines]:
+            inventory = self.inventory_of(self.mode, machine)
+            name = "host" if machine is None else machine
+            if len(inventory) == 0:
+                summary = "not loaded"
+            elif self.search_term == "":
+                summary = f"{len(inventory)} units"
+            else:
+                scope = (self.mode, machine)
+                query = (self.search_term.replace(" ", ""), "machine_options")
+                matches = self.search_cache.get(scope, inventory.version, query)
+                if matches is None:
+                    search_descriptions = self.settings.search_descriptions
+                    matches = search_unit_names(
+                        self.search_term,
+                        inventory.names,
+                        inventory.descriptions if search_descriptions else None,
+                        inventory.name_masks,
+                        inventory.description_masks if search_descriptions else {},
+                    )
+                    self.search_cache.put(scope, inventory.version, query, matches)
+                summary = f"{len(matches)} of {len(inventory)} units match"
+            prefix = "●" if machine == self.machine else " "
+            options.append(
+                Option(f"{prefix} {name}  ({summary})", id=machine or HOST_MACHINE)
+            )
+        return options
+
+    @work()
+    async def action_select_machine(self) -> None:
+        if len(self.settings.machines) == 0:
+            self.notify("No `machines` are configured in the settings.")
+            return
+        selected = await self.app.push_screen_wait(
+            MachineSelectionScreen(
+                self.settings.main_keybindings.select_machine,
+                self.settings.navigation_keybindings,
+                self.machine_options(),
+            )
+        )
+        if selected is not None:
+            self.machine = None if selected == HOST_MACHINE else selected
+
+    async def action_copy_unit_path(self) -> None:
         # load the fragment path from the `systemctl cat output`
         # FUTURE: Fix to currently highlighted one!
         if self.highlighted_unit is None:
             return
         # Copying multiple ones doesn't make much sense!
-        args = systemctl_args_builder(
-            "show", mode=self.mode, units=[self.highlighted_unit]
+        _return_code, stdout, _stderr = await systemctl_async(
+            "show",
+            mode=self.mode,
+            units=[self.highlighted_unit],
+            machine=self.machine,
         )
-        p1 = subprocess.run(args, capture_output=True, text=True)
         path = next(
             line.split("=", 1)[1]
-            for line in p1.stdout.splitlines()
+            for line in stdout.splitlines()
             if line.startswith("FragmentPath=")
         )
         self.app.copy_to_clipboard(path)
         self.notify(f"Copied '{path}' to the clipboard.")
 
-    def action_toggle_mode(self) -> None:
+    async def action_toggle_mode(self) -> None:
         """
         Toggle the current `bus`.
         Try to protect the user from accidentally crashing the program by trying
@@ -2256,13 +4563,13 @@ class MainScreen(Screen):
         """
         if is_root() and self.mode == "system":
             # Test if `root` user can actually connect to a `--user` bus.
-            proc = systemctl_is_system_running(mode="user")
-            if proc.returncode != 0:
+            return_code, stderr = await systemctl_is_system_running(mode="user")
+            if return_code != 0:
                 self.notify(
                     "Could not connect to `root` users `--user` bus.\n"
                     + "Usually, this does not work, as the `root` user does not have any `user` services.\n"
                     + "The connection was tested via `systemctl --user is-system-running` as `root` user with the full error message below:\n\n"
-                    + proc.stderr,
+                    + stderr,
                     severity="error",
                     timeout=60,
                 )
@@ -2280,25 +4587,40 @@ class MainScreen(Screen):
             # but remember that this is only relevant for current in-memory or last
             # invocation. Otherwise one should always use journalctl
             args = systemctl_args_builder(
-                "status", mode=self.mode, units=self.relevant_units
+                "status",
+                mode=self.mode,
+                units=self.relevant_units,
+                machine=self.machine,
             )
         elif cur_tab == "show":
             args = systemctl_args_builder(
-                "show", mode=self.mode, units=self.relevant_units
+                "show",
+                mode=self.mode,
+                units=self.relevant_units,
+                machine=self.machine,
             )
         elif cur_tab == "cat":
             # note that cat refers to the content on disk.
             # if there is a missing daemon-reload then there will be a difference!
             args = systemctl_args_builder(
-                "cat", mode=self.mode, units=self.relevant_units
+                "cat",
+                mode=self.mode,
+                units=self.relevant_units,
+                machine=self.machine,
             )
         elif cur_tab == "dependencies":
             args = systemctl_args_builder(
-                "list-dependencies", mode=self.mode, units=self.relevant_units
+                "list-dependencies",
+                mode=self.mode,
+                units=self.relevant_units,
+                machine=self.machine,
             )
         elif cur_tab == "help":
             args = systemctl_args_builder(
-                "help", mode=self.mode, units=self.relevant_units
+                "help",
+                mode=self.mode,
+                units=self.relevant_units,
+                machine=self.machine,
             )
         else:  # journal
             journalctl_args = self.settings.journalctl_args
@@ -2315,6 +4637,7 @@ class MainScreen(Screen):
                 *journalctl_args,
                 mode=self.mode,
                 units=self.relevant_units,
+                machine=self.machine,
             )
         return args
 
@@ -2322,7 +4645,7 @@ class MainScreen(Screen):
     # Yes, it does since it loads it from the TabbedContent, but it should
     # then derive the required sudo state again.
     # -> Maybe it would be smarter to forward this logic to the main loop?
-    def action_open_preview_in_pager(self) -> None:
+    async def action_open_preview_in_pager(self) -> None:
         cur_tab = self.query_one(TabbedContent).active
 
         if cur_tab == "journal":
@@ -2340,54 +4663,85 @@ class MainScreen(Screen):
             )
             pager_args = get_default_pager_args_presets(pager)
 
+        # The command may run through the transport, only the pager runs locally.
+        output = await command_output(
+            self.preview_output_command_builder(cur_tab), env=SYSTEMD_COLOR_ENV
+        )
+        if len(output) == 0:
+            self.notify("Preview was empty.", severity="information")
+            return
         with self.app.suspend():
-            cmd_args = self.preview_output_command_builder(cur_tab)
-            env = env_with_color()
-            p1 = subprocess.Popen(
-                cmd_args, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-            )
-            if p1.stdout is not None:
-                # for true `more` support I must inject the following
-                # environment variable but make sure to not bleed it here!
-                # os.environ["POSIXLY_CORRECT"] = "NOT_EMPTY"
-                subprocess.call([pager, *pager_args], stdin=p1.stdout)
-                subprocess.call("clear")
-            else:
-                self.notify("Preview was empty.", severity="information")
+            # for true `more` support I must inject the following
+            # environment variable but make sure to not bleed it here!
+            # os.environ["POSIXLY_CORRECT"] = "NOT_EMPTY"
+            subprocess.run([pager, *pager_args], input=output)
+            subprocess.call("clear")
         self.refresh()
 
-    def action_open_preview_in_editor(self) -> None:
-        cur_tab =self.query_one(TabbedContent).active
+    async def action_open_preview_in_editor(self) -> None:
+        cur_tab = self.query_one(TabbedContent).active
         editor = cast(InteractiveSystemd, self.app).editor
+        output = await command_output(self.preview_output_command_builder(cur_tab))
         with self.app.suspend():
-            args = self.preview_output_command_builder(cur_tab)
-            p1 = subprocess.run(
-                args, text=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-            )
             with tempfile.NamedTemporaryFile() as tmp_file:
                 p = Path(tmp_file.name)
-                p.write_text(
-                    # capture_output appends a newline to non-empty stderr!
-                    p1.stdout
-                )
+                p.write_bytes(output)
                 subprocess.call([editor, p.absolute()])
         self.refresh()
 
     async def on_mount(self) -> None:
-        self.set_interval(
+        self.partial_refresh_interval = RefreshInterval.from_policy(
             self.settings.preview_and_selection_refresh_interval_sec,
-            self.partial_refresh_unit_to_state_dict,
+            self.settings.refresh_interval_policy,
+            self.settings.adaptive_refresh_min_factor,
+            self.settings.adaptive_refresh_max_factor,
+        )
+        self.full_refresh_interval = RefreshInterval.from_policy(
+            self.settings.full_refresh_interval_sec,
+            self.settings.refresh_interval_policy,
+            self.settings.adaptive_refresh_min_factor,
+            self.settings.adaptive_refresh_max_factor,
+        )
+        self.partial_refresh_timer = self.set_interval(
+            self.partial_refresh_interval.minimum,
+            self.periodic_partial_refresh_unit_to_state_dict,
         )
-        self.set_interval(
+        self.preview_refresh_timer = self.set_interval(
             self.settings.preview_and_selection_refresh_interval_sec,
             self.refresh_preview,
         )
-        self.set_interval(
-            self.settings.full_refresh_interval_sec,
+        self.full_refresh_timer = self.set_interval(
+            self.full_refresh_interval.minimum,
+            self.periodic_full_refresh_unit_to_state_dict,
+        )
+        # only active while the unit changes are pushed
+        self.push_resync_timer = self.set_interval(
+            self.settings.push_resync_interval_sec,
             self.full_refresh_unit_to_state_dict,
+            pause=True,
         )
-        self.mode = derive_startup_mode(self.settings.startup_mode)
-        await self.new_unit_to_state_dict()
+        # never resumed if it is disabled
+        self.inactive_inventory_refresh_timer = self.set_interval(
+            self.settings.inactive_mode_refresh_interval_sec or 60,
+            self.refresh_inactive_inventory,
+            pause=self.settings.inactive_mode_refresh_interval_sec == 0,
+        )
+        self.app.app_suspend_signal.subscribe(
+            self, lambda _: self.set_inactive("suspended", True)
+        )
+        self.app.app_resume_signal.subscribe(
+            self, lambda _: self.set_inactive("suspended", False)
+        )
+        if self.settings.idle_timeout_sec > 0:
+            self.set_interval(
+                min(self.settings.idle_timeout_sec / 4, 60), self.check_idle
+            )
+        self.set_reactive(
+            MainScreen.mode, await derive_startup_mode(self.settings.startup_mode)
+        )
+        # loads the units, warms up the inactive `mode` and sets up the
+        # subscription and the unit file watcher
+        await self.watch_mode(self.mode)
         self.search_results = await self.search_units(self.search_term)
         self.query_one(
             CustomSelectionList
@@ -2426,9 +4780,7 @@ class MainScreen(Screen):
             preview_area.units = list(self.relevant_units)
             preview_area.mutate_reactive(PreviewArea.units)
 
-    async def watch_unit_to_state_dict(
-        self, unit_to_state_dict: Dict[str, UnitReprState]
-    ) -> None:
+    async def watch_unit_to_state_dict(self, unit_to_state_dict: UnitInventory) -> None:
         # if it has been correctly initialized
         if len(unit_to_state_dict) != 0:
             await self.refresh_selection()
@@ -2470,11 +4822,57 @@ class MainScreen(Screen):
 
         self.refresh_preview()
 
-    async def search_units(self, search_term: str) -> list[Dict[str, Any]]:
-        # haystack MUST be a local copy as it mutates the data in-place!
-        haystack = [u for u in self.unit_to_state_dict.keys()]
-        # self.search_results = await fuzzy_match(search_term.replace(" ", ""), haystack)
-        return await fuzzy_match(search_term.replace(" ", ""), haystack)
+    async def search_units(self, search_term: str) -> List[str]:
+        """
+        Search the current inventory through the `search_cache`.
+        The returned list is shared and must not be modified.
+        """
+        inventory = self.unit_to_state_dict
+        min_instances = self.settings.group_template_instances
+        scope = (self.mode, self.machine)
+        limit = self.settings.max_search_results
+        query = (
+            search_term.replace(" ", ""),
+            self.settings.search_descriptions,
+            min_instances,
+            frozenset(self.expanded_templates) if min_instances > 0 else None,
+            limit,
+        )
+        # the inventory is swapped after the `mode` or `machine` has changed
+        is_cacheable = inventory is self.inventory_of(*scope)
+        if is_cacheable:
+            results = self.search_cache.get(scope, inventory.version, query)
+            if results is not None:
+                return results
+        # the fuzzy matching runs off the event loop, as it is CPU-bound
+        search = partial(
+            self.incremental_search.search_async,
+            version=inventory.version,
+            pool=self.search_pool,
+        )
+        if min_instances > 0:
+            results = await search_template_groups(
+                search_term,
+                inventory,
+                min_instances,
+                self.expanded_templates,
+                self.settings.search_descriptions,
+                search,
+                limit,
+            )
+        else:
+            search_descriptions = self.settings.search_descriptions
+            results = await search(
+                search_term,
+                inventory.names,
+                inventory.descriptions if search_descriptions else None,
+                inventory.name_masks,
+                inventory.description_masks if search_descriptions else {},
+                limit,
+            )
+        if is_cacheable:
+            self.search_cache.put(scope, inventory.version, query, results)
+        return results
 
     @work(exclusive=True, group="search_units")
     async def debounced_search_units(self, search_term: str) -> None:
@@ -2483,6 +4881,93 @@ class MainScreen(Screen):
         # Should the selection be always refreshed? I would argue yes.
         # The computation is fairly cheap and caching costs probably more.
         await self.refresh_selection()
+        self.load_on_demand_unit_types(search_term)
+
+    def unit_types_to_load(self, mode: str) -> Optional[List[str]]:
+        """
+        Return the unit types of `mode` that should be loaded or `None` for all types.
+        Includes the types that were loaded on demand.
+        """
+        if not self.unit_type_filter_enabled:
+            return None
+        unit_types = resolve_unit_types(
+            self.settings.included_unit_types, self.settings.excluded_unit_types
+        )
+        if unit_types is None:
+            return None
+        return unit_types + sorted(self.on_demand_unit_types[mode] - set(unit_types))
+
+    def load_on_demand_unit_types(self, search_term: str) -> None:
+        """
+        Load the filtered unit types whose suffix, like `.mount`,
+        is part of the `search_term`.
+        """
+        mode = self.mode
+        unit_types = self.unit_types_to_load(mode)
+        if unit_types is None:
+            return
+        search_term = search_term.lower()
+        requested = [
+            t.value for t in UnitType if t not in unit_types and f".{t}" in search_term
+        ]
+        if len(requested) > 0:
+            self.on_demand_unit_types[mode].update(requested)
+            self.load_unit_types_worker(mode, self.machine, requested)
+
+    @work()
+    async def load_unit_types_worker(
+        self, mode: str, machine: Optional[str], unit_types: List[str]
+    ) -> None:
+        unit_to_state_dict = await load_unit_to_state_dict(
+            mode,
+            backend=self.settings.inventory_backend,
+            unit_types=unit_types,
+            machine=machine,
+        )
+        delta = self.inventory_of(mode, machine).update(unit_to_state_dict)
+        self.publish_inventory_delta(mode, machine, delta)
+
+    async def action_toggle_template_group(self) -> None:
+        """
+        Expand or collapse the instances of the highlighted template
+        or of the template of the highlighted instance.
+        """
+        min_instances = self.settings.group_template_instances
+        unit = self.highlighted_unit
+        if min_instances == 0 or unit is None:
+            return
+        groups = self.unit_to_state_dict.template_groups(min_instances)
+        template = unit if unit in groups.instances else template_of(unit)
+        if template is None or template not in groups.instances:
+            self.notify("The highlighted unit is not part of a grouped template.")
+            return
+        self.expanded_templates ^= {template}
+        self.search_results = await self.search_units(self.search_term)
+        await self.refresh_selection()
+        sel = self.query_one(CustomSelectionList)
+        try:
+            sel.highlighted = sel.get_option_index(template)
+        except OptionDoesNotExist:
+            pass
+
+    def action_toggle_unit_type_filter(self) -> None:
+        if (
+            resolve_unit_types(
+                self.settings.included_unit_types, self.settings.excluded_unit_types
+            )
+            is None
+        ):
+            self.notify("No unit types are included or excluded in the settings.")
+            return
+        self.unit_type_filter_enabled = not self.unit_type_filter_enabled
+        unit_types = self.unit_types_to_load(self.mode)
+        self.notify(
+            "Loading all unit types."
+            if unit_types is None
+            else f"Only loading the unit types: {', '.join(unit_types)}"
+        )
+        self.revalidate_unit_to_state_dict_worker()
+        self.refresh_inactive_inventory()
 
     # let's assume that we have the search results stored in a reactive variable
     # then update_selection does NOT require a search_term variable
@@ -2505,7 +4990,7 @@ class MainScreen(Screen):
         Call this function within a function that has a debounce set!
         """
         # Maybe: Rewrite the function to only use parameters for clarity!
-        sel = cast(SelectionList, self.query_one(SelectionList))
+        sel = self.query_one(CustomSelectionList)
         prev_selected = sel.selected
         prev_highlighted = (
             sel.get_option_at_index(sel.highlighted)
@@ -2514,41 +4999,24 @@ class MainScreen(Screen):
         )
 
         sel.clear_options()
-        match_dicts = self.search_results
-        # get the relevant color values from the theme.
-        vars = self.app.get_css_variables()
-        # Should NOT be `success-text` as this color is used
-        # to render text that sits ON TOP of a widget with
-        # a `success` color! But I am rendering it on a plain
-        # background, so I _should_ select the `success` color.
-        render_state_colors = {
-            "color_success": vars["success"],
-            "color_warn": vars["warning"],
-            "color_error": vars["error"],
-            "color_different": vars["warning"],
-            "color_inactive": vars["text-muted"],
-        }
+        search_results = self.search_results
+        render_state_colors = self.render_state_colors()
+        # the matched characters are only highlighted once a unit becomes visible
         matches = [
             Selection(
-                prompt=self.unit_to_state_dict[d["value"]].render_state(
-                    d["value"], d["indices"], **render_state_colors
-                ),
-                value=d["value"],
-                initial_state=d["value"] in prev_selected,
-                id=d["value"],
+                prompt=self.render_unit_prompt(unit, None, render_state_colors),
+                value=unit,
+                initial_state=unit in prev_selected,
+                id=unit,
             )
-            for d in match_dicts
+            for unit in search_results
         ]
-        matched_units = [d["value"] for d in match_dicts]
+        matched_units = set(search_results)
         # first show the now "unmatched" selected units,
         # otherwise they might be hidden by the scrollbar
         prev_selected_unmatched_units = [
             Selection(
-                prompt=self.unit_to_state_dict[unit].render_state(
-                    unit,
-                    highlight_indices=None,
-                    **render_state_colors,
-                ),
+                prompt=self.render_unit_prompt(unit, None, render_state_colors),
                 value=unit,
                 initial_state=True,
                 id=unit,
@@ -2558,6 +5026,13 @@ class MainScreen(Screen):
         ]
         sel.add_options(prev_selected_unmatched_units)
         sel.add_options(matches)
+        self.shown_search_results = (self.search_term, matched_units)
+        sel.highlight_when_visible(
+            set(search_results) if self.search_term.strip() != "" else set(),
+            partial(
+                self.render_highlighted_prompt, render_state_colors=render_state_colors
+            ),
+        )
 
         # FUTURE: Improve the following code snippet
 
@@ -2585,57 +5060,538 @@ class MainScreen(Screen):
 
         sel.highlighted = new_highlight_position
 
+    def update_selection_prompts(self, units: Iterable[str]) -> int:
+        """
+        Render the prompts of the given `units` again, if they are shown,
+        without rebuilding the whole selection.
+        Returns the number of updated prompts.
+        """
+        sel = self.query_one(CustomSelectionList)
+        render_state_colors = self.render_state_colors()
+        if self.settings.group_template_instances > 0:
+            # the state counts of their templates have changed as well
+            units = set(units)
+            units.update(
+                template for unit in list(units) if (template := template_of(unit))
+            )
+        updated = 0
+        for unit in units:
+            try:
+                sel.replace_option_prompt(
+                    unit, self.render_unit_prompt(unit, None, render_state_colors)
+                )
+            except OptionDoesNotExist:
+                continue
+            if unit in self.shown_search_results[1]:
+                sel.highlight_when_visible({unit})
+            updated += 1
+        return updated
+
+    def render_highlighted_prompt(
+        self, unit: str, render_state_colors: Dict[str, str]
+    ) -> Text:
+        """
+        Render the prompt of the shown search result `unit` with the characters
+        that match the search term highlighted.
+        """
+        search_term, _matched_units = self.shown_search_results
+        inventory = self.unit_to_state_dict
+        min_instances = self.settings.group_template_instances
+        description = ""
+        # a grouped template is only searched by its name
+        if self.settings.search_descriptions and not (
+            min_instances > 0
+            and unit in inventory.template_groups(min_instances).instances
+        ):
+            description = inventory.details_of(unit).description
+        return self.render_unit_prompt(
+            unit, match_indices(search_term, unit, description), render_state_colors
+        )
+
+    def render_state_colors(self) -> Dict[str, str]:
+        # get the relevant color values from the theme.
+        vars = self.app.get_css_variables()
+        # Should NOT be `success-text` as this color is used
+        # to render text that sits ON TOP of a widget with
+        # a `success` color! But I am rendering it on a plain
+        # background, so I _should_ select the `success` color.
+        return {
+            "color_success": vars["success"],
+            "color_warn": vars["warning"],
+            "color_error": vars["error"],
+            "color_different": vars["warning"],
+            "color_inactive": vars["text-muted"],
+        }
+
+    def render_unit_prompt(
+        self,
+        unit: str,
+        indices: Optional[List[int]],
+        render_state_colors: Dict[str, str],
+    ) -> Text:
+        inventory = self.unit_to_state_dict
+        min_instances = self.settings.group_template_instances
+        indent = False
+        if min_instances > 0:
+            groups = inventory.template_groups(min_instances)
+            if unit in groups.instances:
+                return render_template_group(
+                    unit,
+                    indices,
+                    inventory.instance_state_counts(groups, unit),
+                    **render_state_colors,
+                )
+            indent = template_of(unit) in groups.instances
+        # a selected template may no longer be grouped nor loaded
+        prompt = inventory.get(unit, UnitReprState.not_found).render_state(
+            unit,
+            highlight_indices=indices,
+            details=inventory.details_of(unit)
+            if self.settings.show_unit_details
+            else None,
+            **render_state_colors,
+        )
+        # the instances of an expanded template are indented below it
+        return Text.assemble("  ", prompt) if indent else prompt
+
+    def periodic_partial_refresh_unit_to_state_dict(self) -> None:
+        if self.partial_refresh_interval.is_due():
+            self.partial_refresh_unit_to_state_dict()
+
+    def periodic_full_refresh_unit_to_state_dict(self) -> None:
+        if self.full_refresh_interval.is_due():
+            self.full_refresh_unit_to_state_dict()
+
     def partial_refresh_unit_to_state_dict(self) -> None:
-        self.refresh_unit_to_state_dict_worker(*self.relevant_units)
+        self.refresh_scheduler.request_partial(*self.relevant_units)
 
     def full_refresh_unit_to_state_dict(self) -> None:
-        self.refresh_unit_to_state_dict_worker()
+        self.refresh_scheduler.request_full()
+
+    async def update_unit_change_subscription(self) -> None:
+        """
+        Subscribe to the unit changes of the current `mode` if `refresh_mode`
+        is `push` and drop the subscription of the previous `mode`.
+        The polling timers are only active if no subscription exists.
+        """
+        previous_connection = self.unit_change_connection
+        self.unit_change_connection = None
+        if previous_connection is not None:
+            previous_connection.remove_signal_handler(self.on_unit_change_signal)
+            if not previous_connection.is_closed:
+                try:
+                    await unsubscribe_unit_changes(previous_connection)
+                except (DBusError, OSError) as e:
+                    log.warning(f"Could not unsubscribe from unit changes: {e}")
+
+        if (
+            self.settings.refresh_mode == RefreshMode.PUSH
+            and self.mode not in _DBUS_UNAVAILABLE_MODES
+            and self.machine is None
+            and get_transport().is_local
+        ):
+            connection = None
+            try:
+                connection = await get_dbus_connection(self.mode)
+                connection.add_signal_handler(self.on_unit_change_signal)
+                await subscribe_unit_changes(connection)
+                self.unit_change_connection = connection
+            except (DBusError, OSError, EOFError) as e:
+                log.warning(f"Falling back to polling the unit states: {e}")
+                if connection is not None:
+                    connection.remove_signal_handler(self.on_unit_change_signal)
+
+        self.update_refresh_timers()
+        if self.unit_change_connection is not None:
+            self.watch_unit_change_connection(self.unit_change_connection)
+
+    def update_refresh_timers(self) -> None:
+        """
+        Only run the timers that are required for the current `refresh_mode`
+        and pause all of them while the application is inactive.
+        """
+        active = len(self.inactive_reasons) == 0
+        push = self.unit_change_connection is not None
+        # new and removed unit files are reported by the watcher,
+        # unless it has already lost events
+        watched = (
+            self.unit_file_watcher is not None and not self.unit_file_watcher.overflowed
+        )
+        for timer, run in [
+            (self.partial_refresh_timer, active and not push),
+            (self.full_refresh_timer, active and not (push or watched)),
+            (self.push_resync_timer, active and (push or watched)),
+            # the preview is refreshed by the unit change signals instead
+            (self.preview_refresh_timer, active and not push),
+            (
+                self.inactive_inventory_refresh_timer,
+                active and self.settings.inactive_mode_refresh_interval_sec > 0,
+            ),
+        ]:
+            if run:
+                timer.resume()
+            else:
+                timer.pause()
+
+    def set_inactive(self, reason: str, inactive: bool) -> None:
+        """
+        Mark the application as inactive for the given `reason`, for example,
+        `suspended`, `unfocused` or `idle`.
+        Refreshes are only paused if `pause_refresh_when_inactive` is set.
+        If the last reason is removed, a single catch-up refresh is triggered.
+        """
+        if not self.settings.pause_refresh_when_inactive:
+            return
+        was_active = len(self.inactive_reasons) == 0
+        if inactive:
+            self.inactive_reasons.add(reason)
+        else:
+            self.inactive_reasons.discard(reason)
+        is_active = len(self.inactive_reasons) == 0
+        if was_active == is_active:
+            return
+        self.update_refresh_timers()
+        if is_active:
+            self.full_refresh_unit_to_state_dict()
+            self.refresh_preview()
+
+    def check_idle(self) -> None:
+        idle_time = (
+            time.monotonic() - cast(InteractiveSystemd, self.app).last_input_time
+        )
+        if idle_time >= self.settings.idle_timeout_sec:
+            self.set_inactive("idle", True)
+
+    @work(exclusive=True, group="watch_unit_change_connection")
+    async def watch_unit_change_connection(self, connection: DBusConnection) -> None:
+        """
+        Re-subscribe or fall back to polling if the connection is lost.
+        Changes that were missed in the meantime are picked up by a full refresh.
+        """
+        await connection.wait_closed()
+        if connection is self.unit_change_connection:
+            await self.update_unit_change_subscription()
+            self.full_refresh_unit_to_state_dict()
+
+    async def update_unit_file_watcher(self) -> None:
+        """
+        Watch the unit search paths of the current `mode` if `watch_unit_files`
+        is set and stop watching the ones of the previous `mode`.
+        """
+        if self.unit_file_watcher is not None:
+            self.unit_file_watcher.close()
+            self.unit_file_watcher = None
+
+        if (
+            self.settings.watch_unit_files
+            and self.machine is None
+            and get_transport().is_local
+        ):
+            watcher = UnitFileWatcher(
+                await unit_search_paths(self.mode), self.on_unit_files_changed
+            )
+            try:
+                watcher.start()
+                self.unit_file_watcher = watcher
+            except OSError as e:
+                log.warning(f"Could not watch the unit files: {e}")
+                watcher.close()
+
+        self.update_refresh_timers()
+
+    def on_unit_files_changed(self, unit_files: set[str], full_refresh: bool) -> None:
+        # skip editor swap and backup files
+        units = {unit for unit in unit_files if unit_type(unit) in UNIT_TYPES[1:]}
+        self.queue_unit_changes(units, full_refresh)
+        if self.unit_file_watcher is not None and self.unit_file_watcher.overflowed:
+            # fall back to the regular full refreshes
+            self.update_refresh_timers()
+
+    def on_unmount(self) -> None:
+        if self.unit_file_watcher is not None:
+            self.unit_file_watcher.close()
+        self.search_pool.close()
+
+    def on_unit_change_signal(self, message: Message) -> None:
+        units, full_refresh = unit_changes_from_signal(message)
+        if any(unit in units for unit in self.relevant_units):
+            self.refresh_preview()
+        self.queue_unit_changes(units, full_refresh)
+
+    def queue_unit_changes(self, units: set[str], full_refresh: bool) -> None:
+        if full_refresh:
+            self.full_refresh_unit_to_state_dict()
+        if len(units) > 0:
+            self.pending_unit_changes.update(units)
+            if not self._applying_unit_changes:
+                self._applying_unit_changes = True
+                self.apply_pending_unit_changes()
+
+    @work()
+    async def apply_pending_unit_changes(self) -> None:
+        """
+        Reload the states of the units that were reported as changed.
+        A single job usually changes multiple units at once,
+        so the changes are collected for `updates_throttle_sec`.
+        """
+        try:
+            while len(self.pending_unit_changes) > 0:
+                await asyncio.sleep(self.settings.updates_throttle_sec)
+                units = self.pending_unit_changes
+                self.pending_unit_changes = set()
+                self.refresh_scheduler.request_partial(*units)
+        finally:
+            self._applying_unit_changes = False
 
     async def new_unit_to_state_dict(self) -> None:
-        self.unit_to_state_dict = await load_unit_to_state_dict(self.mode)
+        """
+        Show the `unit_to_state_dict` of the current `mode`.
+        If the inventory of the `mode` is kept warm or a snapshot from a previous
+        run exists, it is shown immediately and revalidated in the background.
+        """
+        if self.settings.inactive_mode_refresh_interval_sec == 0:
+            # do not keep the other inventory in memory
+            for mode, inventory in self.inventories.items():
+                if mode != self.mode:
+                    inventory.replace({})
+
+        inventory = self.inventory_of(self.mode, self.machine)
+        if len(inventory) == 0:
+            # only the host inventories are stored as snapshots
+            snapshot = (
+                load_inventory_snapshot(self.mode) if self.machine is None else None
+            )
+            if snapshot is None:
+                await self.revalidate_unit_to_state_dict()
+                return
+            inventory.replace(snapshot)
+        self.set_reactive(MainScreen.unit_to_state_dict, inventory)
         # also needs to update the search_results, since we may now have
         # _more_ results _or_ completely different results if the mode was switched!
         self.search_results = await self.search_units(self.search_term)
         self.mutate_reactive(MainScreen.unit_to_state_dict)
+        self.revalidate_unit_to_state_dict_worker()
+
+    @work(exclusive=True, group="revalidate_unit_to_state_dict")
+    async def revalidate_unit_to_state_dict_worker(self) -> None:
+        await self.revalidate_unit_to_state_dict()
+
+    async def revalidate_unit_to_state_dict(self) -> None:
+        """
+        Replace the inventory of the current `mode` and `machine` with the freshly
+        loaded units and store them as the snapshot of the `mode`.
+        """
+        mode = self.mode
+        machine = self.machine
+        unit_to_state_dict = await load_unit_to_state_dict(
+            mode,
+            backend=self.settings.inventory_backend,
+            unit_types=self.unit_types_to_load(mode),
+            machine=machine,
+        )
+        if machine is None:
+            store_inventory_snapshot(mode, unit_to_state_dict)
+        inventory = self.inventory_of(mode, machine)
+        delta = inventory.replace(unit_to_state_dict)
+        if (mode, machine) != (self.mode, self.machine):
+            return
+        if self.unit_to_state_dict is inventory:
+            self.publish_inventory_delta(mode, machine, delta)
+            return
+        self.set_reactive(MainScreen.unit_to_state_dict, inventory)
+        self.search_results = await self.search_units(self.search_term)
+        self.mutate_reactive(MainScreen.unit_to_state_dict)
+
+    def publish_inventory_delta(
+        self, mode: str, machine: Optional[str], delta: InventoryDelta
+    ) -> None:
+        if delta:
+            self.post_message(MainScreen.InventoryChanged(mode, machine, delta))
+
+    async def on_main_screen_inventory_changed(
+        self, event: MainScreen.InventoryChanged
+    ) -> None:
+        """
+        Only search again if units were added, removed or reordered.
+        Otherwise, only the changed units are rendered again and the preview
+        is only refreshed if one of the `relevant_units` has changed.
+        """
+        if (event.mode, event.machine) != (self.mode, self.machine):
+            # inventories of the inactive modes and machines are swapped in as a whole
+            return
+        delta = event.delta
+        counters = self.delta_counters
+        counters["added"] += len(delta.added)
+        counters["removed"] += len(delta.removed)
+        counters["changed"] += len(delta.changed)
+        if delta.requires_search:
+            self.search_results = await self.search_units(self.search_term)
+            await self.refresh_selection()
+        else:
+            counters["rendered_in_place"] += self.update_selection_prompts(
+                delta.changed
+            )
+        units = delta.units()
+        if any(unit in units for unit in self.relevant_units):
+            self.refresh_preview()
+
+    def inventory_of(self, mode: str, machine: Optional[str]) -> UnitInventory:
+        """
+        Return the inventory of `mode` on the `machine` (`None` for the host).
+        """
+        if machine is None:
+            return self.inventories[mode]
+        return self.machine_inventories.setdefault((mode, machine), UnitInventory())
+
+    def inactive_mode(self) -> str:
+        return "system" if self.mode == "user" else "user"
+
+    def warm_up_inactive_inventory(self) -> None:
+        """
+        Fill the inventory of the inactive `mode` from its snapshot or
+        load it in the background, so that toggling the `mode` is instant.
+        """
+        if self.settings.inactive_mode_refresh_interval_sec == 0:
+            return
+        mode = self.inactive_mode()
+        if len(self.inventories[mode]) > 0:
+            return
+        snapshot = load_inventory_snapshot(mode)
+        if snapshot is not None:
+            self.inventories[mode].replace(snapshot)
+        else:
+            self.refresh_inactive_inventory()
+
+    def refresh_inactive_inventory(self) -> None:
+        mode = self.inactive_mode()
+        if mode not in self._cold_modes:
+            self.refresh_inactive_inventory_worker(mode)
+        self.refresh_machine_inventories()
+
+    def refresh_machine_inventories(self) -> None:
+        if len(self.settings.machines) > 0:
+            self.refresh_machine_inventories_worker(self.mode)
+
+    @work(exclusive=True, group="refresh_machine_inventories")
+    async def refresh_machine_inventories_worker(self, mode: str) -> None:
+        """
+        Reload the inventories of all configured `machines` of `mode`
+        with at most `machine_workers` machines at the same time.
+        """
+        unit_to_state_dicts, errors = await load_machine_unit_to_state_dicts(
+            mode,
+            self.settings.machines,
+            max_workers=self.settings.machine_workers,
+            backend=self.settings.inventory_backend,
+            unit_types=self.unit_types_to_load(mode),
+        )
+        for machine, unit_to_state_dict in unit_to_state_dicts.items():
+            self._unreachable_machines.discard(machine)
+            delta = self.inventory_of(mode, machine).replace(unit_to_state_dict)
+            self.publish_inventory_delta(mode, machine, delta)
+        new_errors = errors.keys() - self._unreachable_machines
+        for machine, error in errors.items():
+            log.warning(f"Could not load the units of machine {machine}: {error}")
+        if len(new_errors) > 0:
+            self._unreachable_machines.update(new_errors)
+            self.notify(
+                f"Could not load the units of: {', '.join(sorted(new_errors))}",
+                severity="warning",
+            )
+
+    @work(exclusive=True, group="refresh_inactive_inventory")
+    async def refresh_inactive_inventory_worker(self, mode: str) -> None:
+        """
+        Reload all units of the inactive `mode`.
+        If the `mode` cannot be loaded, for example, the `user` bus of `root`,
+        it is not kept warm anymore.
+        """
+        try:
+            unit_to_state_dict = await load_unit_to_state_dict(
+                mode,
+                backend=self.settings.inventory_backend,
+                unit_types=self.unit_types_to_load(mode),
+            )
+        except Exception as e:
+            log.warning(f"Not keeping the {mode} inventory warm: {e}")
+            self._cold_modes.add(mode)
+            return
+        if mode == self.mode:
+            # the revalidation of the now active mode takes care of it
+            return
+        inventory = self.inventories[mode]
+        version = inventory.version
+        inventory.replace(unit_to_state_dict)
+        # the snapshot is still up to date if nothing has changed
+        if inventory.version != version:
+            store_inventory_snapshot(mode, unit_to_state_dict)
 
     @work(exclusive=True, group="refresh_unit_to_state_dict")
     async def throttled_refresh_unit_to_state_dict_worker(self) -> None:
         """
-        Will throttle the calls to `refresh_unit_to_state_dict_worker`.
+        Will throttle the partial refreshes.
         This should be done whenever many partial updates are expected.
         """
         await asyncio.sleep(self.settings.updates_throttle_sec)
-        self.refresh_unit_to_state_dict_worker(*self.relevant_units)
+        self.partial_refresh_unit_to_state_dict()
 
-    @work()
-    async def refresh_unit_to_state_dict_worker(self, *units: str) -> None:
+    async def refresh_unit_to_state_dict(self, *units: str) -> None:
         """
         Refreshes the `unit_to_state_dict` by reloading the states of the
         given `units`. If some of the provided `units` cannot be found, set those
         `units` in the `unit_to_state_dict` as `not_found`.
 
         If no units are given, then it will refresh ALL units.
-
-        This is a worker since it might take a long time until
-        `load_unit_to_state_dict` has returned.
-        But it should NOT be exclusive! If there is one full refresh queued
-        and after it a partial update, then the full refresh might be interrupted!
         """
-        local_unit_to_state_dict = deepcopy(self.unit_to_state_dict)
-        partial_unit_to_state_dict = await load_unit_to_state_dict(self.mode, *units)
-        for unit in partial_unit_to_state_dict:
-            local_unit_to_state_dict[unit] = partial_unit_to_state_dict[unit]
-
-        for unit in set(units) - partial_unit_to_state_dict.keys():
-            local_unit_to_state_dict[unit] = UnitReprState.not_found
-
-        if local_unit_to_state_dict != self.unit_to_state_dict:
-            # Using `update` and not simple `=` as multiple accesses could
-            # happen at the same time! I do not want to loose updates to
-            # new keys!
-            self.unit_to_state_dict.update(local_unit_to_state_dict)
-            self.mutate_reactive(MainScreen.unit_to_state_dict)
-            # unit_to_state_dict watcher calls update_selection!
+        mode = self.mode
+        machine = self.machine
+        # the specific units are loaded independent of their type
+        unit_types = None if len(units) > 0 else self.unit_types_to_load(mode)
+        start = time.monotonic()
+        partial_unit_to_state_dict = await load_unit_to_state_dict(
+            mode,
+            *units,
+            backend=self.settings.inventory_backend,
+            unit_types=unit_types,
+            machine=machine,
+        )
+        now = time.monotonic()
+        duration = now - start
+        inventory = self.inventory_of(mode, machine)
+        if len(units) > 0:
+            vanished = set(units) - partial_unit_to_state_dict.keys()
+        else:
+            # only the loaded unit types can be missing
+            vanished = {
+                unit
+                for unit in inventory
+                if unit not in partial_unit_to_state_dict
+                and (unit_types is None or unit_type(unit) in unit_types)
+            }
+        inventory.update_tombstones(vanished, partial_unit_to_state_dict, now)
+        for unit in vanished:
+            partial_unit_to_state_dict[unit] = UnitReprState.not_found
+
+        # Only the delta is applied in place, so concurrent refreshes
+        # cannot loose updates to each other.
+        delta = inventory.update(partial_unit_to_state_dict)
+        is_current = (mode, machine) == (self.mode, self.machine)
+        # the relevant units do not vanish while the user interacts with them
+        evicted = inventory.evict(
+            now - self.settings.vanished_unit_retention_sec,
+            keep=set(self.relevant_units) if is_current else (),
+        )
+        if not is_current:
+            # the inventory of the previous mode or machine is kept warm
+            return
+        refresh_interval = (
+            self.partial_refresh_interval
+            if len(units) > 0
+            else self.full_refresh_interval
+        )
+        refresh_interval.record(duration, bool(delta))
+        self.publish_inventory_delta(mode, machine, delta)
+        self.publish_inventory_delta(mode, machine, evicted)
 
     # FUTURE: Evaluate if updating the self values in compose makes sense.
     def compose(self) -> ComposeResult:
@@ -2708,6 +5664,8 @@ class InteractiveSystemd(App, inherit_bindings=False):
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
+        # used to detect if `isd` is idle
+        self.last_input_time = time.monotonic()
         default = deepcopy(textual.theme.BUILTIN_THEMES["textual-dark"])
         default.name = TERMINAL_DERIVED_THEME_NAME
         self.register_theme(default)
@@ -2717,6 +5675,7 @@ class InteractiveSystemd(App, inherit_bindings=False):
         except Exception as e:
             self.settings = Settings.model_construct()
             self.settings_error = e
+        set_transport(transport_from_command(self.settings.transport_command))
         _persistent_json_fp = get_isd_persistent_json_file_path()
 
         try:
@@ -2779,6 +5738,22 @@ class InteractiveSystemd(App, inherit_bindings=False):
         # enforce a full refresh to not have broken layout
         self.refresh()
 
+    def _set_main_screen_inactive(self, reason: str, inactive: bool) -> None:
+        if self.is_screen_installed("main"):
+            self.get_screen("main", MainScreen).set_inactive(reason, inactive)
+
+    async def on_event(self, event: events.Event) -> None:
+        if isinstance(event, events.InputEvent):
+            self.last_input_time = time.monotonic()
+            self._set_main_screen_inactive("idle", False)
+        await super().on_event(event)
+
+    def on_app_blur(self, _event: events.AppBlur) -> None:
+        self._set_main_screen_inactive("unfocused", True)
+
+    def on_app_focus(self, _event: events.AppFocus) -> None:
+        self._set_main_screen_inactive("unfocused", False)
+
     def update_schema(self) -> None:
         schema = json.dumps(Settings.model_json_schema())
         fp = isd_config_dir() / "schema.json"
@@ -2853,6 +5828,11 @@ class InteractiveSystemd(App, inherit_bindings=False):
         yield SystemCommand(
             "Show version", "Show the isd version", self.action_show_version
         )
+        yield SystemCommand(
+            "Show refresh statistics",
+            "Show how many unit state refreshes were merged or skipped",
+            self.action_show_refresh_statistics,
+        )
 
         if screen.query("HelpPanel"):
             yield SystemCommand(
@@ -2877,7 +5857,6 @@ class InteractiveSystemd(App, inherit_bindings=False):
             self.set_terminal_derived_theme()
             self.refresh()
 
-
     async def on_theme_changed(self, event):
         """
         Manually subscribed to a theme change via the
@@ -2899,6 +5878,20 @@ class InteractiveSystemd(App, inherit_bindings=False):
     def action_show_version(self) -> None:
         self.notify(f"isd version: {__version__}", timeout=30)
 
+    def action_show_refresh_statistics(self) -> None:
+        screen = self.get_screen("main", MainScreen)
+        counters = screen.delta_counters
+        summary = (
+            screen.refresh_scheduler.summary()
+            + f"\nUnits: {counters['added']} added, {counters['removed']} removed, "
+            f"{counters['changed']} changed ({counters['rendered_in_place']} rendered in place)"
+            + f"\nSearches: {screen.incremental_search.full_scans} full scans, "
+            f"{screen.incremental_search.narrowed_scans} narrowed"
+            + f"\nSearch cache: {screen.search_cache.hits} hits, "
+            f"{screen.search_cache.misses} misses, {screen.search_cache.evictions} evicted"
+        )
+        self.notify(summary, title="Refresh statistics", timeout=30)
+
     def set_terminal_derived_theme(self) -> None:
         # Not checked yet
         if self.THEME_COULD_BE_DERIVED is None:
@@ -2961,6 +5954,9 @@ class InteractiveSystemd(App, inherit_bindings=False):
         if self.startup_count % 100 == 0:
             self.call_after_refresh(self.show_donation_screen)
 
+    async def on_unmount(self) -> None:
+        await get_transport().close()
+
     @work
     async def show_donation_screen(self) -> None:
         prev_focus = self.focused
@@ -0,0 +1,381 @@
+"""
+Fuzzy matching of the unit names off the event loop.
+
+`search_unit_names` ranks the units with the `fzy` scorer of `pfzy`.
+The scoring is CPU-bound pure Python, so the `SearchPool` splits large
+haystacks into chunks that are scored in worker processes and merged into
+the same ranking as a single `search_unit_names` call.
+Smaller haystacks are scored in a thread, as starting and feeding the
+processes costs more than it saves.
+
+The ranking only needs the scores (`fzy_score`).
+The indices of the matched characters are only computed with `match_indices`
+for the units that are actually rendered.
+
+Before the scoring, the candidates can be prefiltered with the precomputed
+`character_mask`s of the units, see `prefilter_unit_names`.
+
+This module only depends on `pfzy` and the standard library, as the worker
+processes import it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain, repeat
+from operator import itemgetter
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from pfzy.score import (
+    SCORE_GAP_INNER,
+    SCORE_GAP_LEADING,
+    SCORE_GAP_TRAILING,
+    SCORE_MATCH_CONSECUTIVE,
+    SCORE_MAX,
+    SCORE_MIN,
+    _bonus,
+    _subsequence,
+    fzy_scorer,
+)
+
+# (score, unit)
+ScoredUnit = Tuple[float, str]
+
+# The scoring takes about 3-18 µs per unit, depending on the search term.
+# Handing a chunk to a process adds about 0.3 ms plus up to 4 µs per unit
+# and each `spawn`ed worker takes about 160 ms to start.
+# Below this many (prefiltered) units, a search takes at most ~0.2 s in a thread
+# and the workers would not pay off.
+PROCESS_THRESHOLD = 10_000
+# Additional workers hardly help, as the merging and the transfer of the chunks
+# are not parallelized.
+MAX_DEFAULT_WORKERS = 4
+
+# The characters of most unit names get their own bit,
+# all other characters share the last one.
+_CHARACTER_BITS: Dict[str, int] = {
+    char: 1 << bit
+    for bit, char in enumerate("abcdefghijklmnopqrstuvwxyz0123456789-._@:\\")
+}
+_OTHER_CHARACTERS_BIT = 1 << 63
+
+
+def character_mask(text: str) -> int:
+    """
+    Return the set of the lower-cased characters of `text` as a 64-bit mask.
+    A needle can only be a (case-insensitive) subsequence of a text if all bits
+    of its mask are set in the mask of the text.
+    """
+    mask = 0
+    for char in set(text.lower()):
+        mask |= _CHARACTER_BITS.get(char, _OTHER_CHARACTERS_BIT)
+    return mask
+
+
+def fzy_score(needle: str, haystack: str) -> Optional[float]:
+    """
+    Return the score of `fzy_scorer` or `None` if `needle` does not match.
+
+    Unlike `fzy_scorer`, the indices of the matched characters are not
+    backtracked, so only the previous row of the score matrices is kept.
+    The computation is the same, so the scores are identical.
+    """
+    if not _subsequence(needle, haystack):
+        return None
+    needle_len, haystack_len = len(needle), len(haystack)
+    if needle_len == 0 or needle_len == haystack_len:
+        return SCORE_MAX
+    bonus_score = _bonus(haystack)
+    # smart case
+    if needle.islower():
+        haystack = haystack.lower()
+    prev_running: List[float] = []
+    prev_result: List[float] = []
+    for i, char in enumerate(needle):
+        prev_score = SCORE_MIN
+        gap_score = SCORE_GAP_TRAILING if i == needle_len - 1 else SCORE_GAP_INNER
+        running = [SCORE_MIN] * haystack_len
+        result = [SCORE_MIN] * haystack_len
+        for j in range(haystack_len):
+            if char == haystack[j]:
+                score = SCORE_MIN
+                if i == 0:
+                    score = j * SCORE_GAP_LEADING + bonus_score[j]
+                elif j != 0:
+                    score = max(
+                        prev_result[j - 1] + bonus_score[j],
+                        prev_running[j - 1] + SCORE_MATCH_CONSECUTIVE,
+                    )
+                running[j] = score
+                result[j] = prev_score = max(score, prev_score + gap_score)
+            else:
+                result[j] = prev_score = prev_score + gap_score
+        prev_running, prev_result = running, result
+    return prev_result[-1]
+
+
+def match_indices(
+    search_term: str, unit: str, description: str = ""
+) -> Optional[List[int]]:
+    """
+    Return the indices of the characters of `unit` that `search_term` matches,
+    like `fzy_scorer`, or `None` if it does not match.
+    If only the `description` matches, its indices refer to the text
+    `unit + " " + description`, as the units are rendered.
+    """
+    needle = search_term.replace(" ", "")
+    _score, indices = fzy_scorer(needle, unit)
+    if indices is not None or description == "":
+        return indices
+    _score, indices = fzy_scorer(needle, description)
+    if indices is None:
+        return None
+    offset = len(unit) + 1
+    return [offset + idx for idx in indices]
+
+
+def prefilter_unit_names(
+    needle: str,
+    unit_names: Sequence[str],
+    masks: Sequence[int],
+    descriptions: Optional[Sequence[str]] = None,
+    description_masks: Mapping[str, int] = {},
+) -> Tuple[List[str], Optional[List[str]]]:
+    """
+    Drop the units that cannot match `needle` without scoring them.
+
+    `masks` holds the `character_mask` of the `unit_names` in the same order,
+    `description_masks` the ones of the non-empty descriptions by unit.
+    Only a single integer comparison per unit is needed, instead of the
+    subsequence test of the scorer.
+    The remaining units and their descriptions keep their order.
+    """
+    required = character_mask(needle)
+    if required == 0:
+        return list(unit_names), None if descriptions is None else list(descriptions)
+    if descriptions is None:
+        return [
+            unit for unit, mask in zip(unit_names, masks) if mask & required == required
+        ], None
+    names = []
+    names_descriptions = []
+    for unit, mask, description in zip(unit_names, masks, descriptions):
+        if (
+            mask & required == required
+            or description_masks.get(unit, 0) & required == required
+        ):
+            names.append(unit)
+            names_descriptions.append(description)
+    return names, names_descriptions
+
+
+def score_unit_names(
+    needle: str,
+    unit_names: Iterable[str],
+    descriptions: Optional[Iterable[str]] = None,
+) -> Tuple[List[ScoredUnit], List[ScoredUnit]]:
+    """
+    Score the `unit_names` and, for the units whose name does not match,
+    their `descriptions`.
+    Returns the unsorted name and description matches in the order of the units.
+    """
+    scored = []
+    scored_descriptions = []
+    if descriptions is None:
+        descriptions = repeat("")
+    for unit, description in zip(unit_names, descriptions):
+        score = fzy_score(needle, unit)
+        if score is not None:
+            scored.append((score, unit))
+        elif description != "":
+            score = fzy_score(needle, description)
+            if score is not None:
+                scored_descriptions.append((score, unit))
+    return scored, scored_descriptions
+
+
+def rank_scored_chunks(
+    chunks: Iterable[Tuple[List[ScoredUnit], List[ScoredUnit]]],
+    limit: int = 0,
+) -> List[str]:
+    """
+    Merge the `score_unit_names` results of consecutive chunks of a haystack.
+
+    With a positive `limit`, only the `limit` best matches are selected with a heap
+    instead of sorting all of them, which results in the same order as the
+    first `limit` matches of the full ranking.
+    """
+    scored = []
+    scored_descriptions = []
+    for chunk_scored, chunk_scored_descriptions in chunks:
+        scored.extend(chunk_scored)
+        scored_descriptions.extend(chunk_scored_descriptions)
+    if limit > 0:
+        # like the stable sort, `nlargest` keeps ties in the inventory order
+        scored = heapq.nlargest(limit, scored, key=itemgetter(0))
+        scored_descriptions = heapq.nlargest(
+            limit - len(scored), scored_descriptions, key=itemgetter(0)
+        )
+    else:
+        # stable sort, as ties keep the inventory order
+        scored.sort(key=itemgetter(0), reverse=True)
+        scored_descriptions.sort(key=itemgetter(0), reverse=True)
+    return [unit for _, unit in chain(scored, scored_descriptions)]
+
+
+def matched_units(
+    chunks: Iterable[Tuple[List[ScoredUnit], List[ScoredUnit]]],
+) -> set[str]:
+    """
+    Return all units of the `score_unit_names` results,
+    including the ones that `rank_scored_chunks` drops because of its `limit`.
+    """
+    return {
+        unit
+        for chunk_scored, chunk_scored_descriptions in chunks
+        for _, unit in chain(chunk_scored, chunk_scored_descriptions)
+    }
+
+
+def search_unit_names(
+    search_term: str,
+    unit_names: Sequence[str],
+    descriptions: Optional[Sequence[str]] = None,
+    masks: Optional[Sequence[int]] = None,
+    description_masks: Mapping[str, int] = {},
+    limit: int = 0,
+) -> List[str]:
+    """
+    Rank the `unit_names` with the `fzy` scorer and return the matching units.
+    The indices of the matched characters are computed with `match_indices`.
+
+    Produces the same ranking as `pfzy.fuzzy_match` but scores the names directly,
+    instead of wrapping every unit in a dictionary first.
+
+    If the `descriptions` (in the order of `unit_names`) are given, units whose
+    description matches are ranked after all units whose name matches.
+
+    If the `masks` are given, the units are prefiltered with
+    `prefilter_unit_names` first.
+    A positive `limit` only returns the best `limit` matches.
+    """
+    needle = search_term.replace(" ", "")
+    if masks is not None:
+        unit_names, descriptions = prefilter_unit_names(
+            needle, unit_names, masks, descriptions, description_masks
+        )
+    return rank_scored_chunks(
+        [score_unit_names(needle, unit_names, descriptions)], limit
+    )
+
+
+class SearchPool:
+    """
+    Runs `search_unit_names` off the event loop.
+
+    The haystack is split into chunks of `chunk_size` units.
+    If it has more than `process_threshold` units, the chunks are scored on
+    `workers` processes in parallel (`0` uses up to `MAX_DEFAULT_WORKERS` CPUs).
+    Smaller haystacks, or all of them with a single worker, are scored in a thread,
+    one chunk after another.
+    The processes are only started by the first search that needs them.
+    If the awaiting task is cancelled, for example, by a newer search term,
+    the chunks that have not been started yet are cancelled as well.
+    If the `masks` are given, the units are prefiltered in the thread first.
+    """
+
+    def __init__(
+        self,
+        workers: int = 0,
+        chunk_size: int = 2_000,
+        process_threshold: int = PROCESS_THRESHOLD,
+    ) -> None:
+        self.workers = (
+            workers if workers > 0 else min(MAX_DEFAULT_WORKERS, os.cpu_count() or 1)
+        )
+        self.chunk_size = chunk_size
+        self.process_threshold = process_threshold
+        self._thread: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self, units: int) -> Executor:
+        if (
+            self.workers > 1
+            and units > self.process_threshold
+            and units > self.chunk_size
+        ):
+            if self._processes is None:
+                # `fork` is unsafe in a process with threads
+                self._processes = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._processes
+        if self._thread is None:
+            self._thread = ThreadPoolExecutor(1, thread_name_prefix="isd-search")
+        return self._thread
+
+    async def search(
+        self,
+        search_term: str,
+        unit_names: Sequence[str],
+        descriptions: Optional[Sequence[str]] = None,
+        masks: Optional[Sequence[int]] = None,
+        description_masks: Mapping[str, int] = {},
+        limit: int = 0,
+    ) -> List[str]:
+        chunks = await self.score(
+            search_term, unit_names, descriptions, masks, description_masks
+        )
+        return rank_scored_chunks(chunks, limit)
+
+    async def score(
+        self,
+        search_term: str,
+        unit_names: Sequence[str],
+        descriptions: Optional[Sequence[str]] = None,
+        masks: Optional[Sequence[int]] = None,
+        description_masks: Mapping[str, int] = {},
+    ) -> List[Tuple[List[ScoredUnit], List[ScoredUnit]]]:
+        """
+        Return the unranked `score_unit_names` results of all chunks.
+        """
+        needle = search_term.replace(" ", "")
+        loop = asyncio.get_running_loop()
+        if masks is not None:
+            # the units that are appended meanwhile may or may not be included
+            unit_names, descriptions = await loop.run_in_executor(
+                self._executor(0),
+                prefilter_unit_names,
+                needle,
+                unit_names,
+                masks,
+                descriptions,
+                description_masks,
+            )
+        size = self.chunk_size
+        # the chunks are copies, so the haystack may change while they are scored
+        starts = range(0, max(len(unit_names), 1), size)
+        executor = self._executor(len(unit_names))
+        futures = [
+            loop.run_in_executor(
+                executor,
+                score_unit_names,
+                needle,
+                unit_names[start : start + size],
+                None if descriptions is None else descriptions[start : start + size],
+            )
+            for start in starts
+        ]
+        # cancelling `gather` cancels the pending chunks
+        return await asyncio.gather(*futures)
+
+    def close(self) -> None:
+        for executor in (self._thread, self._processes):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._thread = None
+        self._processes = None
@@ -0,0 +1,336 @@
+"""
+A long-lived asyncio D-Bus connection to the `systemd` service manager.
+
+The wire protocol, the authentication and the messages are provided by
+`jeepney`, which is an optional dependency (`isd-tui[dbus]`).
+Without it, `DBusConnection.connect` raises a `ConnectionError`, so the
+callers fall back to `systemctl` like for an unreachable bus.
+
+On top of `jeepney`, the `DBusConnection` matches the replies to their calls
+in a background task, forwards the signals to the registered handlers and
+reports when the connection has been lost, so it can be shared by all
+calls of a mode and the unit change subscription.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from jeepney import (  # type: ignore[import-untyped]
+        DBusAddress,
+        HeaderFields,
+        MessageType,
+        new_method_call,
+    )
+    from jeepney.io.asyncio import open_dbus_connection  # type: ignore[import-untyped]
+except ImportError:
+    HAS_JEEPNEY = False
+else:
+    HAS_JEEPNEY = True
+
+if TYPE_CHECKING:
+    from jeepney import Message
+    from jeepney.io.asyncio import DBusConnection as JeepneyConnection
+
+SYSTEMD_BUS_NAME = "org.freedesktop.systemd1"
+SYSTEMD_OBJECT_PATH = "/org/freedesktop/systemd1"
+SYSTEMD_MANAGER_INTERFACE = "org.freedesktop.systemd1.Manager"
+
+SYSTEMD_UNIT_INTERFACE = "org.freedesktop.systemd1.Unit"
+
+DBUS_BUS_NAME = "org.freedesktop.DBus"
+DBUS_OBJECT_PATH = "/org/freedesktop/DBus"
+DBUS_INTERFACE = "org.freedesktop.DBus"
+DBUS_PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+
+DEFAULT_SYSTEM_BUS_ADDRESS = "unix:path=/run/dbus/system_bus_socket"
+
+
+class DBusError(Exception):
+    """
+    Raised if a method call returns an error reply.
+    """
+
+    def __init__(self, name: str, message: str = "") -> None:
+        super().__init__(f"{name}: {message}" if message else name)
+        self.name = name
+        self.message = message
+
+
+def escape_object_path_label(label: str) -> str:
+    """
+    Escape a string for the usage within an object path like `bus_label_escape`:
+    All characters except for ASCII letters and digits are escaped as `_xx`.
+    """
+    return (
+        "".join(
+            char if char.isascii() and char.isalnum() else f"_{ord(char):02x}"
+            for char in label
+        )
+        or "_"
+    )
+
+
+def unescape_object_path_label(label: str) -> str:
+    if label == "_":
+        return ""
+    chars = []
+    i = 0
+    while i < len(label):
+        if label[i] == "_" and i + 2 < len(label):
+            chars.append(chr(int(label[i + 1 : i + 3], 16)))
+            i += 3
+        else:
+            chars.append(label[i])
+            i += 1
+    return "".join(chars)
+
+
+SYSTEMD_UNIT_PATH_PREFIX = SYSTEMD_OBJECT_PATH + "/unit/"
+
+
+def unit_object_path(unit: str) -> str:
+    return SYSTEMD_UNIT_PATH_PREFIX + escape_object_path_label(unit)
+
+
+def unit_name_from_object_path(path: str) -> Optional[str]:
+    """
+    Return the unit name of a unit object path or `None`
+    if the path does not belong to a unit.
+    """
+    if not path.startswith(SYSTEMD_UNIT_PATH_PREFIX):
+        return None
+    return unescape_object_path_label(path[len(SYSTEMD_UNIT_PATH_PREFIX) :])
+
+
+# Signals that are relevant to keep the unit states up-to-date.
+UNIT_CHANGE_MATCH_RULES = [
+    (
+        f"type='signal',sender='{SYSTEMD_BUS_NAME}',"
+        f"interface='{SYSTEMD_MANAGER_INTERFACE}'"
+    ),
+    (
+        f"type='signal',sender='{SYSTEMD_BUS_NAME}',"
+        f"interface='{DBUS_PROPERTIES_INTERFACE}',member='PropertiesChanged',"
+        f"path_namespace='{SYSTEMD_UNIT_PATH_PREFIX.rstrip('/')}'"
+    ),
+]
+
+
+def unit_changes_from_signal(message: Message) -> Tuple[set[str], bool]:
+    """
+    Return the names of the units whose state may have changed according to
+    the given signal and whether all units should be reloaded.
+    A reload is required if the unit files have changed or the manager
+    has been reloaded.
+    """
+    fields = message.header.fields
+    interface = fields.get(HeaderFields.interface)
+    member = fields.get(HeaderFields.member)
+    path = fields.get(HeaderFields.path)
+    if interface == SYSTEMD_MANAGER_INTERFACE:
+        if member in ("UnitNew", "UnitRemoved"):
+            return {message.body[0]}, False
+        if member == "UnitFilesChanged":
+            return set(), True
+        if member == "Reloading" and message.body == (False,):
+            # `false` is sent after the reload has finished.
+            return set(), True
+    elif (
+        interface == DBUS_PROPERTIES_INTERFACE
+        and member == "PropertiesChanged"
+        and path is not None
+        # The signal is sent for every interface of the unit,
+        # the generic unit interface contains all the relevant states.
+        and message.body[0] == SYSTEMD_UNIT_INTERFACE
+    ):
+        unit = unit_name_from_object_path(path)
+        if unit is not None:
+            return {unit}, False
+    return set(), False
+
+
+async def subscribe_unit_changes(connection: DBusConnection) -> None:
+    """
+    Ask the bus to forward the unit change signals and the manager to emit them.
+    Without `Subscribe`, the manager does not send most of the signals.
+    """
+    for rule in UNIT_CHANGE_MATCH_RULES:
+        await connection.call(
+            DBUS_BUS_NAME, DBUS_OBJECT_PATH, DBUS_INTERFACE, "AddMatch", "s", [rule]
+        )
+    await connection.call(
+        SYSTEMD_BUS_NAME, SYSTEMD_OBJECT_PATH, SYSTEMD_MANAGER_INTERFACE, "Subscribe"
+    )
+
+
+async def unsubscribe_unit_changes(connection: DBusConnection) -> None:
+    await connection.call(
+        SYSTEMD_BUS_NAME, SYSTEMD_OBJECT_PATH, SYSTEMD_MANAGER_INTERFACE, "Unsubscribe"
+    )
+    for rule in UNIT_CHANGE_MATCH_RULES:
+        await connection.call(
+            DBUS_BUS_NAME, DBUS_OBJECT_PATH, DBUS_INTERFACE, "RemoveMatch", "s", [rule]
+        )
+
+
+def system_bus_address() -> str:
+    return os.getenv("DBUS_SYSTEM_BUS_ADDRESS") or DEFAULT_SYSTEM_BUS_ADDRESS
+
+
+def user_bus_address() -> Optional[str]:
+    """
+    Resolve the user bus address like `sd_bus_open_user`.
+    """
+    address = os.getenv("DBUS_SESSION_BUS_ADDRESS")
+    if address:
+        return address
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return f"unix:path={runtime_dir}/bus"
+    return None
+
+
+class DBusConnection:
+    """
+    A single connection to a message bus.
+    Replies are matched to their calls by a background reader task,
+    signals are forwarded to the registered signal handlers.
+    """
+
+    def __init__(self, connection: JeepneyConnection) -> None:
+        self._connection = connection
+        self.unique_name: Optional[str] = connection.unique_name
+        self.loop = asyncio.get_running_loop()
+        self._pending: Dict[int, asyncio.Future[Message]] = {}
+        self._signal_handlers: List[Callable[[Message], None]] = []
+        self._closed = False
+        self._closed_event = asyncio.Event()
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, address: str) -> DBusConnection:
+        """
+        Connect to the first `unix:` transport of `address`,
+        authenticate and register on the bus.
+        """
+        if not HAS_JEEPNEY:
+            raise ConnectionError("The D-Bus backend requires `jeepney`")
+        try:
+            connection = await open_dbus_connection(address)
+        except (RuntimeError, ValueError, EOFError, OSError) as e:
+            # `jeepney` raises a `RuntimeError` for unsupported addresses
+            # and a `ValueError` if the authentication failed
+            raise ConnectionError(
+                f"Could not connect to D-Bus address `{address}`: {e}"
+            ) from e
+        return cls(connection)
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    async def wait_closed(self) -> None:
+        """
+        Wait until the connection was closed or has been lost.
+        """
+        await self._closed_event.wait()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._closed_event.set()
+        self._reader_task.cancel()
+        self._connection.writer.close()
+        self._fail_pending(ConnectionError("D-Bus connection was closed"))
+
+    def _fail_pending(self, error: Exception) -> None:
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def _read_loop(self) -> None:
+        error = ConnectionError("D-Bus connection was closed")
+        try:
+            while True:
+                message = await self._connection.receive()
+                message_type = message.header.message_type
+                if message_type in (MessageType.method_return, MessageType.error):
+                    reply_serial = message.header.fields.get(HeaderFields.reply_serial)
+                    future = self._pending.pop(reply_serial, None)
+                    if future is not None and not future.done():
+                        future.set_result(message)
+                elif message_type == MessageType.signal:
+                    self._dispatch_signal(message)
+        except Exception as e:
+            # also covers malformed messages, which leave the stream
+            # in an unknown state
+            error = ConnectionError(f"D-Bus connection lost: {e}")
+        finally:
+            # whatever ended the loop, no reply will arrive anymore
+            self._closed = True
+            self._closed_event.set()
+            self._fail_pending(error)
+
+    def _dispatch_signal(self, message: Message) -> None:
+        """
+        Forward the signal to all handlers.
+        A failing handler is reported but must not stop the reader.
+        """
+        for handler in list(self._signal_handlers):
+            try:
+                handler(message)
+            except Exception as e:
+                self.loop.call_exception_handler(
+                    {
+                        "message": "D-Bus signal handler failed",
+                        "exception": e,
+                    }
+                )
+
+    async def call(
+        self,
+        destination: str,
+        path: str,
+        interface: str,
+        member: str,
+        signature: str = "",
+        body: Sequence[Any] = (),
+    ) -> List[Any]:
+        """
+        Call a method and return the body of the reply.
+        Raises `DBusError` if an error is returned.
+        """
+        if self._closed:
+            raise ConnectionError("D-Bus connection is closed")
+        message = new_method_call(
+            DBusAddress(path, bus_name=destination, interface=interface),
+            member,
+            signature or None,
+            tuple(body),
+        )
+        serial = next(self._connection.outgoing_serial)
+        future: asyncio.Future[Message] = self.loop.create_future()
+        self._pending[serial] = future
+        try:
+            await self._connection.send(message, serial=serial)
+            reply = await future
+        finally:
+            self._pending.pop(serial, None)
+        if reply.header.message_type == MessageType.error:
+            error_name = reply.header.fields.get(HeaderFields.error_name, "")
+            text = reply.body[0] if len(reply.body) > 0 else ""
+            raise DBusError(error_name, text if isinstance(text, str) else "")
+        return list(reply.body)
+
+    def add_signal_handler(self, handler: Callable[[Message], None]) -> None:
+        self._signal_handlers.append(handler)
+
+    def remove_signal_handler(self, handler: Callable[[Message], None]) -> None:
+        if handler in self._signal_handlers:
+            self._signal_handlers.remove(handler)
@@ -0,0 +1,322 @@
+"""
+Transports that run the non-interactive `systemctl`/`journalctl` commands.
+
+- `LocalTransport` spawns every command as a local subprocess.
+- `SessionTransport` starts a single helper process once, for example,
+  via `ssh -T host python3 -m isd_tui.transport` or inside of a container namespace,
+  and multiplexes all commands over its `stdin`/`stdout`.
+  The connection setup is only paid once and not for every command.
+
+Running this module (`python -m isd_tui.transport`) starts the helper.
+It only depends on the standard library, so it can also be copied to a host
+where `isd` is not installed.
+
+Protocol, all headers are single JSON lines:
+- Request: `{"id": 1, "args": ["systemctl", ...], "env": {"SYSTEMD_COLORS": "1"}}`
+- Output: `{"id": 1, "stream": "stdout", "size": 5}` followed by `size` raw bytes.
+  A `size` of `0` marks the end of the stream.
+- Exit: `{"id": 1, "exit": 0}` after both streams have ended.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+from abc import ABC, abstractmethod
+from functools import partial
+import json
+import os
+import subprocess
+import sys
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
+
+# exit code of a command whose session was lost, like `ssh` uses it
+SESSION_LOST_EXIT_CODE = 255
+# exit code if the command could not be found, like a shell uses it
+COMMAND_NOT_FOUND_EXIT_CODE = 127
+_CHUNK_SIZE = 2**16
+
+
+class CommandProcess(ABC):
+    """
+    The subset of `asyncio.subprocess.Process` that the transports provide.
+    """
+
+    stdout: asyncio.StreamReader
+    stderr: asyncio.StreamReader
+    returncode: Optional[int]
+
+    @abstractmethod
+    async def wait(self) -> int: ...
+
+    @abstractmethod
+    def kill(self) -> None:
+        """
+        Kill the command if it is still running.
+        `wait` must still be awaited to reap it.
+        """
+
+    async def communicate(self) -> tuple[bytes, bytes]:
+        stdout, stderr = await asyncio.gather(self.stdout.read(), self.stderr.read())
+        await self.wait()
+        return stdout, stderr
+
+
+class CommandTransport(ABC):
+    """
+    Runs commands with piped `stdout`/`stderr` and without `stdin`.
+    The `env` values are added to the environment of the executing side.
+    """
+
+    # Whether the commands run in the same context as `isd`.
+    # Only then are the local buses and unit files relevant.
+    is_local: bool = True
+
+    @abstractmethod
+    async def run(
+        self, args: Sequence[str], env: Optional[Mapping[str, str]] = None
+    ) -> CommandProcess: ...
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalTransport(CommandTransport):
+    async def run(
+        self, args: Sequence[str], env: Optional[Mapping[str, str]] = None
+    ) -> CommandProcess:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            env=None if env is None else {**os.environ, **env},
+        )
+        # `asyncio.subprocess.Process` provides the same interface
+        return proc  # type: ignore[return-value]
+
+
+class SessionProcess(CommandProcess):
+    def __init__(self, kill: Callable[[], None] = lambda: None) -> None:
+        self._kill = kill
+        self.stdout = asyncio.StreamReader(limit=_CHUNK_SIZE)
+        self.stderr = asyncio.StreamReader(limit=_CHUNK_SIZE)
+        self.returncode = None
+        self._exited: asyncio.Future[int] = asyncio.get_running_loop().create_future()
+
+    def _exit(self, code: int) -> None:
+        for stream in (self.stdout, self.stderr):
+            if not stream.at_eof():
+                stream.feed_eof()
+        if not self._exited.done():
+            self.returncode = code
+            self._exited.set_result(code)
+
+    async def wait(self) -> int:
+        return await asyncio.shield(self._exited)
+
+    def kill(self) -> None:
+        if not self._exited.done():
+            self._kill()
+
+
+class SessionTransport(CommandTransport):
+    """
+    Multiplexes all commands over a single, persistent helper process that is
+    started with `command` on first use.
+    If the session is lost, the running commands exit with
+    `SESSION_LOST_EXIT_CODE` and the next command starts a new session.
+    """
+
+    is_local = False
+
+    def __init__(self, command: Sequence[str]) -> None:
+        self.command = list(command)
+        self._session: Optional[asyncio.subprocess.Process] = None
+        self._reader_task: Optional[asyncio.Task[None]] = None
+        self._starting = asyncio.Lock()
+        self._processes: Dict[int, SessionProcess] = {}
+        self._ids = itertools.count(1)
+        # number of started sessions, the connection setup is paid once per session
+        self.sessions_started = 0
+
+    async def _ensure_session(self) -> asyncio.subprocess.Process:
+        async with self._starting:
+            session = self._session
+            if session is None or session.returncode is not None:
+                session = await asyncio.create_subprocess_exec(
+                    *self.command,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    # would otherwise write over the application
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+                self._session = session
+                self.sessions_started += 1
+                self._reader_task = asyncio.ensure_future(self._read_frames(session))
+            return session
+
+    async def run(
+        self, args: Sequence[str], env: Optional[Mapping[str, str]] = None
+    ) -> CommandProcess:
+        session = await self._ensure_session()
+        assert session.stdin is not None
+        request_id = next(self._ids)
+        proc = SessionProcess(partial(self._kill, session, request_id))
+        self._processes[request_id] = proc
+        request = {"id": request_id, "args": list(args), "env": dict(env or {})}
+        try:
+            session.stdin.write(json.dumps(request).encode() + b"\n")
+            await session.stdin.drain()
+        except (ConnectionError, RuntimeError):
+            self._processes.pop(request_id, None)
+            proc._exit(SESSION_LOST_EXIT_CODE)
+        return proc
+
+    def _kill(self, session: asyncio.subprocess.Process, request_id: int) -> None:
+        # The helper still sends the exit frame of the killed command.
+        if session.returncode is None and session.stdin is not None:
+            try:
+                session.stdin.write(
+                    json.dumps({"id": request_id, "kill": True}).encode() + b"\n"
+                )
+            except (ConnectionError, RuntimeError):
+                pass
+
+    async def _read_frames(self, session: asyncio.subprocess.Process) -> None:
+        assert session.stdout is not None
+        stdout = session.stdout
+        try:
+            while header_line := await stdout.readline():
+                header = json.loads(header_line)
+                proc = self._processes.get(header["id"])
+                if "exit" in header:
+                    self._processes.pop(header["id"], None)
+                    if proc is not None:
+                        proc._exit(header["exit"])
+                    continue
+                size = header["size"]
+                data = await stdout.readexactly(size) if size > 0 else b""
+                if proc is None:
+                    continue
+                stream = proc.stdout if header["stream"] == "stdout" else proc.stderr
+                if size == 0:
+                    stream.feed_eof()
+                else:
+                    stream.feed_data(data)
+        except (asyncio.IncompleteReadError, ValueError, KeyError):
+            pass
+        finally:
+            # the session is gone, fail all running commands
+            if self._session is session:
+                self._session = None
+            processes = self._processes
+            self._processes = {}
+            for proc in processes.values():
+                proc._exit(SESSION_LOST_EXIT_CODE)
+            if session.returncode is None:
+                session.kill()
+            await session.wait()
+
+    async def close(self) -> None:
+        session = self._session
+        self._session = None
+        if session is not None and session.stdin is not None:
+            session.stdin.close()
+        if self._reader_task is not None:
+            await self._reader_task
+            self._reader_task = None
+
+
+_TRANSPORT: CommandTransport = LocalTransport()
+
+
+def get_transport() -> CommandTransport:
+    return _TRANSPORT
+
+
+def set_transport(transport: CommandTransport) -> None:
+    global _TRANSPORT
+    _TRANSPORT = transport
+
+
+def transport_from_command(command: Sequence[str]) -> CommandTransport:
+    """
+    Return the `SessionTransport` for the given helper `command`
+    or the `LocalTransport` if it is empty.
+    """
+    return SessionTransport(command) if len(command) > 0 else LocalTransport()
+
+
+async def _serve_command(
+    request: dict, write_frame, running: Dict[int, asyncio.subprocess.Process]
+) -> None:
+    request_id = request["id"]
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *request["args"],
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            env={**os.environ, **request.get("env", {})},
+        )
+    except OSError as e:
+        message = f"{request['args'][0]}: {e.strerror}\n".encode()
+        write_frame(
+            {"id": request_id, "stream": "stderr", "size": len(message)}, message
+        )
+        for stream in ("stdout", "stderr"):
+            write_frame({"id": request_id, "stream": stream, "size": 0})
+        write_frame({"id": request_id, "exit": COMMAND_NOT_FOUND_EXIT_CODE})
+        return
+
+    async def pump(name: str, stream: asyncio.StreamReader) -> None:
+        while chunk := await stream.read(_CHUNK_SIZE):
+            write_frame({"id": request_id, "stream": name, "size": len(chunk)}, chunk)
+        write_frame({"id": request_id, "stream": name, "size": 0})
+
+    assert proc.stdout is not None and proc.stderr is not None
+    running[request_id] = proc
+    try:
+        await asyncio.gather(pump("stdout", proc.stdout), pump("stderr", proc.stderr))
+        write_frame({"id": request_id, "exit": await proc.wait()})
+    finally:
+        running.pop(request_id, None)
+
+
+async def serve() -> None:
+    """
+    Run the helper side of the `SessionTransport` on `stdin`/`stdout`
+    until `stdin` is closed.
+    """
+    loop = asyncio.get_running_loop()
+    requests = asyncio.StreamReader()
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(requests), sys.stdin
+    )
+    output = sys.stdout.buffer
+
+    def write_frame(header: dict, data: bytes = b"") -> None:
+        # header and data are written at once, so frames never interleave
+        output.write(json.dumps(header).encode() + b"\n" + data)
+        output.flush()
+
+    tasks: List[asyncio.Task[None]] = []
+    processes: Dict[int, asyncio.subprocess.Process] = {}
+    while line := await requests.readline():
+        request = json.loads(line)
+        if request.get("kill"):
+            # A command that has not started yet or already exited is not killed.
+            proc = processes.get(request["id"])
+            if proc is not None and proc.returncode is None:
+                proc.kill()
+            continue
+        tasks = [task for task in tasks if not task.done()]
+        tasks.append(
+            asyncio.ensure_future(_serve_command(request, write_frame, processes))
+        )
+    await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    asyncio.run(serve())
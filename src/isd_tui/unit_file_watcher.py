@@ -0,0 +1,284 @@
+"""
+A minimal `inotify` based watcher for the `systemd` unit search paths.
+
+New, removed or changed unit files are reported by their file name,
+which is the name of the unit.
+Only the top-level of each search path is watched; drop-in and `.wants`
+directories do not add new units.
+Search paths that do not exist yet are picked up once they are created
+by watching their nearest existing parent directory.
+
+The watcher uses `inotify` through `ctypes`, as the standard library
+does not provide bindings and the watcher is too small to justify an
+additional dependency.
+It is only available on Linux.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_MASK_ADD = 0x20000000
+IN_ISDIR = 0x40000000
+
+UNIT_FILE_EVENTS = (
+    IN_CLOSE_WRITE
+    | IN_ATTRIB
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+# Only the creation of the next directory on the way to a missing search path.
+PARENT_EVENTS = IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Used if `systemd-analyze unit-paths` is not available.
+# Order and content follow `man 5 systemd.unit`.
+DEFAULT_SYSTEM_UNIT_PATHS = [
+    "/etc/systemd/system.control",
+    "/run/systemd/system.control",
+    "/run/systemd/transient",
+    "/run/systemd/generator.early",
+    "/etc/systemd/system",
+    "/etc/systemd/system.attached",
+    "/run/systemd/system",
+    "/run/systemd/system.attached",
+    "/run/systemd/generator",
+    "/usr/local/lib/systemd/system",
+    "/lib/systemd/system",
+    "/usr/lib/systemd/system",
+    "/run/systemd/generator.late",
+]
+
+
+def default_user_unit_paths() -> List[str]:
+    home = Path.home()
+    config_home = os.getenv("XDG_CONFIG_HOME") or str(home / ".config")
+    data_home = os.getenv("XDG_DATA_HOME") or str(home / ".local" / "share")
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    runtime_paths = (
+        [
+            f"{runtime_dir}/systemd/user.control",
+            f"{runtime_dir}/systemd/transient",
+            f"{runtime_dir}/systemd/generator.early",
+            f"{runtime_dir}/systemd/user",
+            f"{runtime_dir}/systemd/generator",
+            f"{runtime_dir}/systemd/generator.late",
+        ]
+        if runtime_dir
+        else []
+    )
+    return [
+        f"{config_home}/systemd/user.control",
+        f"{config_home}/systemd/user",
+        "/etc/systemd/user",
+        "/run/systemd/user",
+        f"{data_home}/systemd/user",
+        "/usr/local/lib/systemd/user",
+        "/usr/lib/systemd/user",
+        *runtime_paths,
+    ]
+
+
+async def unit_search_paths(mode: str) -> List[str]:
+    """
+    Return the unit search paths of the given `mode` as reported by
+    `systemd-analyze unit-paths`, including the generator output under `/run`.
+    """
+    args = ["systemd-analyze", *(["--user"] if mode == "user" else []), "unit-paths"]
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        stdout, _ = await proc.communicate()
+    except OSError:
+        stdout, proc = b"", None
+    paths = stdout.decode().split()
+    if proc is None or proc.returncode != 0 or len(paths) == 0:
+        return (
+            DEFAULT_SYSTEM_UNIT_PATHS if mode == "system" else default_user_unit_paths()
+        )
+    return paths
+
+
+def _load_libc() -> ctypes.CDLL:
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    # raises `AttributeError` if `inotify` is not supported
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+def _nearest_existing_parent(path: str) -> str:
+    parent = os.path.dirname(path)
+    while parent != os.path.dirname(parent) and not os.path.isdir(parent):
+        parent = os.path.dirname(parent)
+    return parent
+
+
+class UnitFileWatcher:
+    """
+    Watch the given unit search paths and call `callback` with the names
+    of the changed unit files.
+    If the kernel queue overflowed or a search path was created or removed,
+    `callback` is called with `full_refresh=True` as changes may have been lost.
+    After an overflow, `overflowed` stays set, as more changes may be lost.
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[str],
+        callback: Callable[[set[str], bool], None],
+    ) -> None:
+        self.paths = list(paths)
+        self.callback = callback
+        self._fd: Optional[int] = None
+        self._libc: Optional[ctypes.CDLL] = None
+        # the watched search paths
+        self._watches: Dict[int, str] = {}
+        # the nearest existing parents of the missing search paths
+        self._parent_watches: Dict[int, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.overflowed = False
+
+    @property
+    def watched_paths(self) -> List[str]:
+        return list(self._watches.values())
+
+    def start(self) -> None:
+        """
+        Start watching the search paths.
+        Raises `OSError` if `inotify` is not available.
+        """
+        try:
+            libc = _load_libc()
+        except (OSError, AttributeError) as e:
+            raise OSError(f"inotify is not available: {e}") from e
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._fd = fd
+        self._libc = libc
+        self.watch_missing_paths()
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(fd, self._on_readable)
+
+    def watch_missing_paths(self) -> bool:
+        """
+        Watch the search paths that exist now and the nearest existing parent
+        of the others, so they are watched once they are created.
+        Returns `True` if a search path is watched that was not before.
+        """
+        assert self._fd is not None and self._libc is not None
+        watched = set(self._watches.values())
+        added = False
+        parents: Dict[int, str] = {}
+        for path in self.paths:
+            if path in watched:
+                continue
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(path), UNIT_FILE_EVENTS
+            )
+            if wd >= 0:
+                self._watches[wd] = path
+                added = True
+                continue
+            parent = _nearest_existing_parent(path)
+            # Do not replace the events of a parent that is a search path itself.
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(parent), PARENT_EVENTS | IN_MASK_ADD
+            )
+            if wd >= 0:
+                parents[wd] = parent
+            if parent != _nearest_existing_parent(path):
+                # created before the watch was added, so no event is reported
+                self._parent_watches.update(parents)
+                return self.watch_missing_paths() or added
+        for wd in self._parent_watches.keys() - parents.keys() - self._watches.keys():
+            self._libc.inotify_rm_watch(self._fd, wd)
+        self._parent_watches = parents
+        return added
+
+    def close(self) -> None:
+        if self._fd is None:
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        self._watches.clear()
+        self._parent_watches.clear()
+
+    def _on_readable(self) -> None:
+        assert self._fd is not None
+        units: set[str] = set()
+        full_refresh = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if len(data) == 0:
+                break
+            more_units, more_full_refresh = self.parse_events(data)
+            units |= more_units
+            full_refresh = full_refresh or more_full_refresh
+        if len(units) > 0 or full_refresh:
+            self.callback(units, full_refresh)
+
+    def parse_events(self, data: bytes) -> tuple[set[str], bool]:
+        units: set[str] = set()
+        full_refresh = False
+        rewatch = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                full_refresh = rewatch = True
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                if self._watches.pop(wd, None) is not None:
+                    # the whole search path is gone, watch for its re-creation
+                    full_refresh = rewatch = True
+                if self._parent_watches.pop(wd, None) is not None:
+                    rewatch = True
+            elif mask & IN_ISDIR:
+                if wd in self._parent_watches and mask & (IN_CREATE | IN_MOVED_TO):
+                    rewatch = True
+            elif name != "" and wd in self._watches:
+                units.add(name)
+        if rewatch and self._fd is not None and self.watch_missing_paths():
+            # the new search path may already contain unit files
+            full_refresh = True
+        return units, full_refresh
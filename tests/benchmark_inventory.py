@@ -0,0 +1,179 @@
+"""
+Memory and time benchmarks of the `UnitInventory` against the plain
+`dict[str, UnitReprState]` that was used before.
+
+Run with: `python tests/benchmark_inventory.py [number of units ...]`,
+for example, `python tests/benchmark_inventory.py 10000 100000 1000000`.
+"""
+
+import asyncio
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+from typing import Callable, Optional, Tuple
+
+from pfzy.match import fuzzy_match
+from isd_tui.isd import (
+    IncrementalSearch,
+    UnitInventory,
+    UnitReprState,
+    search_unit_names,
+)
+
+
+def generate_units(n: int) -> dict[str, UnitReprState]:
+    """
+    Unit names that resemble a container host with many scopes, devices and mounts.
+    """
+    kinds = [
+        (
+            "run-containerd-io.containerd.runtime.v2.task-k8s.io-{:064x}-rootfs.mount",
+            UnitReprState.active,
+        ),
+        ("cri-containerd-{:064x}.scope", UnitReprState.active),
+        ("sys-devices-virtual-net-veth{:08x}.device", UnitReprState.active),
+        ("kubepods-burstable-pod{:032x}.slice", UnitReprState.inactive),
+        ("session-{}.scope", UnitReprState.failed),
+    ]
+    units = {}
+    for i in range(n):
+        template, state = kinds[i % len(kinds)]
+        # build a new string object like the parser does
+        units["".join(template.format(i))] = state
+    return units
+
+
+def measure(
+    f: Callable[[], object], reset: Optional[Callable[[], object]] = None
+) -> Tuple[object, int, int, float]:
+    """
+    Return the result, the retained and the peak allocated bytes
+    and the duration of `f`.
+    `f` is called twice: once for the duration and once for the memory, as
+    `tracemalloc` slows down every allocation.
+    `reset` restores the state that the first call of `f` has changed.
+    """
+    start = time.perf_counter()
+    f()
+    duration = time.perf_counter() - start
+    if reset is not None:
+        reset()
+    tracemalloc.start()
+    result = f()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained, peak, duration
+
+
+def report(name: str, retained: int, peak: int, duration: float) -> None:
+    print(
+        f"{name:<40} retained {retained / 2**20:8.2f} MiB"
+        f"  peak {peak / 2**20:8.2f} MiB  {duration * 1000:9.1f} ms"
+    )
+
+
+def main(n: int) -> None:
+    units = generate_units(n)
+    print(f"{n} units")
+
+    # only the containers are measured, the unit names are shared
+    _, *stats = measure(lambda: dict(units))
+    report("dict", *stats)
+    inventory, *stats = measure(lambda: UnitInventory(units))
+    report("UnitInventory", *stats)
+    assert isinstance(inventory, UnitInventory)
+
+    highlighted = next(iter(units))
+    partial = {highlighted: UnitReprState.failed}
+
+    def dict_partial_refresh():
+        local = deepcopy(units)
+        local.update(partial)
+        return local != units
+
+    _, *stats = measure(dict_partial_refresh)
+    report("partial refresh: deepcopy dict", *stats)
+    _, *stats = measure(
+        lambda: inventory.update(partial),
+        lambda: inventory.update({highlighted: units[highlighted]}),
+    )
+    report("partial refresh: UnitInventory.update", *stats)
+
+    for search_term in ["", "scope"]:
+        _, *stats = measure(
+            lambda search_term=search_term: asyncio.run(
+                fuzzy_match(search_term, [u for u in units.keys()])
+            )
+        )
+        report(f"search {search_term!r}: pfzy haystack copy", *stats)
+        _, *stats = measure(
+            lambda search_term=search_term: search_unit_names(
+                search_term, inventory.names
+            )
+        )
+        report(f"search {search_term!r}: shared names", *stats)
+        _, *stats = measure(
+            lambda search_term=search_term: search_unit_names(
+                search_term, inventory.names, limit=100
+            )
+        )
+        report(f"search {search_term!r}: top 100", *stats)
+
+    # computed once on the first search, then maintained with the units
+    _, *stats = measure(
+        lambda: inventory.name_masks,
+        lambda: setattr(inventory, "_name_masks", None),
+    )
+    report("prefilter: character masks", *stats)
+
+    for typed in ["session-1", "kubepods-b"]:
+        # every keystroke of a typed search term
+        keystrokes = [typed[:i] for i in range(1, len(typed) + 1)]
+
+        def full_scans(keystrokes=keystrokes):
+            for search_term in keystrokes:
+                search_unit_names(search_term, inventory.names)
+
+        def prefiltered_scans(keystrokes=keystrokes):
+            for search_term in keystrokes:
+                search_unit_names(
+                    search_term, inventory.names, masks=inventory.name_masks
+                )
+
+        def narrowed_scans(keystrokes=keystrokes):
+            session = IncrementalSearch()
+            for search_term in keystrokes:
+                session.search(
+                    search_term,
+                    inventory.names,
+                    masks=inventory.name_masks,
+                    version=inventory.version,
+                )
+
+        _, *stats = measure(full_scans)
+        report(f"typing {typed!r}: full scans", *stats)
+        _, *stats = measure(prefiltered_scans)
+        report(f"typing {typed!r}: prefiltered scans", *stats)
+        _, *stats = measure(narrowed_scans)
+        report(f"typing {typed!r}: IncrementalSearch", *stats)
+
+    # terms that most units cannot match, for example, another service
+    for search_term in ["nginx", "postgresql", "k8s pod"]:
+        _, *stats = measure(
+            lambda search_term=search_term: search_unit_names(
+                search_term, inventory.names
+            )
+        )
+        report(f"search {search_term!r}: full scan", *stats)
+        _, *stats = measure(
+            lambda search_term=search_term: search_unit_names(
+                search_term, inventory.names, masks=inventory.name_masks
+            )
+        )
+        report(f"search {search_term!r}: prefilter", *stats)
+
+
+if __name__ == "__main__":
+    for n in [int(arg) for arg in sys.argv[1:]] or [100_000]:
+        main(n)
@@ -0,0 +1,193 @@
+"""
+Stand-in for the `systemd` service manager on the D-Bus,
+similar to how `tests/systemctl` stands in for `systemctl`.
+
+It serves the same data as `tests/systemctl` from the `integration-test` folder
+and also acts as the bus itself, so no `dbus-daemon` is required.
+
+Run it standalone with:
+`python fake_systemd_bus.py <socket-path>`
+and point `DBUS_SESSION_BUS_ADDRESS` to `unix:path=<socket-path>`.
+"""
+
+import asyncio
+import sys
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Any, List, Optional, Set, Tuple
+
+from jeepney import (
+    DBusAddress,
+    HeaderFields,
+    Message,
+    MessageType,
+    Parser,
+    new_error,
+    new_method_return,
+    new_signal,
+)
+
+from isd_tui.systemd_dbus import (
+    DBUS_INTERFACE,
+    SYSTEMD_MANAGER_INTERFACE,
+    unit_object_path,
+)
+
+DATA_DIR = Path(__file__).parent / "integration-test"
+UNIT_SIGNATURE = "a(ssssssouso)"
+UNIT_FILE_SIGNATURE = "a(ss)"
+
+
+def load_units(data_dir: Path) -> List[Tuple[Any, ...]]:
+    units = []
+    for line in (data_dir / "list-units.txt").read_text().splitlines():
+        if line.strip() == "":
+            break
+        name, load_state, active_state, sub_state, *description = line.split()
+        units.append(
+            (
+                name,
+                " ".join(description),
+                load_state,
+                active_state,
+                sub_state,
+                "",
+                unit_object_path(name),
+                0,
+                "",
+                "/",
+            )
+        )
+    return units
+
+
+def load_unit_files(data_dir: Path) -> List[Tuple[str, str]]:
+    unit_files = []
+    for line in (data_dir / "list-unit-files.txt").read_text().splitlines():
+        if line.strip() == "":
+            break
+        name, state, *_ = line.split()
+        unit_files.append((f"/etc/systemd/user/{name}", state))
+    return unit_files
+
+
+def matches(name: str, patterns: List[str]) -> bool:
+    return len(patterns) == 0 or any(fnmatch(name, pattern) for pattern in patterns)
+
+
+class FakeSystemdBus:
+    def __init__(self, data_dir: Path = DATA_DIR) -> None:
+        self.units = load_units(data_dir)
+        self.unit_files = load_unit_files(data_dir)
+        self.calls: List[str] = []
+        # Calls of these members are never answered.
+        self.unanswered: Set[str] = set()
+        self.writers: List[asyncio.StreamWriter] = []
+        self._serial = 0
+
+    async def start(self, path: str) -> asyncio.AbstractServer:
+        return await asyncio.start_unix_server(self.handle_client, path)
+
+    def next_serial(self) -> int:
+        self._serial += 1
+        return self._serial
+
+    def reply(
+        self, call: Message, signature: str = "", body: Tuple[Any, ...] = ()
+    ) -> bytes:
+        return new_method_return(call, signature or None, body).serialise(
+            self.next_serial()
+        )
+
+    def error(self, call: Message, name: str, text: str) -> bytes:
+        return new_error(call, name, "s", (text,)).serialise(self.next_serial())
+
+    def emit(
+        self, path: str, interface: str, member: str, signature: str, body: List[Any]
+    ) -> None:
+        """
+        Broadcast a signal to all connected clients.
+        """
+        message = new_signal(
+            DBusAddress(path, interface=interface), member, signature, tuple(body)
+        )
+        self.broadcast(message.serialise(self.next_serial()))
+
+    def broadcast(self, data: bytes) -> None:
+        """
+        Send raw bytes to all connected clients.
+        """
+        for writer in self.writers:
+            writer.write(data)
+
+    def handle_call(self, call: Message) -> Optional[bytes]:
+        interface = call.header.fields.get(HeaderFields.interface)
+        member = call.header.fields[HeaderFields.member]
+        self.calls.append(member)
+        if member in self.unanswered:
+            return None
+        if interface == DBUS_INTERFACE:
+            if member == "Hello":
+                return self.reply(call, "s", (":1.1",))
+            return self.reply(call)
+        if interface == SYSTEMD_MANAGER_INTERFACE:
+            if member == "ListUnits":
+                return self.reply(call, UNIT_SIGNATURE, (self.units,))
+            if member == "ListUnitsByPatterns":
+                _states, patterns = call.body
+                units = [u for u in self.units if matches(u[0], patterns)]
+                return self.reply(call, UNIT_SIGNATURE, (units,))
+            if member == "ListUnitFiles":
+                return self.reply(call, UNIT_FILE_SIGNATURE, (self.unit_files,))
+            if member == "ListUnitFilesByPatterns":
+                _states, patterns = call.body
+                unit_files = [
+                    f
+                    for f in self.unit_files
+                    if matches(f[0].rsplit("/", 1)[-1], patterns)
+                ]
+                return self.reply(call, UNIT_FILE_SIGNATURE, (unit_files,))
+            if member in ("Subscribe", "Unsubscribe"):
+                return self.reply(call)
+        return self.error(
+            call, "org.freedesktop.DBus.Error.UnknownMethod", f"Unknown {member}"
+        )
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # Accept any credentials.
+        await reader.readexactly(1)
+        await reader.readline()
+        writer.write(b"OK 0123456789abcdef0123456789abcdef\r\n")
+        await reader.readline()
+        self.writers.append(writer)
+        parser = Parser()
+        try:
+            while True:
+                data = await reader.read(4096)
+                if len(data) == 0:
+                    break
+                parser.add_data(data)
+                for message in iter(parser.get_next_message, None):
+                    if message.header.message_type != MessageType.method_call:
+                        continue
+                    reply = self.handle_call(message)
+                    if reply is not None:
+                        writer.write(reply)
+                        await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.remove(writer)
+            writer.close()
+
+
+async def main(path: str) -> None:
+    server = await FakeSystemdBus().start(path)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1]))
@@ -0,0 +1,568 @@
+import os
+import asyncio
+import json
+import tempfile
+import tracemalloc
+import pytest
+from pathlib import Path
+
+import isd_tui.isd
+import isd_tui.systemd_dbus
+from isd_tui.isd import (
+    InventoryBackend,
+    UnitDetails,
+    UnitInventory,
+    UnitReprState,
+    UnitStates,
+    get_systemd_capabilities,
+    get_systemd_capabilities_json_file_path,
+    journalctl_args_builder,
+    load_machine_unit_to_state_dicts,
+    load_inventory_snapshot,
+    load_unit_to_state_dict,
+    resolve_inventory_backend,
+    resolve_unit_types,
+    store_inventory_snapshot,
+    systemctl_args_builder,
+)
+from isd_tui.systemd_dbus import (
+    DBUS_PROPERTIES_INTERFACE,
+    SYSTEMD_BUS_NAME,
+    SYSTEMD_MANAGER_INTERFACE,
+    SYSTEMD_OBJECT_PATH,
+    SYSTEMD_UNIT_INTERFACE,
+    subscribe_unit_changes,
+    unit_changes_from_signal,
+    unit_object_path,
+)
+from jeepney import DBusAddress, HeaderFields, new_signal
+
+from fake_systemd_bus import FakeSystemdBus
+
+TESTS_DIR = Path(__file__).parent.resolve()
+
+FAKE_SYSTEMCTL = """\
+#!/usr/bin/env bash
+echo "$@" >> "{calls}"
+if [[ "$1" == "--version" ]]; then
+  echo "systemd 999 (999.1-isd)"
+  echo "+PAM +AUDIT"
+else
+  echo "[]"
+fi
+"""
+
+
+@pytest.fixture
+def fake_systemctl(monkeypatch, tmp_path) -> Path:
+    """
+    Put a minimal `systemctl` that supports `--output=json` in front of the `PATH`
+    and isolate the cache directory.
+    Returns the path of the file that logs the `systemctl` calls.
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    calls = tmp_path / "calls.txt"
+    systemctl = bin_dir / "systemctl"
+    systemctl.write_text(FAKE_SYSTEMCTL.format(calls=calls))
+    systemctl.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir) + ":" + os.environ["PATH"])
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(isd_tui.isd, "_SYSTEMD_CAPABILITIES", None)
+    # The cache is never written as `root`.
+    monkeypatch.setattr(isd_tui.isd, "is_root", lambda: False)
+    return calls
+
+
+async def test_capability_probe_is_cached_per_version(fake_systemctl: Path):
+    capabilities = await get_systemd_capabilities()
+    assert capabilities == {"json_output": True}
+    assert (
+        await resolve_inventory_backend(InventoryBackend.AUTO) == InventoryBackend.JSON
+    )
+
+    cached = json.loads(get_systemd_capabilities_json_file_path().read_text())
+    assert cached == {"systemd 999 (999.1-isd)": {"json_output": True}}
+    probe_calls = [
+        line for line in fake_systemctl.read_text().splitlines() if "list-units" in line
+    ]
+    assert len(probe_calls) == 1
+
+    # A new process only has to query the version.
+    isd_tui.isd._SYSTEMD_CAPABILITIES = None
+    fake_systemctl.unlink()
+    assert await get_systemd_capabilities() == {"json_output": True}
+    assert fake_systemctl.read_text().splitlines() == ["--version"]
+
+
+async def test_explicit_backend_is_not_probed(fake_systemctl: Path):
+    assert (
+        await resolve_inventory_backend(InventoryBackend.TEXT) == InventoryBackend.TEXT
+    )
+    assert not fake_systemctl.exists()
+
+
+def test_unit_inventory_versions():
+    inventory = UnitInventory({"a.service": UnitReprState.active})
+    assert not inventory.update({"a.service": UnitReprState.active})
+    assert inventory.version == 0
+
+    assert inventory.update(
+        {"a.service": UnitReprState.active, "b.service": UnitReprState.failed}
+    )
+    assert inventory.version == 1
+    assert list(inventory.items()) == [
+        ("a.service", UnitReprState.active),
+        ("b.service", UnitReprState.failed),
+    ]
+
+    assert not inventory.replace(
+        {"a.service": UnitReprState.active, "b.service": UnitReprState.failed}
+    )
+    # a different order changes the search results
+    assert inventory.replace(
+        {"b.service": UnitReprState.failed, "a.service": UnitReprState.active}
+    )
+    assert inventory.version == 2
+
+
+def test_unit_inventory_details():
+    inventory = UnitInventory(
+        UnitStates(
+            {"a.service": UnitReprState.active, "b.service": UnitReprState.file},
+            {"a.service": UnitDetails("running", "Service A")},
+        )
+    )
+    assert inventory.descriptions == ["Service A", ""]
+    # only the sub-state changed
+    assert inventory.update(
+        UnitStates(
+            {"a.service": UnitReprState.active},
+            {"a.service": UnitDetails("exited", "Service A")},
+        )
+    )
+    assert inventory.details_of("a.service").sub_state == "exited"
+    # the unit is no longer loaded
+    assert inventory.update({"a.service": UnitReprState.active})
+    assert inventory.details_of("a.service") == UnitDetails("", "")
+    assert inventory.descriptions == ["", ""]
+
+
+def test_unit_inventory_deltas():
+    inventory = UnitInventory(
+        {"a.service": UnitReprState.active, "b.service": UnitReprState.active}
+    )
+    delta = inventory.update(
+        {"a.service": UnitReprState.failed, "c.service": UnitReprState.active}
+    )
+    assert delta.changed == {"a.service": (UnitReprState.active, UnitReprState.failed)}
+    assert delta.added == {"c.service": UnitReprState.active}
+    assert delta.removed == {}
+    assert delta.requires_search
+
+    # only the changed states have to be rendered again
+    delta = inventory.update(UnitStates({"b.service": UnitReprState.failed}))
+    assert delta and not delta.requires_search
+    assert delta.units() == {"b.service"}
+
+    delta = inventory.replace(
+        {"a.service": UnitReprState.failed, "b.service": UnitReprState.failed}
+    )
+    assert delta.removed == {"c.service": UnitReprState.active}
+    assert delta.added == {} and delta.changed == {}
+
+    # a new description may change the search results
+    delta = inventory.update(
+        UnitStates(
+            {"a.service": UnitReprState.failed},
+            {"a.service": UnitDetails("failed", "Service A")},
+        )
+    )
+    assert delta.changed == {"a.service": (UnitReprState.failed, UnitReprState.failed)}
+    assert delta.requires_search
+
+
+def test_unit_inventory_tombstones():
+    inventory = UnitInventory(
+        UnitStates(
+            {"a.service": UnitReprState.active, "run-1.scope": UnitReprState.active},
+            {"run-1.scope": UnitDetails("running", "Run 1")},
+        )
+    )
+    inventory.update_tombstones({"run-1.scope"}, {"a.service"}, now=10)
+    # the first time it was missed is kept
+    inventory.update_tombstones({"run-1.scope"}, {"a.service"}, now=20)
+    assert inventory.tombstones == {"run-1.scope": 10}
+
+    assert not inventory.evict(deadline=5)
+    # relevant units are kept
+    assert not inventory.evict(deadline=10, keep={"run-1.scope"})
+    version = inventory.version
+    delta = inventory.evict(deadline=10)
+    assert delta.removed == {"run-1.scope": UnitReprState.active}
+    assert inventory.version == version + 1
+    assert list(inventory) == ["a.service"]
+    assert inventory.details == {} and inventory.tombstones == {}
+
+    # found again before it was evicted
+    inventory.update_tombstones({"a.service"}, set(), now=30)
+    inventory.update_tombstones(set(), {"a.service"}, now=40)
+    assert inventory.tombstones == {}
+
+
+def test_unit_inventory_index():
+    units = {f"unit-{i}.service": UnitReprState.active for i in range(1000)}
+    inventory = UnitInventory(dict(list(units.items())[:10]))
+    # grows the index
+    inventory.update(units)
+    assert all(unit in inventory for unit in units)
+    assert "unit-1000.service" not in inventory
+    with pytest.raises(KeyError):
+        inventory["unit-1000.service"]
+    assert inventory.names == list(units)
+
+    # known units keep their name object
+    known = inventory.names[1]
+    reloaded = {"".join(unit): state for unit, state in units.items()}
+    reloaded["unit-1.service"] = UnitReprState.failed
+    assert inventory.replace(reloaded)
+    assert inventory.names[1] is known
+    assert inventory["unit-1.service"] == UnitReprState.failed
+
+
+def test_unit_inventory_memory():
+    units = {
+        f"cri-containerd-{i:064x}.scope": UnitReprState.active for i in range(10_000)
+    }
+    tracemalloc.start()
+    plain = dict(units)
+    plain_size, _peak = tracemalloc.get_traced_memory()
+    del plain
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    inventory = UnitInventory(units)
+    inventory_size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert inventory_size < plain_size
+    assert inventory.names == list(units)
+
+
+async def test_inventory_snapshot_roundtrip(monkeypatch, tmp_path):
+    monkeypatch.setenv("PATH", str(TESTS_DIR) + ":" + os.environ["PATH"])
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(isd_tui.isd, "is_root", lambda: False)
+    assert load_inventory_snapshot("user") is None
+
+    units = await load_unit_to_state_dict("user", backend=InventoryBackend.TEXT)
+    store_inventory_snapshot("user", units)
+    snapshot = load_inventory_snapshot("user")
+    assert snapshot == units
+    assert snapshot is not None and snapshot.details == units.details
+    # the order determines the order of the search results
+    assert snapshot is not None and list(snapshot) == list(units)
+    assert load_inventory_snapshot("system") is None
+
+    # the states are stored by name and no temporary file is left behind
+    snapshot_files = list((tmp_path / "cache").rglob("*"))
+    snapshot_file = next(fp for fp in snapshot_files if fp.is_file())
+    assert [fp.name for fp in snapshot_files if fp.is_file()] == [snapshot_file.name]
+    stored_states = json.loads(snapshot_file.read_text())["states"]
+    assert stored_states == [state.name for state in units.values()]
+
+
+@pytest.fixture
+async def fake_bus(monkeypatch):
+    """
+    Start the `FakeSystemdBus` and point the user bus to it.
+    The fake `tests/systemctl` serves the same data for the fallback.
+    """
+    monkeypatch.setenv("PATH", str(TESTS_DIR) + ":" + os.environ["PATH"])
+    monkeypatch.setattr(isd_tui.isd, "_DBUS_CONNECTIONS", {})
+    monkeypatch.setattr(isd_tui.isd, "_DBUS_CONNECTING", {})
+    monkeypatch.setattr(isd_tui.isd, "_DBUS_UNAVAILABLE_MODES", set())
+    # Keep the socket path short; the limit is ~100 characters.
+    with tempfile.TemporaryDirectory(prefix="isd-") as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "bus")
+        monkeypatch.setenv("DBUS_SESSION_BUS_ADDRESS", f"unix:path={socket_path}")
+        bus = FakeSystemdBus()
+        server = await bus.start(socket_path)
+        yield bus
+        for connection in isd_tui.isd._DBUS_CONNECTIONS.values():
+            connection.close()
+        server.close()
+
+
+async def test_dbus_backend_matches_systemctl(fake_bus: FakeSystemdBus):
+    from_dbus = await load_unit_to_state_dict("user", backend=InventoryBackend.DBUS)
+    from_systemctl = await load_unit_to_state_dict(
+        "user", backend=InventoryBackend.TEXT
+    )
+    assert from_dbus == from_systemctl
+    assert from_dbus.details == from_systemctl.details
+    assert from_dbus["0-isd-example-unit-04.service"] == UnitReprState.failed
+    assert from_dbus.details["0-isd-example-unit-04.service"] == UnitDetails(
+        "failed", "0-isd-example-unit-04"
+    )
+    assert fake_bus.calls == ["Hello", "ListUnits", "ListUnitFiles"]
+
+
+async def test_dbus_backend_reuses_connection(fake_bus: FakeSystemdBus):
+    partial = await load_unit_to_state_dict(
+        "user", "0-isd-example-unit-02.service", backend=InventoryBackend.DBUS
+    )
+    assert partial == {"0-isd-example-unit-02.service": UnitReprState.inactive}
+    await load_unit_to_state_dict("user", backend=InventoryBackend.DBUS)
+    assert fake_bus.calls.count("Hello") == 1
+    assert "ListUnitsByPatterns" in fake_bus.calls
+
+
+async def test_dbus_backend_falls_back_to_systemctl(
+    fake_bus: FakeSystemdBus, monkeypatch
+):
+    monkeypatch.setenv("DBUS_SESSION_BUS_ADDRESS", "unix:path=/nonexistent/isd/bus")
+    units = await load_unit_to_state_dict("user", backend=InventoryBackend.DBUS)
+    assert units == await load_unit_to_state_dict("user", backend=InventoryBackend.TEXT)
+    assert fake_bus.calls == []
+    assert "user" in isd_tui.isd._DBUS_UNAVAILABLE_MODES
+
+
+async def test_dbus_backend_without_jeepney(fake_bus: FakeSystemdBus, monkeypatch):
+    monkeypatch.setattr(isd_tui.systemd_dbus, "HAS_JEEPNEY", False)
+    units = await load_unit_to_state_dict("user", backend=InventoryBackend.DBUS)
+    assert units == await load_unit_to_state_dict("user", backend=InventoryBackend.TEXT)
+    assert fake_bus.calls == []
+
+
+@pytest.mark.parametrize(
+    "path, interface, member, signature, body, expected",
+    [
+        (
+            SYSTEMD_OBJECT_PATH,
+            SYSTEMD_MANAGER_INTERFACE,
+            "UnitNew",
+            "so",
+            ["a.service", "/org/freedesktop/systemd1/unit/a_2eservice"],
+            ({"a.service"}, False),
+        ),
+        (
+            SYSTEMD_OBJECT_PATH,
+            SYSTEMD_MANAGER_INTERFACE,
+            "UnitRemoved",
+            "so",
+            ["a.service", "/org/freedesktop/systemd1/unit/a_2eservice"],
+            ({"a.service"}, False),
+        ),
+        (
+            SYSTEMD_OBJECT_PATH,
+            SYSTEMD_MANAGER_INTERFACE,
+            "UnitFilesChanged",
+            "",
+            [],
+            (set(), True),
+        ),
+        (
+            SYSTEMD_OBJECT_PATH,
+            SYSTEMD_MANAGER_INTERFACE,
+            "Reloading",
+            "b",
+            [True],
+            (set(), False),
+        ),
+        (
+            SYSTEMD_OBJECT_PATH,
+            SYSTEMD_MANAGER_INTERFACE,
+            "Reloading",
+            "b",
+            [False],
+            (set(), True),
+        ),
+        (
+            unit_object_path("dev-disk-by\\x2duuid.device"),
+            DBUS_PROPERTIES_INTERFACE,
+            "PropertiesChanged",
+            "sa{sv}as",
+            [SYSTEMD_UNIT_INTERFACE, {}, []],
+            ({"dev-disk-by\\x2duuid.device"}, False),
+        ),
+        (
+            unit_object_path("a.service"),
+            DBUS_PROPERTIES_INTERFACE,
+            "PropertiesChanged",
+            "sa{sv}as",
+            ["org.freedesktop.systemd1.Service", {}, []],
+            (set(), False),
+        ),
+    ],
+)
+def test_unit_changes_from_signal(path, interface, member, signature, body, expected):
+    message = new_signal(
+        DBusAddress(path, interface=interface), member, signature, tuple(body)
+    )
+    assert unit_changes_from_signal(message) == expected
+
+
+async def test_dbus_unit_change_subscription(fake_bus: FakeSystemdBus):
+    connection = await isd_tui.isd.get_dbus_connection("user")
+    changes: asyncio.Queue = asyncio.Queue()
+    connection.add_signal_handler(
+        lambda message: changes.put_nowait(unit_changes_from_signal(message))
+    )
+    await subscribe_unit_changes(connection)
+    assert fake_bus.calls[-1] == "Subscribe"
+    unit = "0-isd-example-unit-02.service"
+    fake_bus.emit(
+        unit_object_path(unit),
+        DBUS_PROPERTIES_INTERFACE,
+        "PropertiesChanged",
+        "sa{sv}as",
+        [SYSTEMD_UNIT_INTERFACE, {}, []],
+    )
+    assert await asyncio.wait_for(changes.get(), timeout=5) == ({unit}, False)
+
+
+async def test_dbus_signal_handler_errors_keep_the_connection(
+    fake_bus: FakeSystemdBus,
+):
+    connection = await isd_tui.isd.get_dbus_connection("user")
+    errors = []
+    asyncio.get_running_loop().set_exception_handler(
+        lambda loop, context: errors.append(context["exception"])
+    )
+    members: asyncio.Queue = asyncio.Queue()
+
+    def failing_handler(message):
+        raise RuntimeError("handler failed")
+
+    connection.add_signal_handler(failing_handler)
+    connection.add_signal_handler(
+        lambda message: members.put_nowait(message.header.fields[HeaderFields.member])
+    )
+    fake_bus.emit(
+        SYSTEMD_OBJECT_PATH, SYSTEMD_MANAGER_INTERFACE, "UnitFilesChanged", "", []
+    )
+    assert await asyncio.wait_for(members.get(), timeout=5) == "UnitFilesChanged"
+    assert [str(e) for e in errors] == ["handler failed"]
+    assert not connection.is_closed
+    await connection.call(
+        SYSTEMD_BUS_NAME, SYSTEMD_OBJECT_PATH, SYSTEMD_MANAGER_INTERFACE, "Subscribe"
+    )
+
+
+async def test_dbus_malformed_message_fails_pending_calls(fake_bus: FakeSystemdBus):
+    connection = await isd_tui.isd.get_dbus_connection("user")
+    fake_bus.unanswered.add("ListUnits")
+    call = asyncio.create_task(
+        connection.call(
+            SYSTEMD_BUS_NAME,
+            SYSTEMD_OBJECT_PATH,
+            SYSTEMD_MANAGER_INTERFACE,
+            "ListUnits",
+        )
+    )
+    while "ListUnits" not in fake_bus.calls:
+        await asyncio.sleep(0.01)
+    # an unknown endianness flag
+    fake_bus.broadcast(b"X" + bytes(15))
+    with pytest.raises(ConnectionError):
+        await asyncio.wait_for(call, timeout=5)
+    assert connection.is_closed
+    with pytest.raises(ConnectionError):
+        await connection.call(
+            SYSTEMD_BUS_NAME,
+            SYSTEMD_OBJECT_PATH,
+            SYSTEMD_MANAGER_INTERFACE,
+            "ListUnits",
+        )
+
+
+def test_resolve_unit_types():
+    assert resolve_unit_types([], []) is None
+    assert resolve_unit_types(["service", "timer"], ["timer"]) == ["service"]
+    unit_types = resolve_unit_types([], ["scope", "mount", "device"])
+    assert unit_types is not None
+    assert "service" in unit_types and "scope" not in unit_types
+
+
+async def test_systemctl_unit_type_filter(fake_systemctl: Path):
+    await load_unit_to_state_dict(
+        "user", backend=InventoryBackend.JSON, unit_types=["service", "timer"]
+    )
+    calls = fake_systemctl.read_text().splitlines()
+    assert len(calls) == 2
+    assert all("--type=service,timer" in call for call in calls)
+    assert await load_unit_to_state_dict("user", unit_types=[]) == {}
+
+
+async def test_dbus_unit_type_filter(fake_bus: FakeSystemdBus):
+    # the fake bus only serves services
+    units = await load_unit_to_state_dict(
+        "user", backend=InventoryBackend.DBUS, unit_types=["service"]
+    )
+    assert units == await load_unit_to_state_dict("user", backend=InventoryBackend.TEXT)
+    assert fake_bus.calls[-2:] == ["ListUnitsByPatterns", "ListUnitFilesByPatterns"]
+    assert (
+        await load_unit_to_state_dict(
+            "user", backend=InventoryBackend.DBUS, unit_types=["socket"]
+        )
+        == {}
+    )
+    # explicit patterns are filtered afterwards
+    assert (
+        await load_unit_to_state_dict(
+            "user",
+            "0-isd-example-unit-02.service",
+            backend=InventoryBackend.DBUS,
+            unit_types=["socket"],
+        )
+        == {}
+    )
+
+
+def test_machine_args():
+    args = systemctl_args_builder(
+        "status", mode="user", units=["a.service"], machine="c1"
+    )
+    assert "--machine=c1" in args and "--user" in args
+    assert args[-2:] == ["--", "a.service"]
+    assert "--machine=c1" in journalctl_args_builder(
+        mode="system", units=["a.service"], machine="c1"
+    )
+    assert not any(
+        arg.startswith("--machine")
+        for arg in systemctl_args_builder("status", mode="system", units=[])
+    )
+
+
+async def test_machine_inventories_are_loaded_concurrently(monkeypatch):
+    running = 0
+    max_running = 0
+
+    async def fake_load(mode, *pattern, backend, unit_types, machine):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if machine == "broken":
+            raise Exception("Could not connect")
+        return UnitStates({f"{machine}.service": UnitReprState.active})
+
+    monkeypatch.setattr(isd_tui.isd, "load_unit_to_state_dict", fake_load)
+    machines = [f"c{i}" for i in range(10)] + ["broken", "c0"]
+    loaded, errors = await load_machine_unit_to_state_dicts(
+        "system", machines, max_workers=3
+    )
+    assert max_running == 3
+    assert list(loaded) == [f"c{i}" for i in range(10)]
+    assert loaded["c3"] == {"c3.service": UnitReprState.active}
+    assert list(errors) == ["broken"]
+
+
+async def test_machine_loader_uses_systemctl(fake_bus: FakeSystemdBus):
+    units = await load_unit_to_state_dict(
+        "user", backend=InventoryBackend.DBUS, machine="c1"
+    )
+    assert units == await load_unit_to_state_dict("user", backend=InventoryBackend.TEXT)
+    # the bus of the host is not used for machines
+    assert fake_bus.calls == []
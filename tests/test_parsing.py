@@ -1,6 +1,19 @@
+import asyncio
+import json
 import pytest
 from pathlib import Path
-from isd_tui.isd import parse_list_units_lines, parse_list_unit_files_lines
+from isd_tui.isd import (
+    ListUnitFilesStreamParser,
+    ListUnitsStreamParser,
+    UnitDetails,
+    UnitReprState,
+    feed_stream_parser,
+    parse_list_units_json,
+    parse_list_units_lines,
+    parse_list_unit_files_json,
+    parse_list_unit_files_lines,
+    unit_repr_state_from_columns,
+)
 
 
 @pytest.mark.parametrize(
@@ -19,6 +32,7 @@ def test_parse_list_units(p: Path):
     # If no exception is raised it means that the parsing was successful
     parsed_units = parse_list_units_lines(data)
     assert len(parsed_units) == len(data.splitlines())
+    assert parsed_units.details.keys() == parsed_units.keys()
 
 
 @pytest.mark.parametrize(
@@ -37,3 +51,102 @@ def test_parse_list_unit_files(p: Path):
     # If no exception is raised it means that the parsing was successful
     parsed_unit_files = parse_list_unit_files_lines(data)
     assert len(parsed_unit_files) == len(data.splitlines())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096, 2**16])
+@pytest.mark.parametrize(
+    "version",
+    ["229", "237", "245", "249"],
+)
+def test_stream_parser_matches_line_parser(version: str, chunk_size: int):
+    directory = Path(__file__).parent / f"test-systemd-{version}"
+    for file_name, parser, parse_lines in [
+        ("list-units.txt", ListUnitsStreamParser(), parse_list_units_lines),
+        (
+            "list-unit-files.txt",
+            ListUnitFilesStreamParser(),
+            parse_list_unit_files_lines,
+        ),
+    ]:
+        data = (directory / file_name).read_bytes()
+        for offset in range(0, len(data), chunk_size):
+            parser.feed(data[offset : offset + chunk_size])
+        parsed = parser.finish()
+        expected = parse_lines(data.decode())
+        assert parsed == expected
+        assert list(parsed) == list(expected)
+        assert parsed.details == expected.details
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"a.service loaded active running A\n",
+        # missing trailing newline
+        b"a.service loaded active running A\nb.service loaded failed failed B",
+        # stops at the first empty line
+        b"a.service loaded active running A\n\nlegend that is ignored\n",
+    ],
+)
+async def test_feed_stream_parser(data: bytes):
+    stream = asyncio.StreamReader()
+    stream.feed_data(data)
+    stream.feed_eof()
+    parsed = await feed_stream_parser(ListUnitsStreamParser(), stream)
+    assert parsed == parse_list_units_lines(data.decode())
+
+
+def test_parse_list_units_json():
+    file = Path(__file__).parent / "fake_list_units.json"
+    data = file.read_text()
+    parsed_units = parse_list_units_json(data)
+    assert len(parsed_units) == len(json.loads(data))
+    assert parsed_units["0-isd-example-unit-01.service"] == UnitReprState.active
+    assert parsed_units["0-isd-example-unit-02.service"] == UnitReprState.inactive
+    assert parsed_units["0-isd-example-unit-04.service"] == UnitReprState.failed
+    assert parsed_units.details["0-isd-example-unit-01.service"] == UnitDetails(
+        "exited", "0-isd-example-unit-01"
+    )
+
+
+def test_parse_list_units_details():
+    parsed = parse_list_units_lines(
+        "pg-primary.service loaded active running PostgreSQL  primary \n"
+        "no-description.service loaded inactive dead\n"
+    )
+    assert parsed.details == {
+        # inner whitespace is kept
+        "pg-primary.service": UnitDetails("running", "PostgreSQL  primary"),
+        "no-description.service": UnitDetails("dead", ""),
+    }
+
+
+def test_parse_list_unit_files_json():
+    data = json.dumps(
+        [
+            {"unit_file": "a.service", "state": "enabled", "preset": "enabled"},
+            {"unit_file": "b.timer", "state": "static", "preset": None},
+        ]
+    )
+    assert parse_list_unit_files_json(data) == {
+        "a.service": UnitReprState.file,
+        "b.timer": UnitReprState.file,
+    }
+    assert parse_list_unit_files_json("") == {}
+
+
+@pytest.mark.parametrize(
+    "load_value,active_value,expected",
+    [
+        ("loaded", "active", UnitReprState.active),
+        ("not-found", "inactive", UnitReprState.not_found),
+        ("bad-setting", "inactive", UnitReprState.bad_setting),
+        ("stub", "inactive", UnitReprState.unknown),
+        ("loaded", "some-future-state", UnitReprState.unknown),
+    ],
+)
+def test_unit_repr_state_from_columns(
+    load_value: str, active_value: str, expected: UnitReprState
+):
+    assert unit_repr_state_from_columns(load_value, active_value) == expected
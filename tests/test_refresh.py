@@ -0,0 +1,443 @@
+import asyncio
+import os
+import struct
+import pytest
+from pathlib import Path
+
+from jeepney import DBusAddress, new_signal
+from textual import events
+
+import isd_tui.isd
+
+from isd_tui.isd import (
+    InteractiveSystemd,
+    MachineSelectionScreen,
+    MainScreen,
+    RefreshInterval,
+    RefreshIntervalPolicy,
+    RefreshScheduler,
+    UnitReprState,
+    UnitStates,
+)
+from isd_tui.systemd_dbus import (
+    DBUS_PROPERTIES_INTERFACE,
+    SYSTEMD_UNIT_INTERFACE,
+    unit_object_path,
+)
+from isd_tui.unit_file_watcher import IN_Q_OVERFLOW, UnitFileWatcher
+
+TESTS_DIR = Path(__file__).parent.resolve()
+
+
+class RecordingRefresh:
+    """
+    Records the refresh calls and blocks each call until it is released.
+    """
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, ...]] = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, *units: str) -> None:
+        self.calls.append(tuple(sorted(units)))
+        await self.release.wait()
+        self.release.clear()
+
+
+async def drain(scheduler: RefreshScheduler, refresh: RecordingRefresh) -> None:
+    while scheduler._running:
+        refresh.release.set()
+        await asyncio.sleep(0)
+
+
+async def settle(app: InteractiveSystemd, pilot) -> None:
+    """
+    Wait until the triggered workers, like the preview updates, are done,
+    as they cannot query the widgets during the shutdown.
+    Unlike `wait_for_complete`, it does not fail for cancelled exclusive workers.
+    """
+    while not all(worker.is_finished for worker in app.workers):
+        await pilot.pause()
+
+
+async def test_partial_requests_are_merged():
+    refresh = RecordingRefresh()
+    scheduler = RefreshScheduler(refresh, asyncio.ensure_future)
+    scheduler.request_partial("a.service")
+    await asyncio.sleep(0)
+    # the first call is in flight, the following ones are batched
+    scheduler.request_partial("b.service")
+    scheduler.request_partial("c.service", "b.service")
+    scheduler.request_partial()
+    await drain(scheduler, refresh)
+    assert refresh.calls == [("a.service",), ("b.service", "c.service")]
+    assert scheduler.counters["partial_calls"] == 2
+    assert scheduler.saved_calls == 2
+
+
+async def test_partial_requests_are_absorbed_by_full_refresh():
+    refresh = RecordingRefresh()
+    scheduler = RefreshScheduler(refresh, asyncio.ensure_future)
+    scheduler.request_partial("a.service")
+    scheduler.request_full()
+    await asyncio.sleep(0)
+    # in flight
+    scheduler.request_partial("b.service")
+    scheduler.request_full()
+    scheduler.request_full()
+    await drain(scheduler, refresh)
+    # the full refresh is queued once behind the running one
+    assert refresh.calls == [(), ()]
+    assert scheduler.counters["absorbed_partial"] == 2
+    assert scheduler.counters["merged_full"] == 1
+    assert scheduler.saved_calls == 3
+
+
+def test_adaptive_refresh_interval_within_bounds():
+    interval = RefreshInterval.from_policy(10, RefreshIntervalPolicy.ADAPTIVE, 0.5, 6)
+    assert (interval.minimum, interval.maximum) == (5, 60)
+    for _ in range(10):
+        interval.record(duration=0.1, changed=False)
+    assert interval.interval == 60
+    interval.record(duration=0.1, changed=True)
+    assert interval.interval == 30
+    for _ in range(10):
+        interval.record(duration=0.1, changed=True)
+    assert interval.interval == 5
+    # slow refreshes are not repeated more often than the cost allows
+    interval.record(duration=1, changed=True)
+    assert interval.interval == 20
+
+
+def test_fixed_refresh_interval():
+    interval = RefreshInterval.from_policy(10, RefreshIntervalPolicy.FIXED, 0.5, 6)
+    interval.record(duration=0.1, changed=True)
+    interval.record(duration=5, changed=False)
+    assert interval.interval == 10
+    # the timer ticks with the interval, so every tick is due
+    interval._last_due -= 9.9
+    assert interval.is_due()
+
+
+@pytest.fixture
+def isolated_app_env(monkeypatch, tmp_path):
+    """
+    Use the fake `systemctl` and isolated XDG directories, without a reachable bus.
+    """
+    monkeypatch.setenv("PATH", str(TESTS_DIR) + ":" + os.environ["PATH"])
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    monkeypatch.setenv("DBUS_SESSION_BUS_ADDRESS", f"unix:path={tmp_path / 'no-bus'}")
+    monkeypatch.setenv("DBUS_SYSTEM_BUS_ADDRESS", f"unix:path={tmp_path / 'no-bus'}")
+    for key in list(os.environ):
+        if key.lower().startswith("isd_"):
+            monkeypatch.delenv(key, raising=False)
+
+
+async def test_refreshes_pause_while_unfocused(isolated_app_env):
+    app = InteractiveSystemd()
+    async with app.run_test() as pilot:
+        await pilot.pause()
+        screen = app.get_screen("main", MainScreen)
+        timers = [screen.partial_refresh_timer, screen.preview_refresh_timer]
+        assert all(timer._active.is_set() for timer in timers)
+
+        app.post_message(events.AppBlur())
+        await pilot.pause()
+        assert screen.inactive_reasons == {"unfocused"}
+        assert not any(timer._active.is_set() for timer in timers)
+
+        full_requests = screen.refresh_scheduler.counters["full_requests"]
+        app.post_message(events.AppFocus())
+        await pilot.pause()
+        assert screen.inactive_reasons == set()
+        assert all(timer._active.is_set() for timer in timers)
+        # one catch-up refresh
+        assert screen.refresh_scheduler.counters["full_requests"] == full_requests + 1
+
+
+async def test_push_refreshes_preview_on_signals(isolated_app_env, monkeypatch):
+    app = InteractiveSystemd()
+    async with app.run_test() as pilot:
+        screen = app.get_screen("main", MainScreen)
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        # pretend that the unit changes are pushed
+        screen.unit_change_connection = object()  # type: ignore[assignment]
+        screen.update_refresh_timers()
+        assert not screen.preview_refresh_timer._active.is_set()
+
+        refreshes = []
+        monkeypatch.setattr(screen, "refresh_preview", lambda: refreshes.append(1))
+        monkeypatch.setattr(screen, "queue_unit_changes", lambda *args: None)
+        highlighted = screen.relevant_units[0]
+        other = next(unit for unit in screen.unit_to_state_dict if unit != highlighted)
+        for unit in [other, highlighted]:
+            screen.on_unit_change_signal(
+                new_signal(
+                    DBusAddress(
+                        unit_object_path(unit), interface=DBUS_PROPERTIES_INTERFACE
+                    ),
+                    "PropertiesChanged",
+                    "sa{sv}as",
+                    (SYSTEMD_UNIT_INTERFACE, {}, []),
+                )
+            )
+        assert refreshes == [1]
+
+        screen.unit_change_connection = None
+        screen.update_refresh_timers()
+        assert screen.preview_refresh_timer._active.is_set()
+
+
+async def test_inactive_mode_is_kept_warm(isolated_app_env, monkeypatch):
+    # `root` cannot toggle to the fake `user` bus
+    monkeypatch.setattr(isd_tui.isd, "is_root", lambda: False)
+    app = InteractiveSystemd()
+    async with app.run_test() as pilot:
+        screen = app.get_screen("main", MainScreen)
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        other_mode = screen.inactive_mode()
+        other_inventory = screen.inventories[other_mode]
+        assert len(other_inventory) > 0
+
+        await screen.action_toggle_mode()
+        await pilot.pause()
+        assert screen.mode == other_mode
+        # swapped without waiting for a new load
+        assert screen.unit_to_state_dict is other_inventory
+        assert len(screen.search_results) > 0
+        await settle(app, pilot)
+
+
+async def test_unit_file_watcher(tmp_path):
+    changes: list[tuple[set[str], bool]] = []
+    watcher = UnitFileWatcher(
+        [str(tmp_path), str(tmp_path / "missing")],
+        lambda units, full_refresh: changes.append((units, full_refresh)),
+    )
+    watcher.start()
+    try:
+        assert watcher.watched_paths == [str(tmp_path)]
+        (tmp_path / "foo.service").write_text("[Service]\n")
+        (tmp_path / "foo.service.d").mkdir()
+        for _ in range(100):
+            if changes:
+                break
+            await asyncio.sleep(0.01)
+        assert changes == [({"foo.service"}, False)]
+
+        overflow = struct.pack("iIII", -1, IN_Q_OVERFLOW, 0, 0)
+        assert not watcher.overflowed
+        assert watcher.parse_events(overflow) == (set(), True)
+        assert watcher.overflowed
+    finally:
+        watcher.close()
+
+
+async def test_unit_file_watcher_replaces_full_refreshes(isolated_app_env):
+    app = InteractiveSystemd()
+    async with app.run_test() as pilot:
+        screen = app.get_screen("main", MainScreen)
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        watcher = screen.unit_file_watcher
+        assert watcher is not None
+        assert not screen.full_refresh_timer._active.is_set()
+        assert screen.push_resync_timer._active.is_set()
+
+        # fall back to the full refreshes once events were lost
+        overflow = struct.pack("iIII", -1, IN_Q_OVERFLOW, 0, 0)
+        screen.on_unit_files_changed(*watcher.parse_events(overflow))
+        assert screen.full_refresh_timer._active.is_set()
+        assert not screen.push_resync_timer._active.is_set()
+        await settle(app, pilot)
+
+
+async def test_unit_file_watcher_missing_paths(tmp_path):
+    changes: list[tuple[set[str], bool]] = []
+    missing = tmp_path / "systemd" / "user"
+    watcher = UnitFileWatcher(
+        [str(missing)],
+        lambda units, full_refresh: changes.append((units, full_refresh)),
+    )
+    watcher.start()
+    try:
+        assert watcher.watched_paths == []
+        (tmp_path / "systemd").mkdir()
+        (tmp_path / "unrelated.service").write_text("[Service]\n")
+        for _ in range(100):
+            if list(watcher._parent_watches.values()) == [str(tmp_path / "systemd")]:
+                break
+            await asyncio.sleep(0.01)
+        assert changes == []
+        missing.mkdir()
+        for _ in range(100):
+            if changes:
+                break
+            await asyncio.sleep(0.01)
+        assert watcher.watched_paths == [str(missing)]
+        assert changes == [(set(), True)]
+        assert watcher._parent_watches == {}
+
+        changes.clear()
+        (missing / "foo.service").write_text("[Service]\n")
+        for _ in range(100):
+            if changes:
+                break
+            await asyncio.sleep(0.01)
+        assert changes == [({"foo.service"}, False)]
+    finally:
+        watcher.close()
+
+
+async def test_select_machine(isolated_app_env, monkeypatch):
+    monkeypatch.setenv("ISD_MACHINES", '["c1"]')
+    app = InteractiveSystemd()
+    async with app.run_test() as pilot:
+        screen = app.get_screen("main", MainScreen)
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        machine_inventory = screen.machine_inventories[(screen.mode, "c1")]
+        assert len(machine_inventory) > 0
+
+        await pilot.press("ctrl+r")
+        await pilot.pause()
+        assert isinstance(app.screen, MachineSelectionScreen)
+        await pilot.press("down", "enter")
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        assert screen.machine == "c1"
+        assert screen.unit_to_state_dict is machine_inventory
+        assert screen.query_one(isd_tui.isd.PreviewArea).machine == "c1"
+        # the bus and the unit files of the host are not watched
+        assert screen.unit_file_watcher is None
+
+        # only the units of the host are stored in the snapshot
+        monkeypatch.setattr(isd_tui.isd, "is_root", lambda: False)
+        machine_inventory.update({"c1-only.service": UnitReprState.active})
+        screen.store_state()
+        snapshot = isd_tui.isd.load_inventory_snapshot(screen.mode)
+        assert snapshot is not None
+        assert "c1-only.service" not in snapshot
+        assert list(snapshot) == list(screen.inventories[screen.mode])
+        await settle(app, pilot)
+
+
+async def test_inventory_changes_are_rendered_in_place(isolated_app_env):
+    app = InteractiveSystemd()
+    async with app.run_test() as pilot:
+        screen = app.get_screen("main", MainScreen)
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        sel = screen.query_one(isd_tui.isd.CustomSelectionList)
+        unit = sel.get_option_at_index(0).id
+        assert unit is not None
+        options = sel.options
+        search_results = screen.search_results
+
+        old_state = screen.unit_to_state_dict[unit]
+        new_state = (
+            UnitReprState.failed
+            if old_state != UnitReprState.failed
+            else UnitReprState.active
+        )
+        inventory = screen.unit_to_state_dict
+        delta = inventory.update(
+            UnitStates({unit: new_state}, {unit: inventory.details_of(unit)})
+        )
+        screen.publish_inventory_delta(screen.mode, screen.machine, delta)
+        await pilot.pause()
+        # neither searched again nor rebuilt
+        assert screen.search_results is search_results
+        assert sel.get_option_at_index(0) is options[0]
+        assert screen.delta_counters["rendered_in_place"] == 1
+        assert sel.get_option_at_index(0).prompt == screen.render_unit_prompt(
+            unit, None, screen.render_state_colors()
+        )
+        await settle(app, pilot)
+
+
+async def test_vanished_units_are_evicted(isolated_app_env, monkeypatch):
+    monkeypatch.setenv("ISD_VANISHED_UNIT_RETENTION_SEC", "0")
+    app = InteractiveSystemd()
+    async with app.run_test() as pilot:
+        screen = app.get_screen("main", MainScreen)
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        inventory = screen.unit_to_state_dict
+        units = list(inventory)
+        inventory.update({"run-1.scope": UnitReprState.active})
+
+        await screen.refresh_unit_to_state_dict()
+        await settle(app, pilot)
+        assert list(inventory) == units
+        assert inventory.tombstones == {}
+
+
+async def test_toggle_template_group(isolated_app_env, monkeypatch):
+    monkeypatch.setenv("ISD_GROUP_TEMPLATE_INSTANCES", "1")
+    app = InteractiveSystemd()
+    async with app.run_test() as pilot:
+        screen = app.get_screen("main", MainScreen)
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        template = "0-isd-example-unit-template@.service"
+        instance = "0-isd-example-unit-template@default.service"
+        sel = screen.query_one(isd_tui.isd.CustomSelectionList)
+        assert sel.get_option_index(template) >= 0
+        assert instance not in screen.search_results
+
+        sel.highlighted = sel.get_option_index(template)
+        await pilot.pause()
+        await screen.action_toggle_template_group()
+        assert sel.get_option_index(instance) == sel.get_option_index(template) + 1
+        assert sel.get_option_at_index(sel.highlighted).id == template
+
+        await screen.action_toggle_template_group()
+        assert instance not in screen.search_results
+        await settle(app, pilot)
+
+
+async def test_max_search_results(isolated_app_env, monkeypatch):
+    monkeypatch.setenv("ISD_MAX_SEARCH_RESULTS", "2")
+    app = InteractiveSystemd()
+    async with app.run_test() as pilot:
+        screen = app.get_screen("main", MainScreen)
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        inventory = screen.unit_to_state_dict
+        assert len(inventory) > 2
+        sel = screen.query_one(isd_tui.isd.CustomSelectionList)
+        assert sel.option_count == 2
+        assert screen.search_results == inventory.names[:2]
+        await settle(app, pilot)
+
+
+async def test_only_visible_search_results_are_highlighted(isolated_app_env):
+    app = InteractiveSystemd()
+    async with app.run_test(size=(80, 20)) as pilot:
+        screen = app.get_screen("main", MainScreen)
+        await app.workers.wait_for_complete()
+        screen.search_term = "isd"
+        screen.search_results = await screen.search_units("isd")
+        await screen.refresh_selection()
+        await pilot.pause()
+        sel = screen.query_one(isd_tui.isd.CustomSelectionList)
+        visible = sel.scrollable_content_region.height
+        assert sel.option_count > visible
+
+        colors = screen.render_state_colors()
+        first = sel.get_option_at_index(0)
+        assert first.id is not None and first.id not in sel._unhighlighted
+        assert first.prompt == screen.render_highlighted_prompt(first.id, colors)
+        assert first.prompt != screen.render_unit_prompt(first.id, None, colors)
+        last = sel.get_option_at_index(sel.option_count - 1)
+        assert last.id in sel._unhighlighted
+
+        sel.highlighted = sel.option_count - 1
+        await pilot.pause()
+        assert last.id not in sel._unhighlighted
+        await settle(app, pilot)
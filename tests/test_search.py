@@ -0,0 +1,388 @@
+import asyncio
+import os
+import pytest
+from pathlib import Path
+from pfzy.match import fuzzy_match
+from pfzy.score import fzy_scorer
+from isd_tui.search_pool import (
+    SearchPool,
+    character_mask,
+    fzy_score,
+    match_indices,
+    prefilter_unit_names,
+)
+from isd_tui.isd import (
+    IncrementalSearch,
+    SearchCache,
+    UnitDetails,
+    UnitInventory,
+    UnitReprState,
+    UnitStates,
+    parse_list_unit_files_lines,
+    parse_list_units_lines,
+    render_template_group,
+    search_template_groups,
+    search_unit_names,
+    template_of,
+)
+
+TESTS_DIR = Path(__file__).parent
+
+
+def load_fixture_units(version: int) -> dict[str, UnitReprState]:
+    data_dir = TESTS_DIR / f"test-systemd-{version}"
+    return {
+        **parse_list_unit_files_lines((data_dir / "list-unit-files.txt").read_text()),
+        **parse_list_units_lines((data_dir / "list-units.txt").read_text()),
+    }
+
+
+@pytest.mark.parametrize("search_term", ["", "sys", "ser time", "dbus", "SYS", "zzzz"])
+async def test_search_unit_names_matches_pfzy(search_term: str):
+    units = list(load_fixture_units(249))
+    expected = await fuzzy_match(search_term.replace(" ", ""), list(units))
+    assert [
+        (unit, match_indices(search_term, unit))
+        for unit in search_unit_names(search_term, units)
+    ] == [(d["value"], d["indices"]) for d in expected]
+
+
+@pytest.mark.parametrize("needle", ["", "s", "sys", "SyS", "dbus", "d-b.s", "zzzz"])
+def test_fzy_score_matches_fzy_scorer(needle: str):
+    for unit in load_fixture_units(249):
+        score, indices = fzy_scorer(needle, unit)
+        assert fzy_score(needle, unit) == (None if indices is None else score)
+
+
+def test_search_unit_descriptions():
+    names = ["postgres-exporter.service", "pg-primary.service", "other.service"]
+    descriptions = ["Prometheus exporter", "PostgreSQL primary", ""]
+    results = search_unit_names("postgres", names, descriptions)
+    # name matches are listed first
+    assert results == names[:2]
+    # the indices refer to `unit + " " + description`
+    indices = match_indices("postgres", results[1], descriptions[1])
+    assert indices is not None
+    text = results[1] + " " + descriptions[1]
+    assert "".join(text[idx] for idx in indices).lower() == "postgres"
+    assert match_indices("postgres", names[2]) is None
+    assert search_unit_names("postgres", names) == results[:1]
+
+
+@pytest.mark.parametrize("search_descriptions", [False, True])
+@pytest.mark.parametrize("search_term", ["", "sys", "ser time", "DBUS", "zzzz", "ü-"])
+def test_prefilter_matches_full_scan(search_term: str, search_descriptions: bool):
+    units = load_fixture_units(249)
+    inventory = UnitInventory(units)
+    inventory.update({"tüv-ö.service": UnitReprState.active})
+    descriptions = inventory.descriptions if search_descriptions else None
+    assert search_unit_names(
+        search_term,
+        inventory.names,
+        descriptions,
+        inventory.name_masks,
+        inventory.description_masks,
+    ) == search_unit_names(search_term, inventory.names, descriptions)
+
+
+def test_prefilter_unit_names():
+    names = ["dbus.service", "postgres.service", "sshd.service"]
+    masks = [character_mask(unit) for unit in names]
+    # the characters must be present, but not in order
+    assert prefilter_unit_names("sub", names, masks) == (["dbus.service"], None)
+    descriptions = ["D-Bus", "PostgreSQL", "OpenSSH"]
+    description_masks = {
+        unit: character_mask(description)
+        for unit, description in zip(names, descriptions)
+    }
+    assert prefilter_unit_names(
+        "openssh", names, masks, descriptions, description_masks
+    ) == (["sshd.service"], ["OpenSSH"])
+
+
+def test_unit_inventory_masks_are_maintained():
+    inventory = UnitInventory(
+        UnitStates(
+            {"a.service": UnitReprState.active, "b.service": UnitReprState.active},
+            {"a.service": UnitDetails("running", "Alpha")},
+        )
+    )
+
+    def assert_masks():
+        assert list(inventory.name_masks) == [
+            character_mask(unit) for unit in inventory.names
+        ]
+        assert inventory.description_masks == {
+            unit: character_mask(details.description)
+            for unit, details in inventory.details.items()
+            if details.description != ""
+        }
+
+    assert_masks()
+    inventory.update(
+        UnitStates(
+            {"a.service": UnitReprState.active, "c.service": UnitReprState.active},
+            {
+                "a.service": UnitDetails("running", "Changed"),
+                "c.service": UnitDetails("running", "Gamma"),
+            },
+        )
+    )
+    assert_masks()
+    inventory.replace(
+        UnitStates(
+            {"c.service": UnitReprState.active, "d.service": UnitReprState.active},
+            {"c.service": UnitDetails("running", "Gamma")},
+        )
+    )
+    assert_masks()
+    inventory.update_tombstones(["d.service"], (), now=0)
+    inventory.evict(deadline=0)
+    assert inventory.names == ["c.service"]
+    assert_masks()
+
+
+@pytest.mark.parametrize("limit", [1, 5, 40, 10_000])
+@pytest.mark.parametrize("search_term", ["", "sys", "ser time"])
+def test_search_limit_keeps_the_best_matches(search_term: str, limit: int):
+    inventory = UnitInventory(load_fixture_units(249))
+    ranking = search_unit_names(search_term, inventory.names, inventory.descriptions)
+    assert (
+        search_unit_names(
+            search_term, inventory.names, inventory.descriptions, limit=limit
+        )
+        == ranking[:limit]
+    )
+
+
+def test_incremental_search_with_limit():
+    inventory = UnitInventory(load_fixture_units(249))
+    session = IncrementalSearch()
+    for search_term in ["s", "sy", "sys", "sys t"]:
+        assert (
+            session.search(
+                search_term, inventory.names, limit=3, version=inventory.version
+            )
+            == search_unit_names(search_term, inventory.names)[:3]
+        )
+    # all matches are narrowed, not only the returned ones
+    assert (session.full_scans, session.narrowed_scans) == (1, 3)
+
+
+def test_incremental_search_matches_full_scan():
+    inventory = UnitInventory(load_fixture_units(249))
+    session = IncrementalSearch()
+    search_terms = [
+        "s",
+        "sy",
+        "sys",
+        "sys t",
+        "sys ti",
+        "sys t",
+        "SYSTI",
+        "dbus",
+        "dbus",
+    ]
+    for search_term in search_terms:
+        assert session.search(
+            search_term,
+            inventory.names,
+            inventory.descriptions,
+            inventory.name_masks,
+            inventory.description_masks,
+            version=inventory.version,
+        ) == search_unit_names(search_term, inventory.names, inventory.descriptions)
+    # only the deletion and the new term scan all units
+    assert (session.full_scans, session.narrowed_scans) == (3, 6)
+
+    # a new inventory version invalidates the previous matches
+    inventory.update({"dbus-new.service": UnitReprState.active})
+    results = session.search(
+        "dbus", inventory.names, masks=inventory.name_masks, version=inventory.version
+    )
+    assert "dbus-new.service" in results
+    assert results == search_unit_names("dbus", inventory.names)
+    assert session.full_scans == 4
+
+
+async def test_incremental_search_async():
+    inventory = UnitInventory(load_fixture_units(249))
+    session = IncrementalSearch()
+    pool = SearchPool(1, chunk_size=50)
+    try:
+        for search_term in ["t", "ti", "tim", "timer"]:
+            assert await session.search_async(
+                search_term,
+                inventory.names,
+                inventory.descriptions,
+                inventory.name_masks,
+                inventory.description_masks,
+                version=inventory.version,
+                pool=pool,
+            ) == search_unit_names(search_term, inventory.names, inventory.descriptions)
+    finally:
+        pool.close()
+    assert (session.full_scans, session.narrowed_scans) == (1, 3)
+
+
+def test_search_cache():
+    cache = SearchCache(max_entries=2, max_results=3)
+    results = [("a.service", [0])]
+    assert cache.get("system", 1, "a") is None
+    cache.put("system", 1, "a", results)
+    cache.put("user", 1, "a", [])
+    assert cache.get("system", 1, "a") is results
+    # the least recently used entry is evicted
+    cache.put("system", 1, "b", [])
+    assert cache.get("user", 1, "a") is None
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 2, 1)
+
+    # too many results in total
+    cache.put(
+        "system", 1, "c", [("a.service", []), ("b.service", []), ("c.service", [])]
+    )
+    assert len(cache) == 2 and cache.get("system", 1, "a") is None
+
+    # a new version drops the older results of the same scope
+    cache.put("system", 2, "a", results)
+    assert cache.get("system", 1, "c") is None
+    # but results of outdated inventories are not stored
+    cache.put("system", 1, "c", results)
+    assert len(cache) == 1 and cache.get("system", 2, "a") is results
+
+
+def test_unit_inventory_columns():
+    units = load_fixture_units(249)
+    inventory = UnitInventory(units)
+    assert dict(inventory) == units
+    assert inventory.names == list(units)
+    unit_id = inventory.names.index("systemd-timesyncd.service")
+    assert inventory.type_of(unit_id) == "service"
+    assert inventory.type_of(inventory.names.index("-.mount")) == "mount"
+
+    names = inventory.names
+    assert inventory.replace({"a.unknown-type": UnitReprState.active})
+    # a running search keeps its own list
+    assert names == list(units)
+    assert inventory.type_of(0) == ""
+
+
+def template_inventory() -> UnitInventory:
+    return UnitInventory(
+        {
+            "dbus.service": UnitReprState.active,
+            **{
+                f"getty@tty{i}.service": UnitReprState.failed
+                if i == 2
+                else UnitReprState.active
+                for i in range(1, 5)
+            },
+            "getty@.service": UnitReprState.file,
+            "serial-getty@ttyS0.service": UnitReprState.active,
+        }
+    )
+
+
+def test_template_of():
+    assert template_of("getty@tty1.service") == "getty@.service"
+    assert template_of("getty@.service") is None
+    assert template_of("dbus.service") is None
+
+
+def test_template_groups():
+    inventory = template_inventory()
+    groups = inventory.template_groups(min_instances=2)
+    assert groups.names == [
+        "dbus.service",
+        "getty@.service",
+        "serial-getty@ttyS0.service",
+    ]
+    assert groups.instances == {
+        "getty@.service": [f"getty@tty{i}.service" for i in range(1, 5)]
+    }
+    assert inventory.instance_state_counts(groups, "getty@.service") == {
+        UnitReprState.active: 3,
+        UnitReprState.failed: 1,
+    }
+    assert inventory.template_groups(min_instances=2) is groups
+    prompt = render_template_group(
+        "getty@.service",
+        None,
+        inventory.instance_state_counts(groups, "getty@.service"),
+    )
+    assert prompt.plain == "× getty@.service  4 instances  3 active, 1 failed"
+
+
+async def test_search_template_groups():
+    inventory = template_inventory()
+    # only the templates are searched
+    results = await search_template_groups("getty", inventory, 2, set())
+    assert results == [
+        "getty@.service",
+        "serial-getty@ttyS0.service",
+    ]
+    # expanded instances follow their template
+    results = await search_template_groups("tty1", inventory, 2, {"getty@.service"})
+    assert results == ["getty@.service", "getty@tty1.service"]
+    # an `@` expands the matching templates
+    assert await search_template_groups("getty@tty2", inventory, 2, set()) == [
+        "getty@.service",
+        "getty@tty2.service",
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("search_term", ["", "sys", "ser time"])
+async def test_search_pool_matches_search_unit_names(workers: int, search_term: str):
+    inventory = UnitInventory(load_fixture_units(249))
+    pool = SearchPool(workers, chunk_size=50, process_threshold=0)
+    try:
+        assert await pool.search(
+            search_term, inventory.names, inventory.descriptions
+        ) == search_unit_names(search_term, inventory.names, inventory.descriptions)
+        assert (
+            await pool.search(
+                search_term, inventory.names, inventory.descriptions, limit=7
+            )
+            == search_unit_names(search_term, inventory.names, inventory.descriptions)[
+                :7
+            ]
+        )
+    finally:
+        pool.close()
+
+
+async def test_search_pool_starts_processes_above_threshold():
+    assert SearchPool().workers == min(4, os.cpu_count() or 1)
+    pool = SearchPool(2, chunk_size=50, process_threshold=200)
+    try:
+        units = [f"unit-{i}.service" for i in range(400)]
+        assert await pool.search("unit-1", units[:200]) == search_unit_names(
+            "unit-1", units[:200]
+        )
+        assert pool._processes is None
+        # the prefiltered units count
+        masks = [character_mask(unit) for unit in units]
+        await pool.search("unit-1", units, masks=masks)
+        assert pool._processes is None
+        assert await pool.search("unit", units) == search_unit_names("unit", units)
+        assert pool._processes is not None
+    finally:
+        pool.close()
+
+
+async def test_search_pool_cancels_pending_chunks():
+    pool = SearchPool(1, chunk_size=1)
+    try:
+        # takes seconds if all chunks are scored
+        task = asyncio.ensure_future(pool.search("a" * 10, ["a" * 300] * 2000))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # the pending chunks do not delay the next search
+        assert await asyncio.wait_for(pool.search("b", ["b.service"]), 1) == [
+            "b.service"
+        ]
+    finally:
+        pool.close()
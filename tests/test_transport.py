@@ -0,0 +1,195 @@
+import asyncio
+import json
+import os
+import sys
+import pytest
+from pathlib import Path
+
+import isd_tui.transport
+from isd_tui.isd import (
+    InteractiveSystemd,
+    InventoryBackend,
+    MainScreen,
+    load_unit_to_state_dict,
+    systemctl_async,
+)
+from isd_tui.transport import (
+    COMMAND_NOT_FOUND_EXIT_CODE,
+    SESSION_LOST_EXIT_CODE,
+    LocalTransport,
+    SessionTransport,
+)
+
+TESTS_DIR = Path(__file__).parent.resolve()
+# The helper runs locally as a stand-in for a remote session.
+HELPER_COMMAND = [sys.executable, "-m", "isd_tui.transport"]
+
+
+@pytest.fixture
+async def session():
+    transport = SessionTransport(HELPER_COMMAND)
+    yield transport
+    await transport.close()
+
+
+async def test_session_multiplexes_commands(session: SessionTransport):
+    async def run(i: int) -> tuple[bytes, bytes, int]:
+        proc = await session.run(
+            [
+                sys.executable,
+                "-c",
+                f"import os, sys; print({i} * 'x' + os.environ['ISD_TEST']); "
+                f"sys.stderr.write('e{i}'); sys.exit({i % 3})",
+            ],
+            env={"ISD_TEST": "!"},
+        )
+        stdout, stderr = await proc.communicate()
+        return stdout, stderr, proc.returncode
+
+    results = await asyncio.gather(*(run(i) for i in range(10)))
+    assert results == [(i * b"x" + b"!\n", f"e{i}".encode(), i % 3) for i in range(10)]
+    # the connection setup is only paid once
+    assert session.sessions_started == 1
+
+
+async def test_session_command_not_found(session: SessionTransport):
+    proc = await session.run(["/nonexistent/isd/command"])
+    stdout, stderr = await proc.communicate()
+    assert proc.returncode == COMMAND_NOT_FOUND_EXIT_CODE
+    assert stdout == b"" and b"/nonexistent/isd/command" in stderr
+
+
+async def test_session_is_restarted_after_it_was_lost(session: SessionTransport):
+    proc = await session.run([sys.executable, "-c", "import time; time.sleep(10)"])
+    assert session._session is not None
+    session._session.kill()
+    assert await proc.wait() == SESSION_LOST_EXIT_CODE
+
+    proc = await session.run(["true"])
+    assert await proc.wait() == 0
+    assert session.sessions_started == 2
+
+
+async def test_session_command_is_killed(session: SessionTransport):
+    proc = await session.run([sys.executable, "-c", "import time; time.sleep(10)"])
+    # wait until the helper has started the command
+    await session.run(["true"])
+    await asyncio.sleep(0.5)
+    proc.kill()
+    assert await asyncio.wait_for(proc.wait(), timeout=5) < 0
+    # the session itself is still usable
+    assert await (await session.run(["true"])).wait() == 0
+    assert session.sessions_started == 1
+
+
+@pytest.mark.parametrize("transport_type", [LocalTransport, SessionTransport])
+async def test_commands_use_transport(transport_type, monkeypatch):
+    monkeypatch.setenv("PATH", str(TESTS_DIR) + ":" + os.environ["PATH"])
+    transport = (
+        SessionTransport(HELPER_COMMAND)
+        if transport_type is SessionTransport
+        else LocalTransport()
+    )
+    monkeypatch.setattr(isd_tui.transport, "_TRANSPORT", transport)
+    try:
+        units = await load_unit_to_state_dict("user", backend=InventoryBackend.TEXT)
+        assert "0-isd-example-unit-01.service" in units
+        return_code, stdout, _stderr = await systemctl_async(
+            "status", mode="user", units=["0-isd-example-unit-01.service"]
+        )
+        assert return_code == 0
+        assert "0-isd-example-unit-01" in stdout
+    finally:
+        await transport.close()
+    if isinstance(transport, SessionTransport):
+        assert transport.sessions_started == 1
+
+
+FAILING_SYSTEMCTL = """\
+#!/usr/bin/env bash
+script_dir="{tests_dir}"
+if [[ "$*" == *list-units* ]]; then
+  echo $$ > "{pid_file}"
+  {list_units}
+else
+  {list_unit_files}
+fi
+"""
+
+
+def write_failing_systemctl(
+    tmp_path: Path, monkeypatch, list_units: str, list_unit_files: str
+) -> Path:
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    pid_file = tmp_path / "list-units.pid"
+    systemctl = bin_dir / "systemctl"
+    systemctl.write_text(
+        FAILING_SYSTEMCTL.format(
+            tests_dir=TESTS_DIR,
+            pid_file=pid_file,
+            list_units=list_units,
+            list_unit_files=list_unit_files,
+        )
+    )
+    systemctl.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir) + ":" + os.environ["PATH"])
+    return pid_file
+
+
+async def test_failing_loader_reaps_sibling(tmp_path, monkeypatch):
+    pid_file = write_failing_systemctl(
+        tmp_path,
+        monkeypatch,
+        list_units="exec sleep 30",
+        list_unit_files='sleep 0.5; echo "Failed to connect to bus" >&2; exit 1',
+    )
+    with pytest.raises(Exception, match="Failed to connect to bus"):
+        await asyncio.wait_for(
+            load_unit_to_state_dict("user", backend=InventoryBackend.TEXT), timeout=10
+        )
+    pid = int(pid_file.read_text())
+    # the `list-units` process was killed and reaped, not left as a zombie
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+
+
+async def test_failing_list_units_keeps_partial_output(tmp_path, monkeypatch):
+    write_failing_systemctl(
+        tmp_path,
+        monkeypatch,
+        list_units='cat "$script_dir/integration-test/list-units.txt"; '
+        'echo "Failed to list all units" >&2; exit 1',
+        list_unit_files='cat "$script_dir/integration-test/list-unit-files.txt"',
+    )
+    units = await load_unit_to_state_dict("user", backend=InventoryBackend.TEXT)
+    assert "0-isd-example-unit-01.service" in units
+
+
+async def test_interactive_commands_need_local_terminal(tmp_path, monkeypatch):
+    monkeypatch.setenv("PATH", str(TESTS_DIR) + ":" + os.environ["PATH"])
+    for xdg in ("CONFIG", "CACHE", "DATA"):
+        monkeypatch.setenv(f"XDG_{xdg}_HOME", str(tmp_path / xdg.lower()))
+    monkeypatch.setenv("ISD_TRANSPORT_COMMAND", json.dumps(HELPER_COMMAND))
+    # the app replaces the global transport
+    monkeypatch.setattr(isd_tui.transport, "_TRANSPORT", LocalTransport())
+    calls: list[tuple] = []
+    monkeypatch.setattr(
+        isd_tui.isd.subprocess, "call", lambda *args, **_kwargs: calls.append(args)
+    )
+    app = InteractiveSystemd()
+    async with app.run_test() as pilot:
+        screen = app.get_screen("main", MainScreen)
+        await app.workers.wait_for_complete()
+        assert not isd_tui.transport.get_transport().is_local
+        screen.highlighted_unit = "0-isd-example-unit-01.service"
+
+        await screen.action_systemctl_command("edit")
+        await pilot.pause()
+        assert calls == []
+        assert "needs a local terminal" in list(app._notifications)[-1].message
+
+        # non-interactive commands still work through the session
+        await screen.action_copy_unit_path()
+        assert "0-isd-example-unit-01.service" in app.clipboard
+        await pilot.pause()
@@ -21,13 +21,17 @@ os.environ["PATH"] = str(Path(__file__).parent.resolve()) + ":" + os.environ["PA
 @pytest.fixture(autouse=True)
 def isolated_xdg_folders(monkeypatch, tmp_path):
     """
-    Each test gets its own set of random XDG directories.
+    Each test gets its own set of random XDG directories and unreachable D-Bus addresses.
     Also removes ALL environment variables starting with `ISD_`
     """
     monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
     monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
     monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
     monkeypatch.setenv("XDG_CONFIG_DIRS", str(tmp_path / "etc" / "xdg"))
+    # Never talk to the real service manager over D-Bus;
+    # the inventory falls back to the fake `systemctl`.
+    monkeypatch.setenv("DBUS_SYSTEM_BUS_ADDRESS", f"unix:path={tmp_path / 'no-bus'}")
+    monkeypatch.setenv("DBUS_SESSION_BUS_ADDRESS", f"unix:path={tmp_path / 'no-bus'}")
 
     for key in list(os.environ):
         if key.lower().startswith("isd_"):
@@ -275,17 +279,17 @@ def test_snap_donation_screen(snap_compare):
 
 
 def test_snap_root_user_bus_screen(snap_compare, monkeypatch):
-    class MockCompletedProcess:
-        def __init__(self):
-            # generated via `sudo su; systemctl --user`
-            self.stderr = "Failed to connect to user scope bus via local transport: $DBUS_SESSION_BUS_ADDRESS and $XDG_RUNTIME_DIR not defined (consider using --machine=<user>@.host --user to connect to bus of other user)"
-            self.returncode = 1
-
-    def mock_run(*args, **kwargs):
-        return MockCompletedProcess()
+    async def mock_is_system_running(*, mode: str) -> tuple[int, str]:
+        # generated via `sudo su; systemctl --user`
+        return (
+            1,
+            "Failed to connect to user scope bus via local transport: $DBUS_SESSION_BUS_ADDRESS and $XDG_RUNTIME_DIR not defined (consider using --machine=<user>@.host --user to connect to bus of other user)",
+        )
 
     monkeypatch.setattr("os.getuid", lambda: 0)
-    monkeypatch.setattr("subprocess.run", mock_run)
+    monkeypatch.setattr(
+        "isd_tui.isd.systemctl_is_system_running", mock_is_system_running
+    )
 
     app = InteractiveSystemd()
     assert snap_compare(